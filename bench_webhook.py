@@ -0,0 +1,75 @@
+import sys
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+from u50_webhook import PayloadBuilder, WebhookUploader
+
+# Compares per-request latency of a fresh requests.post() per upload (the old
+# send_webhook_data behaviour) with the pooled keep-alive WebhookUploader,
+# against a local stand-in for the series API.
+# Usage: bench_webhook.py [REQUESTS] [DELAY_MS]
+# DELAY_MS adds a server-side delay on every new connection to mimic TCP/TLS
+# setup over a real network link.
+
+
+class SeriesHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    connect_delay = 0.0
+
+    def setup(self):
+        super().setup()
+        time.sleep(self.connect_delay)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = b'{"status": "ok"}'
+        self.send_response(201)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(label, post, count):
+    post()  # warm up
+    started = time.perf_counter()
+    for _ in range(count):
+        response = post()
+        response.raise_for_status()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed / count * 1000:8.3f} ms/request")
+    return elapsed / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    SeriesHandler.connect_delay = (float(sys.argv[2]) if len(sys.argv) > 2 else 0.0) / 1000
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SeriesHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/api/series/bench/v1"
+    auth = "Bearer bench"
+    body = PayloadBuilder().build_json(tuple(float(i) for i in range(13)))
+
+    def fresh_post():
+        headers = {"Content-Type": "application/json", "Authorization": auth}
+        return requests.post(url, headers=headers, data=body, timeout=10)
+
+    uploader = WebhookUploader(url, auth)
+    try:
+        fresh = run("requests.post per upload", fresh_post, count)
+        pooled = run("pooled WebhookUploader", lambda: uploader.post(body), count)
+        print(f"Speed-up: {fresh / pooled:.1f}x")
+    finally:
+        uploader.close()
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
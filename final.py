@@ -1,13 +1,27 @@
 import serial
 import serial.tools.list_ports
-import time
 import threading
-import json
-import requests
 from datetime import datetime
 import tkinter as tk
 from tkinter import ttk, scrolledtext, filedialog, messagebox
 
+from u50_serial import RD_COMMAND
+from u50_acquisition import ProbeWorker, ReadingCache, PollSchedule, AdaptiveRate
+from u50_frame import FRAME_DECODER
+from u50_store import ReadingStore, default_store_path
+from u50_export import ExportSink
+from u50_capture import FrameCapture
+from u50_log import LogPipe
+from u50_stats import RollingStats
+from u50_anomaly import AnomalyDetector, describe
+from u50_calibration import load_calibration
+from u50_webhook import (PayloadBuilder, WebhookUploader, UploadQueue, DeadbandFilter, WEBHOOK_FIELDS,
+                         WEBHOOK_PARAMETERS, DEFAULT_ABSOLUTE_DEADBANDS, DEFAULT_RELATIVE_DEADBANDS,
+                         WindowAggregator)
+
+# Lines kept in the Response Viewport; older ones are trimmed as new ones arrive
+LOG_LINES = 2000
+
 class UsbDataCollectorGUI:
     def __init__(self, root):
         self.root = root
@@ -16,34 +30,69 @@ class UsbDataCollectorGUI:
         self.root.minsize(800, 600)
         
         self.serial_conn = None
+        self.device = None
+        self.reading_cache = ReadingCache()
+        # With "Store Readings" every reading is appended to a column store in
+        # the user's data directory
+        self.reading_store = None
+        # Rolling 1 min / 15 min / 1 h statistics for the data panel and,
+        # optionally, the upload payload
+        self.rolling_stats = RollingStats()
+        # Flags spikes, stuck sensors, out-of-range values and probe error
+        # codes; flagged readings carry their flags in the upload payload
+        self.anomaly_detector = AnomalyDetector()
+        self.anomaly_detector.subscribe(self.anomaly_alert)
+        # Rotating CSV export of auto-collected readings, open while collecting
+        self.export_sink = None
+        # Raw frame journal for replaying field incidents, open while enabled
+        self.frame_capture = None
+        # Calibration table loaded from file; readings are converted with it
+        # as they arrive, while the store keeps the values as decoded
+        self.calibration = None
+        # Sets the collect interval from how fast DO, turbidity and ORP move,
+        # while adaptive auto-collection runs
+        self.adaptive_rate = None
         self.is_connected = False
         self.is_collecting = False
-        self.collection_thread = None
         self.is_sending_webhook = False
+        # 'latest', 'batch' or 'aggregate', fixed when auto-webhook starts
+        self.upload_mode = 'latest'
+        # With "Urgent Alerts" an alerting reading is uploaded at once
+        self.urgent_alerts = False
+        self.window_aggregator = None
+        self.webhook_stop = threading.Event()
         self.webhook_thread = None
         
         # Webhook configuration
         self.webhook_url = tk.StringVar(value="http://127.0.0.1:8000/api/series/SuUgBtTElYwClk07RimZpO4YDxWcvTLN/v1")
         self.webhook_auth = tk.StringVar(value="Bearer 1|XbPw6M7kVD7SwyXxjgF5QheqgET1pFJANMYTaV5i4e3b5bad")
-        self.webhook_param_map = {
-            'd1': 0,  # Temperature (parameter 1) maps to d1
-            'd2': 1,  # pH (parameter 2) maps to d2
-            'd3': 2,  # pHmv (parameter 3) maps to d3
-            'd4': 3,  # ORP (parameter 4) maps to d4
-            'd5': 4,  # Conductivity (parameter 5) maps to d5
-            'd6': 5,  # Turbidity (parameter 6) maps to d6
-            'd7': 6,  # DO (parameter 7) maps to d7
-            'd8': 7,  # TDS (parameter 8) maps to d8
-            'd9': 8,  # Spec Gravity (parameter 9) maps to d9
-            'd10': 9,  # Depth (parameter 10) maps to d10
-            'd11': 10, # Parameter 11 maps to d11
-            'd12': 11  # Parameter 12 maps to d12
-        }
+        # d1..d12 -> parameter mapping, compiled once and rebuilt only when a
+        # mapping combobox changes
+        self.payload_builder = PayloadBuilder()
+        
+        # Persistent, pooled HTTP session; headers are rebuilt only when the
+        # URL or auth fields change
+        self.uploader = WebhookUploader(self.webhook_url.get(), self.webhook_auth.get())
+        self.webhook_url.trace_add("write", self.update_webhook_target)
+        self.webhook_auth.trace_add("write", self.update_webhook_target)
+        # Auto-send readings are queued and delivered on the queue's own thread,
+        # with retries; what the endpoint cannot take yet is kept on disk. In
+        # batch mode every reading is queued and sent in one request per
+        # webhook interval, or sooner once the batch is full.
+        # The filter never lets the same reading through twice; with "Changes
+        # Only" it also holds back readings that stayed inside the deadbands
+        self.upload_filter = DeadbandFilter()
+        self.upload_queue = UploadQueue(self.uploader, self.payload_builder, "webhook_journal.jsonl",
+                                        on_send=self.upload_done, upload_filter=self.upload_filter,
+                                        detector=self.anomaly_detector)
         
         # Store parsed data for webhook use
         self.parsed_values = {}
         
         self.create_widgets()
+        # Worker threads log through the pipe; the Tk thread drains it
+        self.log_pipe = LogPipe(self.log_text, max_lines=LOG_LINES)
+        self.log_pipe.start()
         self.refresh_ports()
         
     def create_widgets(self):
@@ -86,6 +135,33 @@ class UsbDataCollectorGUI:
         interval_entry = ttk.Entry(control_frame, textvariable=self.interval_var, width=5)
         interval_entry.pack(side=tk.LEFT, padx=5)
         
+        ttk.Label(control_frame, text="Deadline (s):").pack(side=tk.LEFT, padx=5)
+        self.deadline_var = tk.StringVar(value="2")
+        deadline_entry = ttk.Entry(control_frame, textvariable=self.deadline_var, width=5)
+        deadline_entry.pack(side=tk.LEFT, padx=5)
+        
+        self.adaptive_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(control_frame, text="Adaptive", variable=self.adaptive_var).pack(side=tk.LEFT, padx=5)
+        ttk.Label(control_frame, text="Fastest (s):").pack(side=tk.LEFT, padx=5)
+        self.fast_interval_var = tk.StringVar(value="1")
+        ttk.Entry(control_frame, textvariable=self.fast_interval_var, width=5).pack(side=tk.LEFT, padx=5)
+        
+        self.export_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(control_frame, text="Export CSV", variable=self.export_var).pack(side=tk.LEFT, padx=5)
+        self.rotate_var = tk.StringVar(value="hour")
+        ttk.Combobox(control_frame, textvariable=self.rotate_var, values=["hour", "day"],
+                     width=5, state="readonly").pack(side=tk.LEFT, padx=5)
+        
+        self.capture_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(control_frame, text="Capture Raw", variable=self.capture_var,
+                        command=self.toggle_capture).pack(side=tk.LEFT, padx=5)
+        
+        self.store_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(control_frame, text="Store Readings", variable=self.store_var,
+                        command=self.toggle_store).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(control_frame, text="Calibration...", command=self.load_calibration_file).pack(side=tk.LEFT, padx=5)
+        
         clear_btn = ttk.Button(control_frame, text="Clear Log", command=self.clear_log)
         clear_btn.pack(side=tk.LEFT, padx=5)
         
@@ -135,6 +211,38 @@ class UsbDataCollectorGUI:
         webhook_interval_entry = ttk.Entry(webhook_btn_frame, textvariable=self.webhook_interval_var, width=5)
         webhook_interval_entry.pack(side=tk.LEFT, padx=5)
         
+        self.batch_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(webhook_btn_frame, text="Batch", variable=self.batch_var).pack(side=tk.LEFT, padx=5)
+        
+        self.aggregate_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(webhook_btn_frame, text="Aggregate", variable=self.aggregate_var).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(webhook_btn_frame, text="Batch Size:").pack(side=tk.LEFT, padx=5)
+        self.batch_size_var = tk.StringVar(value="60")
+        ttk.Entry(webhook_btn_frame, textvariable=self.batch_size_var, width=5).pack(side=tk.LEFT, padx=5)
+        
+        self.gzip_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(webhook_btn_frame, text="Gzip", variable=self.gzip_var).pack(side=tk.LEFT, padx=5)
+        
+        self.send_stats_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(webhook_btn_frame, text="Statistics", variable=self.send_stats_var).pack(side=tk.LEFT, padx=5)
+        
+        self.urgent_alerts_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(webhook_btn_frame, text="Urgent Alerts",
+                        variable=self.urgent_alerts_var).pack(side=tk.LEFT, padx=5)
+        
+        self.changes_only_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(webhook_btn_frame, text="Changes Only",
+                        variable=self.changes_only_var).pack(side=tk.LEFT, padx=5)
+        
+        self.per_field_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(webhook_btn_frame, text="Changed Fields Only",
+                        variable=self.per_field_var).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(webhook_btn_frame, text="Heartbeat (s):").pack(side=tk.LEFT, padx=5)
+        self.heartbeat_var = tk.StringVar(value="900")
+        ttk.Entry(webhook_btn_frame, textvariable=self.heartbeat_var, width=5).pack(side=tk.LEFT, padx=5)
+        
         # Response Viewport with both horizontal and vertical scrolling
         viewport_frame = ttk.LabelFrame(main_frame, text="Response Viewport", padding="10")
         viewport_frame.pack(fill=tk.BOTH, expand=True, pady=5)
@@ -165,6 +273,15 @@ class UsbDataCollectorGUI:
         data_frame = ttk.LabelFrame(main_frame, text="Parsed Data", padding="10")
         data_frame.pack(fill=tk.BOTH, expand=True, pady=5)
         
+        stats_frame = ttk.Frame(data_frame)
+        stats_frame.pack(fill=tk.X)
+        ttk.Label(stats_frame, text="Statistics window:").pack(side=tk.LEFT, padx=5)
+        self.stats_window_var = tk.StringVar(value="15m")
+        stats_window_combo = ttk.Combobox(stats_frame, textvariable=self.stats_window_var,
+                                          values=list(self.rolling_stats.windows), width=5, state="readonly")
+        stats_window_combo.pack(side=tk.LEFT, padx=5)
+        stats_window_combo.bind("<<ComboboxSelected>>", lambda event: self.display_data(self.current_data))
+        
         # Create container frame for the text and scrollbars
         data_container = ttk.Frame(data_frame)
         data_container.pack(fill=tk.BOTH, expand=True)
@@ -194,8 +311,7 @@ class UsbDataCollectorGUI:
         self.current_data = None
 
     def create_param_mapping(self, parent, *fields):
-        param_names = ["Temperature", "pH", "pHmv", "ORP", "Conductivity", "Turbidity", 
-                      "DO", "TDS", "Spec Gravity", "Depth", "Param 11", "Param 12"]
+        param_names = [name for name, _ in WEBHOOK_PARAMETERS]
         
         for i, field in enumerate(fields):
             frame = ttk.Frame(parent)
@@ -205,19 +321,27 @@ class UsbDataCollectorGUI:
             
             # Create combobox for parameter selection
             param_combo = ttk.Combobox(frame, width=10, values=param_names)
-            param_combo.current(self.webhook_param_map[field])  # Set default selection
+            param_combo.current(self.payload_builder.param_map[field])  # Set default selection
+            param_combo.bind("<<ComboboxSelected>>", self.update_webhook_param_map)
             param_combo.pack(side=tk.TOP)
             
             # Store reference to combobox
             setattr(self, f"{field}_combo", param_combo)
 
-    def update_webhook_param_map(self):
+    def update_webhook_param_map(self, event=None):
         # Update the parameter mapping from UI selections
-        for field in ['d1', 'd2', 'd3', 'd4', 'd5', 'd6', 'd7', 'd8', 'd9', 'd10', 'd11', 'd12']:
+        param_map = dict(self.payload_builder.param_map)
+        for field in WEBHOOK_FIELDS:
             combo = getattr(self, f"{field}_combo")
             param_index = combo.current()
             if param_index >= 0:
-                self.webhook_param_map[field] = param_index
+                param_map[field] = param_index
+        
+        if self.payload_builder.compile(param_map):
+            self.log_message("Webhook parameter mapping updated")
+
+    def update_webhook_target(self, *args):
+        self.uploader.configure(self.webhook_url.get(), self.webhook_auth.get())
 
     def refresh_ports(self):
         ports = [port.device for port in serial.tools.list_ports.comports()]
@@ -226,8 +350,8 @@ class UsbDataCollectorGUI:
             self.port_combo.current(0)
             
     def log_message(self, message):
-        self.log_text.insert(tk.END, f"{datetime.now().strftime('%H:%M:%S')}: {message}\n")
-        self.log_text.see(tk.END)
+        # Safe from any thread
+        self.log_pipe.log(message)
         
     def toggle_connection(self):
         if self.is_connected:
@@ -254,6 +378,17 @@ class UsbDataCollectorGUI:
                 dsrdtr=False
             )
             
+            # The worker owns the port from here on; every command goes through it
+            self.device = ProbeWorker(port, interval=None, deadline=self.get_deadline(),
+                                      serial_conn=self.serial_conn, calibration=self.calibration)
+            self.device.capture = self.frame_capture
+            self.device.subscribe(self.reading_cache.update)
+            if self.reading_store is not None:
+                self.device.subscribe(self.reading_store.append)
+            self.device.subscribe(self.rolling_stats.update)
+            self.device.subscribe(self.anomaly_detector.update)
+            self.device.subscribe(self.handle_reading)
+            self.device.start()
             self.is_connected = True
             self.connect_btn.config(text="Disconnect")
             self.request_btn.config(state=tk.NORMAL)
@@ -272,6 +407,11 @@ class UsbDataCollectorGUI:
         if self.is_sending_webhook:
             self.toggle_auto_webhook()
             
+        if self.device:
+            self.device.stop()
+            self.device.join(5)
+            self.device = None
+            
         if self.serial_conn and self.serial_conn.is_open:
             self.serial_conn.close()
             
@@ -282,173 +422,56 @@ class UsbDataCollectorGUI:
         self.status_var.set("Disconnected")
         self.log_message("Disconnected")
         
-    def calculate_fcs(self, command):
-        result = 0
-        for char in command:
-            result ^= ord(char)
-        
-        return format(result, '02X')
-        
+    def get_deadline(self):
+        try:
+            return float(self.deadline_var.get())
+        except ValueError:
+            return 2.0
+            
     def request_data(self):
-        if not self.is_connected or not self.serial_conn:
+        if not self.is_connected or not self.device:
             messagebox.showerror("Error", "Not connected to device")
             return
             
-        command = "#RD@"
-        fcs = self.calculate_fcs(command)
-        full_command = f"{command}{fcs}\r\n"
+        self.log_message(f"Sent command: {RD_COMMAND.decode().strip()}")
+        self.device.submit(deadline=self.get_deadline(), callback=self.request_done)
         
-        try:
-            self.serial_conn.write(full_command.encode())
-            self.log_message(f"Sent command: {full_command.strip()}")
-            
-            time.sleep(0.5)
+    def request_done(self, pending):
+        if pending.error:
+            self.log_message(f"Error: {pending.error}")
+        elif pending.result is None:
+            self.log_message(f"No valid response received within {pending.deadline} s")
             
-            if self.serial_conn.in_waiting:
-                response = self.serial_conn.read(self.serial_conn.in_waiting).decode('ascii')
-                self.log_message(f"Received {len(response)} bytes")
-                
-                data = self.parse_response(response)
-                if data:
-                    self.display_data(data)
-                    self.current_data = data
-            else:
-                self.log_message("No response received")
-                
-        except Exception as e:
-            self.log_message(f"Error: {e}")
-            messagebox.showerror("Error", str(e))
-
-    def parse_response(self, response):
-        try:
-            if not response.startswith('#RD'):
-                self.log_message(f"Invalid response format: {response[:10]}...")
-                return None
-                
-            site_name = response[3:23].strip()
-            
-            probe_status = response[23]
-            probe_error = response[24]
-            
-            parameters = []
-            for i in range(13):
-                start_idx = 29 + (i * 11)
-                
-                param = {
-                    'code': response[start_idx:start_idx+2],
-                    'status': response[start_idx+2],
-                    'error': response[start_idx+3],
-                    'data': response[start_idx+4:start_idx+9].strip(),
-                    'unit': response[start_idx+9]
-                }
-                parameters.append(param)
-
-            # Process the response according to the new parsing method
-            raw = response.strip()
-            parts = raw.split()
-
-            labels = [
-                "Code",
-                "Temperature",
-                "pH",
-                "pHmv",
-                "ORP",
-                "mS/cm",
-                "NTU",
-                "mg/L DO",
-                "g/L TDS",
-                "ppt",
-                "O' T",
-                "m",
-                "%DO"
-            ]
-
-            # Clear previous parsed values
-            self.parsed_values = {}
-
-            def parse_temperature(value):
-                return f"{float(value) % 1000:.2f}"
-
-            def parse_others(value, is_orp=False):
-                return value[:3] if is_orp else value[:4]
+    def handle_reading(self, reading):
+        # Called on the device worker thread for every reading, whoever asked for it.
+        # The frame has already been decoded once by the worker.
+        self.log_message(f"Received {len(reading.frame)} bytes in {reading.latency_text}")
+        
+        self.update_parsed_values(reading)
+        self.log_pipe.post(self.show_reading, reading)
+        
+        export_sink = self.export_sink
+        if export_sink is not None:
+            export_sink.append(reading)
+        
+        if self.is_sending_webhook:
+            window_aggregator = self.window_aggregator
+            if window_aggregator is not None:
+                window_aggregator.add(reading)
+            elif self.upload_mode == 'batch':
+                self.upload_queue.add(reading)
 
-            for i in range(1, min(13, len(parts))):
-                try:
-                    value = parts[i]
-                    if labels[i] == "Temperature":
-                        parsed_value = parse_temperature(value)
-                    elif labels[i] == "ORP":
-                        parsed_value = parse_others(value, is_orp=True)
-                    else:
-                        parsed_value = parse_others(value)
-                    
-                    # Store the parsed values for webhook use
-                    self.parsed_values[labels[i]] = parsed_value
-                    self.log_message(f"{labels[i]}: {parsed_value}")
-                except Exception as e:
-                    self.log_message(f"Error parsing parameter {i}: {e}")
+    def show_reading(self, reading):
+        # Tk thread
+        self.status_var.set(f"Connected to {reading.port} - last poll {reading.latency_text}")
+        self.display_data(reading)
+        self.current_data = reading
 
-            date_idx = 173
-            try:
-                year = int(response[date_idx:date_idx+2])
-                month = int(response[date_idx+2:date_idx+4])
-                day = int(response[date_idx+4:date_idx+6])
-                hour = int(response[date_idx+6:date_idx+8])
-                minute = int(response[date_idx+8:date_idx+10])
-                second = int(response[date_idx+10:date_idx+12])
-                
-                timestamp = datetime(2000 + year, month, day, hour, minute, second)
-            except (ValueError, IndexError):
-                timestamp = None
-                self.log_message("Error parsing timestamp")
-            
-            try:
-                lon_degrees = response[date_idx+12:date_idx+14]
-                lon_minutes = response[date_idx+14:date_idx+16]
-                lon_seconds = response[date_idx+16:date_idx+18]
-                
-                ns_indicator = response[date_idx+19]
-                
-                lat_degrees = response[date_idx+20:date_idx+23]
-                lat_minutes = response[date_idx+23:date_idx+25]
-                lat_seconds = response[date_idx+25:date_idx+27]
-                
-                ew_indicator = response[date_idx+28]
-                
-                if lon_degrees != "--" and lat_degrees != "---":
-                    gps_coords = {
-                        'latitude': {
-                            'degrees': int(lat_degrees),
-                            'minutes': int(lat_minutes),
-                            'seconds': int(lat_seconds),
-                            'direction': ns_indicator
-                        },
-                        'longitude': {
-                            'degrees': int(lon_degrees),
-                            'minutes': int(lon_minutes),
-                            'seconds': int(lon_seconds),
-                            'direction': ew_indicator
-                        }
-                    }
-                else:
-                    gps_coords = None
-            except (ValueError, IndexError):
-                gps_coords = None
-                self.log_message("Error parsing GPS coordinates")
-            
-            result = {
-                'site_name': site_name,
-                'probe_status': probe_status,
-                'probe_error': probe_error,
-                'parameters': parameters,
-                'timestamp': timestamp,
-                'gps_coordinates': gps_coords
-            }
-            
-            return result
-        except Exception as e:
-            self.log_message(f"Error parsing response: {e}")
-            return None
+    def update_parsed_values(self, reading):
+        # Store the parsed values for webhook use
+        self.parsed_values = dict(zip(FRAME_DECODER.labels, reading.values))
+        for label, value in self.parsed_values.items():
+            self.log_message(f"{label}: {value}")
 
     def display_data(self, data):
         if not data:
@@ -457,20 +480,43 @@ class UsbDataCollectorGUI:
         self.data_text.delete(1.0, tk.END)
         
         self.data_text.insert(tk.END, f"--- Data Summary ---\n")
-        self.data_text.insert(tk.END, f"Site name: {data['site_name']}\n")
-        self.data_text.insert(tk.END, f"Probe status: {data['probe_status']}, Error: {data['probe_error']}\n\n")
-        
-        # Display parsed values from the new parsing method
-        self.data_text.insert(tk.END, "Parameters (New Parsing Method):\n")
-        for label, value in self.parsed_values.items():
-            self.data_text.insert(tk.END, f"{label}: {value}\n")
-        
-        if data['timestamp']:
-            self.data_text.insert(tk.END, f"\nTimestamp: {data['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}\n")
-        
-        if data['gps_coordinates']:
-            lat = data['gps_coordinates']['latitude']
-            lon = data['gps_coordinates']['longitude']
+        self.data_text.insert(tk.END, f"Site name: {data.site_name}\n")
+        self.data_text.insert(tk.END, f"Probe status: {data.probe_status}, Error: {data.probe_error}\n")
+        if data.raw_values is not None:
+            self.data_text.insert(tk.END, f"Calibration: {self.calibration.version if self.calibration else '-'}\n")
+        self.data_text.insert(tk.END, "\n")
+        
+        # Rolling statistics of the chosen window beside each value
+        statistics = self.rolling_stats.statistics(data.port)
+        window = self.stats_window_var.get()
+        window_stats = statistics.get(window) if statistics else None
+        
+        # Anomaly flags, while this is still the probe's latest reading
+        flags = self.anomaly_detector.flags_for(data) or ()
+        
+        self.data_text.insert(tk.END, "Parameters:" + (f"  ({window} statistics)" if window_stats else "") + "\n")
+        for i, (name, label, value) in enumerate(zip(FRAME_DECODER.names, FRAME_DECODER.labels, data.values)):
+            line = f"{label}: {value}"
+            if data.raw_values is not None and data.raw_values[i] != value:
+                line += f" (raw {data.raw_values[i]})"
+            if window_stats:
+                mean, low, high, var, ewma = (window_stats[statistic][i]
+                                              for statistic in ('mean', 'min', 'max', 'var', 'ewma'))
+                line = (f"{line:<24}mean {mean:.4g}  min {low:.4g}  max {high:.4g}  "
+                        f"sd {var ** 0.5:.3g}  ewma {ewma:.4g}")
+            kinds = [kind for kind, flagged, _ in flags if flagged == name]
+            if kinds:
+                line += "  ! " + ", ".join(kinds)
+            self.data_text.insert(tk.END, line + "\n")
+        
+        timestamp = data.timestamp
+        if timestamp:
+            self.data_text.insert(tk.END, f"\nTimestamp: {timestamp.strftime('%Y-%m-%d %H:%M:%S')}\n")
+        
+        gps_coordinates = data.gps_coordinates
+        if gps_coordinates:
+            lat = gps_coordinates['latitude']
+            lon = gps_coordinates['longitude']
             
             lat_str = f"{lat['degrees']}°{lat['minutes']}'{lat['seconds']}\"{lat['direction']}"
             lon_str = f"{lon['degrees']}°{lon['minutes']}'{lon['seconds']}\"{lon['direction']}"
@@ -480,8 +526,23 @@ class UsbDataCollectorGUI:
     def toggle_auto_collect(self):
         if self.is_collecting:
             self.is_collecting = False
+            if self.device:
+                if self.adaptive_rate is not None:
+                    self.device.unsubscribe(self.adaptive_rate.update)
+                self.device.release('collect')
+            self.adaptive_rate = None
+            if self.export_sink is not None:
+                export_sink, self.export_sink = self.export_sink, None
+                export_sink.close()
+                self.log_message(f"Exported {export_sink.written} readings to {export_sink.directory}")
             self.status_var.set("Auto-collection stopped")
             self.log_message("Auto-collection stopped")
+            if self.device:
+                schedule = self.device.schedule.status()
+                if schedule['polls']:
+                    self.log_message(f"Poll timing: {schedule['polls']} polls, {schedule['skipped']} slots skipped, "
+                                     f"mean {schedule['mean_jitter'] * 1000:.1f} ms / max "
+                                     f"{schedule['max_jitter'] * 1000:.1f} ms late; {schedule['histogram']}")
         else:
             if not self.is_connected:
                 messagebox.showerror("Error", "Not connected to device")
@@ -498,30 +559,96 @@ class UsbDataCollectorGUI:
                 messagebox.showerror("Error", "Invalid interval value")
                 self.auto_collect_var.set(False)
                 return
+            
+            if self.adaptive_var.get():
+                try:
+                    fast_interval = float(self.fast_interval_var.get())
+                    if not 0 < fast_interval <= interval:
+                        raise ValueError
+                except ValueError:
+                    messagebox.showerror("Error", "Fastest interval must be positive and at most the interval")
+                    self.auto_collect_var.set(False)
+                    return
+                
+            if self.export_var.get():
+                self.export_sink = ExportSink("exports", rotate=self.rotate_var.get())
                 
             self.is_collecting = True
-            self.status_var.set(f"Auto-collecting data every {interval} seconds")
-            self.log_message(f"Started auto-collection every {interval} seconds")
-            self.collection_thread = threading.Thread(target=self.auto_collect_data, daemon=True)
-            self.collection_thread.start()
+            self.device.deadline = self.get_deadline()
+            if self.adaptive_var.get():
+                self.status_var.set(f"Auto-collecting data every {fast_interval} to {interval} seconds")
+                self.log_message(f"Started adaptive auto-collection every {fast_interval} to {interval} seconds")
+                self.adaptive_rate = AdaptiveRate(self.device, 'collect', base_interval=interval,
+                                                  fast_interval=fast_interval, on_change=self.adaptive_changed)
+                self.device.subscribe(self.adaptive_rate.update)
+            else:
+                self.status_var.set(f"Auto-collecting data every {interval} seconds")
+                self.log_message(f"Started auto-collection every {interval} seconds")
+                self.device.require('collect', interval)
     
-    def auto_collect_data(self):
-        while self.is_collecting and self.is_connected:
-            self.request_data()
-            
+    def adaptive_changed(self, interval, score):
+        # Called on the device worker thread
+        self.log_message(f"Adaptive poll interval now {interval:.1f} s (change {score:.1f}x the fast threshold)")
+    
+    def toggle_capture(self):
+        if self.capture_var.get():
+            path = f"capture_{datetime.now().strftime('%Y%m%d_%H%M%S')}.u50cap"
+            self.frame_capture = FrameCapture(path)
+            if self.device:
+                self.device.capture = self.frame_capture
+            self.log_message(f"Capturing raw frames to {path}")
+        elif self.frame_capture is not None:
+            frame_capture, self.frame_capture = self.frame_capture, None
+            if self.device:
+                self.device.capture = None
+            frame_capture.close()
+            self.log_message(f"Captured {frame_capture.frames} frames to {frame_capture.path}")
+    
+    def toggle_store(self):
+        if self.store_var.get():
+            path = default_store_path()
             try:
-                interval = float(self.interval_var.get())
-                time.sleep(interval)
-            except ValueError:
-                time.sleep(5)  
-                
-            if not self.is_connected or not self.auto_collect_var.get():
-                self.is_collecting = False
-                break
+                self.reading_store = ReadingStore(path)
+            except (OSError, ValueError) as e:
+                messagebox.showerror("Store Error", str(e))
+                self.store_var.set(False)
+                return
+            if self.device:
+                self.device.subscribe(self.reading_store.append)
+            self.log_message(f"Storing readings in {path}")
+        elif self.reading_store is not None:
+            reading_store, self.reading_store = self.reading_store, None
+            if self.device:
+                self.device.unsubscribe(reading_store.append)
+            reading_store.close()
+            self.log_message(f"Stopped storing readings in {reading_store.path}")
+    
+    def load_calibration_file(self):
+        path = filedialog.askopenfilename(title="Calibration table",
+                                          filetypes=[("JSON files", "*.json"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            self.calibration = load_calibration(path)
+        except (OSError, ValueError, KeyError) as e:
+            messagebox.showerror("Calibration Error", str(e))
+            return
+        if self.device:
+            self.device.calibration = self.calibration
+        self.log_message(f"Calibration version {self.calibration.version} loaded from {path}")
     
     def toggle_auto_webhook(self):
         if self.is_sending_webhook:
             self.is_sending_webhook = False
+            self.webhook_stop.set()
+            if self.device:
+                self.device.release('webhook')
+            if self.window_aggregator is not None:
+                # The window in progress goes out as a partial record
+                window_aggregator, self.window_aggregator = self.window_aggregator, None
+                window_aggregator.flush(everything=True)
+                status = window_aggregator.status()
+                self.log_message(f"Aggregated {status['readings']} readings into {status['records']} records")
             self.status_var.set("Auto-webhook stopped")
             self.log_message("Auto-webhook stopped")
         else:
@@ -540,32 +667,85 @@ class UsbDataCollectorGUI:
                 messagebox.showerror("Error", "Invalid interval value")
                 self.auto_webhook_var.set(False)
                 return
+            
+            if self.batch_var.get():
+                try:
+                    batch_size = int(self.batch_size_var.get())
+                    if batch_size < 1:
+                        raise ValueError
+                except ValueError:
+                    messagebox.showerror("Error", "Invalid batch size")
+                    self.auto_webhook_var.set(False)
+                    return
+                self.upload_queue.max_readings = batch_size
+                self.upload_queue.max_age = interval
+            else:
+                self.upload_queue.max_readings = 1
+                self.upload_queue.max_age = 0
+            self.upload_queue.compress = self.gzip_var.get()
+            self.upload_queue.rolling_stats = self.rolling_stats if self.send_stats_var.get() else None
+            self.urgent_alerts = self.urgent_alerts_var.get()
+            
+            if self.changes_only_var.get():
+                try:
+                    heartbeat = float(self.heartbeat_var.get())
+                except ValueError:
+                    messagebox.showerror("Error", "Invalid heartbeat value")
+                    self.auto_webhook_var.set(False)
+                    return
+                self.upload_filter.configure(DEFAULT_ABSOLUTE_DEADBANDS, DEFAULT_RELATIVE_DEADBANDS, heartbeat,
+                                             self.per_field_var.get())
+            else:
+                self.upload_filter.configure()
+            self.upload_queue.start()
                 
+            # Keeps the cache fresh at the webhook rate; the worker polls at the
+            # fastest rate any consumer asked for, so nothing is polled twice
+            self.device.require('webhook', interval)
+            self.upload_mode = ('aggregate' if self.aggregate_var.get() else
+                                'batch' if self.batch_var.get() else 'latest')
+            if self.upload_mode == 'aggregate':
+                # Every reading is folded into one mean/min/max/count record
+                # per interval window
+                self.window_aggregator = WindowAggregator(self.payload_builder, self.upload_queue.add_entry,
+                                                          interval)
             self.is_sending_webhook = True
             self.status_var.set(f"Auto-sending webhook data every {interval} seconds")
-            self.log_message(f"Started auto-webhook every {interval} seconds")
-            self.webhook_thread = threading.Thread(target=self.auto_send_webhook, daemon=True)
-            self.webhook_thread.start()
+            self.log_message(f"Started auto-webhook every {interval} seconds ({self.upload_mode})")
+            # In batch mode handle_reading queues every reading itself
+            if self.upload_mode != 'batch':
+                self.webhook_stop.clear()
+                self.webhook_thread = threading.Thread(target=self.auto_send_webhook, args=(interval,),
+                                                       daemon=True)
+                self.webhook_thread.start()
     
-    def auto_send_webhook(self):
-        while self.is_sending_webhook and self.is_connected:
-            # First request fresh data if not already auto-collecting
-            if not self.is_collecting:
-                self.request_data()
-            
-            # Send webhook if we have data
-            if self.parsed_values:  # Use parsed_values instead of current_data
-                self.send_webhook_data()
-            
-            try:
-                interval = float(self.webhook_interval_var.get())
-                time.sleep(interval)
-            except ValueError:
-                time.sleep(30)  # Default to 30 seconds if invalid
-                
-            if not self.is_connected or not self.auto_webhook_var.get():
-                self.is_sending_webhook = False
-                break
+    def auto_send_webhook(self, interval):
+        # Queues the latest reading, or closes finished aggregation windows,
+        # on a fixed grid of 'interval' seconds. The settings are taken when
+        # auto-webhook starts; Tk variables are only read on the Tk thread.
+        schedule = PollSchedule(interval)
+        while not self.webhook_stop.wait(schedule.wait_time()):
+            schedule.tick()
+            window_aggregator = self.window_aggregator
+            if window_aggregator is not None:
+                window_aggregator.flush()
+                continue
+            # Readings come from the shared cache; only the device worker touches the port
+            reading = self.reading_cache.latest()
+            if reading is not None:
+                self.upload_queue.add(reading)
+    
+    def anomaly_alert(self, reading, flags):
+        # Called on the device worker thread when a new condition is flagged,
+        # before handle_reading sees the reading
+        self.log_message(f"Alert: {describe(flags)}")
+        if self.is_sending_webhook and self.urgent_alerts:
+            # Aggregated readings are sent in their window's record as well,
+            # so the alert goes out as an alert record, not a second sample
+            if self.window_aggregator is not None:
+                self.upload_queue.add_alert(reading, flags)
+            else:
+                self.upload_queue.add(reading, urgent=True)
     
     def send_webhook_manual(self):
         if not self.parsed_values:  # Use parsed_values instead of current_data
@@ -576,99 +756,20 @@ class UsbDataCollectorGUI:
     
     def send_webhook_data(self):
         try:
-            # Update parameter mapping from UI
-            self.update_webhook_param_map()
+            reading = self.reading_cache.latest()
+            if reading is None:
+                raise ValueError("No data available to send")
             
-            # Map from parameter names to webhook fields
-            param_name_to_index = {
-                "Temperature": 0,
-                "pH": 1,
-                "pHmv": 2,
-                "ORP": 3,
-                "mS/cm": 4,  # Conductivity
-                "NTU": 5,     # Turbidity
-                "mg/L DO": 6, # DO
-                "g/L TDS": 7, # TDS
-                "ppt": 8,     # Spec Gravity
-                "m": 9,       # Depth
-                "O' T": 10,   # Parameter 11
-                "%DO": 11     # Parameter 12
-            }
-            
-            # Prepare critical data (d1-d5)
-            critical_data = {}
-            for i in range(1, 6):
-                field_name = f'd{i}'
-                param_idx = self.webhook_param_map[field_name]
-                
-                # Find the corresponding parameter name
-                param_name = None
-                for name, idx in param_name_to_index.items():
-                    if idx == param_idx:
-                        param_name = name
-                        break
-                
-                # Get the parsed value if available
-                if param_name and param_name in self.parsed_values:
-                    try:
-                        critical_data[field_name] = float(self.parsed_values[param_name])
-                    except ValueError:
-                        critical_data[field_name] = 0.0
-                else:
-                    critical_data[field_name] = 0.0
-            
-            # Prepare non-critical data (d6-d12)
-            non_critical_data = {}
-            for i in range(6, 13):
-                field_name = f'd{i}'
-                param_idx = self.webhook_param_map[field_name]
-                
-                # Find the corresponding parameter name
-                param_name = None
-                for name, idx in param_name_to_index.items():
-                    if idx == param_idx:
-                        param_name = name
-                        break
-                
-                # Get the parsed value if available
-                if param_name and param_name in self.parsed_values:
-                    try:
-                        non_critical_data[field_name] = float(self.parsed_values[param_name])
-                    except ValueError:
-                        non_critical_data[field_name] = 0.0
-                else:
-                    non_critical_data[field_name] = 0.0
-            
-            # Build the webhook payload
-            payload = [
-                {
-                    "name": "critical",
-                    "value": critical_data
-                },
-                {
-                    "name": "non-critical",
-                    "value": non_critical_data
-                }
-            ]
-            
-            # Prepare headers
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": self.webhook_auth.get()
-            }
+            # Flat gather of the mapped values into the cached JSON template
+            body = self.payload_builder.build_json(reading.values)
             
             # Log the webhook request
-            self.log_message(f"Sending webhook to: {self.webhook_url.get()}")
-            self.log_message(f"Webhook payload: {json.dumps(payload)}")
-            print(json.dumps(payload))
+            self.log_message(f"Sending webhook to: {self.uploader.url}")
+            self.log_message(f"Webhook payload: {body}")
+            print(body)
             
-            # Send the webhook request
-            response = requests.post(
-                self.webhook_url.get(),
-                headers=headers,
-                json=payload,
-                timeout=10
-            )
+            # Send the webhook request over the kept-alive session
+            response = self.uploader.post(body)
             
             # Handle the response
             if response.status_code >= 200 and response.status_code < 300:
@@ -681,12 +782,32 @@ class UsbDataCollectorGUI:
             if not self.is_sending_webhook:  # Only show error message for manual sends
                 messagebox.showerror("Webhook Error", str(e))
     
+    def upload_done(self, response, error):
+        # Called on the upload queue thread after every delivery attempt
+        status = self.upload_queue.status()
+        backlog = f"{status['queued']} queued, {status['journaled']} on disk"
+        if error:
+            self.log_message(f"Webhook upload failed ({error}), retrying; {backlog}")
+        elif response.status_code >= 200 and response.status_code < 300:
+            self.log_message(f"Webhook sent successfully. Response: {response.status_code}, "
+                             f"{status['readings_sent']} readings sent; {backlog}")
+        else:
+            self.log_message(f"Webhook rejected. Status: {response.status_code}, Response: {response.text}; "
+                             f"{status['readings_rejected']} readings rejected")
+    
     def clear_log(self):
-        self.log_text.delete(1.0, tk.END)
+        self.log_pipe.clear()
     
     def on_closing(self):
         if self.is_connected:
             self.disconnect()
+        self.log_pipe.stop()
+        self.upload_queue.stop(timeout=5)
+        self.uploader.close()
+        if self.reading_store is not None:
+            self.reading_store.close()
+        if self.frame_capture is not None:
+            self.frame_capture.close()
         self.root.destroy()
 
 
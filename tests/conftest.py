@@ -0,0 +1,72 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from u50_frame import PARAMETERS, parse_frame
+
+VALUES = (25.3, 7.01, -12.0, 210.0, 0.123, 5.6, 8.4, 0.08, 0.0, 1.25, 1.0, 88.0, 1.0)
+
+
+def build_frame(values=VALUES, site="SITE01", status="0", error="0"):
+    # A #RD frame laid out the way PARAMETERS describes it: each parameter
+    # block is code(2) status(1) error(1) data(width) unit(1)
+    frame = bytearray(b" " * 202)
+    frame[0:3] = b"#RD"
+    frame[3:23] = site.ljust(20).encode()
+    frame[23:24] = status.encode()
+    frame[24:25] = error.encode()
+    for i, (parameter, value) in enumerate(zip(PARAMETERS, values)):
+        offset, width = parameter['offset'], parameter['width']
+        text = value if isinstance(value, str) else f"{value:g}"
+        frame[offset - 4:offset] = f"{i + 1:02d}00".encode()
+        frame[offset:offset + width] = text[:width].rjust(width).encode()
+    frame[173:185] = b"261018120530"
+    frame[185:202] = b"351230 N1394510 E"
+    return bytes(frame)
+
+
+@pytest.fixture
+def make_reading():
+    start = datetime(2026, 10, 18, 12, 0, 0)
+
+    def make(sequence=1, values=VALUES, port="COM1", seconds=None, **frame):
+        received = start + timedelta(seconds=sequence if seconds is None else seconds)
+        return parse_frame(build_frame(values, **frame), port, received, 0.1, sequence=sequence)
+    return make
+
+
+class FakeSerial:
+    # Stands in for serial.Serial: every write queues the next canned
+    # response, which read() hands out 'chunk' bytes at a time
+    def __init__(self, responses=(), chunk=64):
+        self.responses = list(responses)
+        self.chunk = chunk
+        self.buffer = bytearray()
+        self.timeout = 2
+        self.written = []
+        self.closed = False
+
+    @property
+    def in_waiting(self):
+        return min(len(self.buffer), self.chunk)
+
+    def reset_input_buffer(self):
+        self.buffer.clear()
+
+    def write(self, data):
+        self.written.append(data)
+        if self.responses:
+            self.buffer += self.responses.pop(0)
+        return len(data)
+
+    def read(self, size=1):
+        data = bytes(self.buffer[:min(size, self.chunk)])
+        del self.buffer[:len(data)]
+        return data
+
+    def close(self):
+        self.closed = True
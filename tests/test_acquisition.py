@@ -0,0 +1,64 @@
+import pytest
+
+import u50_acquisition
+from conftest import VALUES, FakeSerial, build_frame
+from u50_acquisition import ProbeWorker, AdaptiveRate
+
+
+def test_worker_numbers_readings_and_feeds_subscribers():
+    port = FakeSerial([build_frame() + b"\r", b"", build_frame() + b"\r"])
+    worker = ProbeWorker("COM1", interval=None, deadline=0.05, serial_conn=port)
+    readings = []
+    worker.subscribe(readings.append)
+    for _ in range(3):
+        worker.poll_once()
+    assert [reading.sequence for reading in readings] == [1, 3]
+    assert worker.polls == 3 and worker.misses == 1
+
+
+class FakeWorker:
+    def __init__(self):
+        self.demands = []
+
+    def require(self, consumer, interval):
+        self.demands.append((consumer, interval))
+
+
+def test_adaptive_rate_speeds_up_holds_and_relaxes(make_reading, monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(u50_acquisition.time, 'monotonic', lambda: clock[0])
+    worker = FakeWorker()
+    changes = []
+    rate = AdaptiveRate(worker, 'adaptive', base_interval=60.0, fast_interval=2.0,
+                        change_rates={'temperature': 1.0}, window=60.0, hold=300.0, relax=1.5,
+                        on_change=lambda interval, score: changes.append(interval))
+
+    def feed(seconds, temperature):
+        clock[0] = seconds
+        return rate.update(make_reading(values=(temperature,) + VALUES[1:]))
+
+    assert feed(0, 20.0) == 60.0
+    # 5 degrees in 10 s is 30 times the 1 degree a minute threshold
+    assert feed(10, 25.0) == 2.0
+    assert rate.score == pytest.approx(30.0)
+    # Steady again, but held at the fast rate until 300 s after the last change
+    for seconds in range(20, 360, 10):
+        assert feed(seconds, 25.0) == 2.0
+    assert feed(360, 25.0) == 3.0
+    assert feed(370, 25.0) == 4.5
+    for seconds in range(380, 600, 10):
+        feed(seconds, 25.0)
+    assert rate.interval == 60.0
+    assert worker.demands[:2] == [('adaptive', 60.0), ('adaptive', 2.0)]
+    assert worker.demands[-1] == ('adaptive', 60.0)
+    assert changes[:3] == [2.0, 3.0, 4.5]
+
+
+def test_adaptive_rate_ignores_missing_values(make_reading, monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(u50_acquisition.time, 'monotonic', lambda: clock[0])
+    rate = AdaptiveRate(FakeWorker(), change_rates={'temperature': 1.0})
+    rate.update(make_reading(values=VALUES))
+    clock[0] = 10.0
+    assert rate.update(make_reading(values=("nan",) + VALUES[1:])) == 60.0
+    assert rate.score == 0.0 and rate.changes == 0
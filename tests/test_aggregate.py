@@ -0,0 +1,71 @@
+import json
+import math
+from datetime import datetime
+
+import pytest
+
+from conftest import VALUES
+from u50_webhook import PayloadBuilder, WindowAggregator
+
+NOON = datetime(2026, 10, 18, 12, 0, 0).timestamp()
+
+
+def aggregator():
+    records = []
+    return WindowAggregator(PayloadBuilder(), lambda record: records.append(json.loads(f"[{record}]")),
+                            seconds=60.0), records
+
+
+def temperatures(*values):
+    return [(value,) + VALUES[1:] for value in values]
+
+
+def test_one_record_per_window_with_means_and_ranges(make_reading):
+    stage, records = aggregator()
+    for seconds, values in zip((0, 20, 40), temperatures(20.0, 22.0, math.nan)):
+        stage.add(make_reading(seconds=seconds, values=values))
+    assert records == []
+    # The next window's first reading closes this one
+    stage.add(make_reading(seconds=60, values=VALUES))
+
+    [(critical, non_critical, aggregate)] = records
+    assert critical['timestamp'] == aggregate['timestamp'] == "2026-10-18T12:00:00"
+    assert critical['value']['d1'] == 21.0
+    assert critical['value']['d2'] == pytest.approx(VALUES[1])
+    assert non_critical['name'] == "non-critical"
+    assert aggregate['value']['window'] == 60.0
+    assert (aggregate['value']['d1_count'], aggregate['value']['d1_min'], aggregate['value']['d1_max']) == (2, 20.0, 22.0)
+    assert aggregate['value']['d2_count'] == 3
+    assert stage.status() == {'readings': 4, 'records': 1, 'late': 0, 'open': 1}
+
+
+def test_field_without_values_is_zero_with_no_range(make_reading):
+    stage, records = aggregator()
+    stage.add(make_reading(seconds=0, values=temperatures(math.nan)[0]))
+    stage.flush(everything=True)
+    critical, _, aggregate = records[0]
+    assert critical['value']['d1'] == 0.0
+    assert aggregate['value']['d1_count'] == 0
+    assert 'd1_min' not in aggregate['value']
+
+
+def test_flush_closes_only_windows_that_have_ended(make_reading):
+    stage, records = aggregator()
+    stage.add(make_reading(seconds=10))
+    stage.add(make_reading(seconds=10, port="COM2"))
+    assert stage.flush(NOON + 59) == 0
+    assert stage.flush(NOON + 60) == 2
+    assert len(records) == 2 and stage.status()['open'] == 0
+
+
+def test_late_reading_gets_a_record_of_its_own(make_reading):
+    stage, records = aggregator()
+    stage.add(make_reading(seconds=10))
+    stage.add(make_reading(seconds=70))
+    stage.add(make_reading(seconds=30, values=temperatures(99.0)[0]))
+    assert stage.status()['late'] == 1
+    stage.flush(everything=True)
+    # Every reading is in exactly one record
+    counts = [record[2]['value']['d1_count'] for record in records]
+    assert sorted(counts) == [1, 1, 1]
+    assert [record[0]['timestamp'] for record in records if record[0]['value']['d1'] == 99.0] == ["2026-10-18T12:00:00"]
@@ -0,0 +1,69 @@
+import json
+
+from u50_anomaly import AnomalyDetector, OUT_OF_RANGE, PROBE_ERROR
+from u50_webhook import PayloadBuilder, WebhookBatcher, DeadbandFilter
+
+
+class Uploader:
+    def __init__(self):
+        self.bodies = []
+
+
+def test_out_of_range_and_probe_error_flagged_once(make_reading):
+    detector = AnomalyDetector()
+    alerts = []
+    detector.subscribe(lambda reading, flags: alerts.append(flags))
+    values = (25.3, 15.0) + make_reading().values[2:]
+    for sequence in (1, 2):
+        flags = detector.update(make_reading(sequence, values, error='"'))
+    assert (OUT_OF_RANGE, 'ph', 15.0) in flags
+    assert (PROBE_ERROR, None, '"') in flags
+    assert len(alerts) == 1
+
+
+def test_alert_record_is_not_a_sample(make_reading):
+    detector = AnomalyDetector()
+    reading = make_reading(1, (25.3, 15.0) + make_reading().values[2:], error='"')
+    flags = detector.update(reading)
+    upload_filter = DeadbandFilter()
+    batcher = WebhookBatcher(Uploader(), PayloadBuilder(), upload_filter=upload_filter, detector=detector)
+
+    assert batcher.add_alert(reading, flags)
+    assert batcher.urgent and batcher.due()
+    entries = json.loads("[" + batcher.entries[0] + "]")
+    assert [entry['name'] for entry in entries] == ["alert", "alerts"]
+    assert entries[0]['value']['d2'] == 15.0
+    assert entries[1]['value'] == {"d2": "out_of_range", "probe": 'probe_error "'}
+    # The reading itself can still be queued as a sample afterwards
+    assert batcher.add(reading)
+
+
+def test_persistent_flag_on_an_unsent_parameter_keeps_the_deadband(make_reading):
+    # A blank 13th parameter is flagged missing on every reading, but no d
+    # field carries it
+    detector = AnomalyDetector()
+    upload_filter = DeadbandFilter(absolute={'temperature': 0.5})
+    batcher = WebhookBatcher(Uploader(), PayloadBuilder(), upload_filter=upload_filter, detector=detector)
+    values = make_reading().values[:12] + ("     ",)
+    for sequence in range(1, 21):
+        reading = make_reading(sequence, values)
+        detector.update(reading)
+        batcher.add(reading)
+    assert len(batcher) == 1
+    assert upload_filter.suppressed == 19
+
+
+def test_new_alert_on_an_uploaded_parameter_passes_the_deadband(make_reading):
+    detector = AnomalyDetector()
+    upload_filter = DeadbandFilter(absolute={'ph': 0.5})
+    batcher = WebhookBatcher(Uploader(), PayloadBuilder(), upload_filter=upload_filter, detector=detector)
+    values = make_reading().values
+    out_of_range = (values[0], 15.0) + values[2:]
+    for sequence, reading_values in enumerate((values, out_of_range, out_of_range), 1):
+        reading = make_reading(sequence, reading_values)
+        detector.update(reading)
+        batcher.add(reading)
+    # The second reading starts the alert; the third only repeats it and
+    # its pH has not moved since
+    assert len(batcher) == 2
+    assert upload_filter.suppressed == 1
@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+from conftest import FakeSerial, build_frame
+from u50_async import AsyncCollector, AsyncFrameReader, AsyncProbe, AsyncUploader
+from u50_webhook import DeadbandFilter
+
+
+def test_port_without_a_file_descriptor_is_read_on_the_executor():
+    # FakeSerial has no fileno(), like a Windows port
+    frame = build_frame()
+    probe = AsyncProbe("COM1", deadline=0.5)
+    probe.serial_conn = FakeSerial([frame + b"\r\n", b""], chunk=50)
+    probe.frame_reader = AsyncFrameReader(probe.serial_conn, deadline=0.05)
+    probe.frame_reader.attach()
+    readings = []
+    probe.subscribe(readings.append)
+
+    async def poll_twice():
+        return await probe.poll_once(), await probe.poll_once()
+
+    reading, missed = asyncio.run(poll_twice())
+    assert reading.frame == frame and readings == [reading]
+    assert reading.latency is not None
+    assert missed is None and probe.misses == 1
+    assert probe.frame_reader.timeouts == 1
+
+
+class FakeServer:
+    # Minimal HTTP server answering each request with the next of 'replies':
+    # a status code, or raw bytes to send as the response
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.bodies = []
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                headers = {}
+                line = await reader.readline()
+                if not line:
+                    break
+                while line not in (b"\r\n", b""):
+                    line = await reader.readline()
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                self.bodies.append(json.loads(await reader.readexactly(int(headers['content-length']))))
+                reply = self.replies.pop(0) if self.replies else 200
+                if isinstance(reply, int):
+                    reply = f"HTTP/1.1 {reply} X\r\nContent-Length: 2\r\n\r\nok".encode()
+                writer.write(reply)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def upload(server, readings, polls, upload_filter=None):
+    # Runs the collector's upload loop against 'server', caching each of
+    # 'readings' in turn as the probe's latest for 'polls' upload ticks
+    listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+    collector = AsyncCollector(ports=["COM1"], uploader=AsyncUploader(f"http://127.0.0.1:{port}/hook"),
+                               upload_interval=0.02, upload_filter=upload_filter)
+    task = asyncio.create_task(collector.upload_loop())
+    try:
+        for reading in readings:
+            collector.cache.update(reading)
+            await asyncio.sleep(0.02 * polls)
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await collector.uploader.close()
+        listener.close()
+        await listener.wait_closed()
+    return collector
+
+
+def test_async_upload_retries_a_failed_reading(make_reading):
+    # A bad status line on the kept-alive connection is retried once on a
+    # fresh one before the post fails
+    server = FakeServer(503, b"garbage\r\n\r\n", b"garbage\r\n\r\n")
+    upload_filter = DeadbandFilter(absolute={'temperature': 0.5})
+    reading = make_reading(1)
+    collector = asyncio.run(upload(server, [reading], 10, upload_filter))
+
+    assert len(server.bodies) == 4
+    assert server.bodies[0] == server.bodies[3]
+    assert collector.upload_errors == 2
+    assert collector.last_upload_error.startswith("Malformed status line")
+    assert collector.last_sent["COM1"] is reading
+    assert upload_filter.passed == 1 and upload_filter.duplicates == 0
+
+
+def test_async_upload_sends_a_restarted_workers_readings(make_reading):
+    server = FakeServer()
+    upload_filter = DeadbandFilter()
+    readings = [make_reading(1), make_reading(1, seconds=600)]
+    collector = asyncio.run(upload(server, readings, 5, upload_filter))
+    assert len(server.bodies) == 2
+    assert collector.upload_errors == 0
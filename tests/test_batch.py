@@ -0,0 +1,25 @@
+import math
+
+import numpy as np
+
+from conftest import VALUES, build_frame
+from u50_batch import decode_frames, decode_numbers
+from u50_frame import parse_frame
+
+
+def test_decode_numbers_matches_float():
+    fields = [" 7.01", "-12.0", "  210", "0.123", "   -5", "   .5", "     ", " 1.2.", " 12a4", "--1.0"]
+    decoded = decode_numbers(np.frombuffer("".join(fields).encode(), dtype=np.uint8).reshape(-1, 5))
+    for field, value in zip(fields, decoded):
+        try:
+            expected = float(field)
+        except ValueError:
+            assert math.isnan(value), field
+        else:
+            assert value == expected, field
+
+
+def test_batch_decoding_matches_parse_frame():
+    rows = [VALUES, (9.5, 6.8) + VALUES[2:]]
+    decoded = decode_frames([build_frame(values) for values in rows])
+    assert decoded['values'].tolist() == [list(parse_frame(build_frame(values)).values) for values in rows]
@@ -0,0 +1,92 @@
+import json
+
+import numpy as np
+import pytest
+
+from conftest import VALUES
+from u50_calibration import CalibrationTable, KELVIN, load_calibration, recalibrate_store
+from u50_frame import FRAME_DECODER
+from u50_query import StoreReader
+from u50_store import ReadingStore
+
+TEMPERATURE, PH, PH_MV, CONDUCTIVITY = (FRAME_DECODER.index[name]
+                                        for name in ('temperature', 'ph', 'ph_mv', 'conductivity'))
+
+
+def row(**values):
+    result = np.array(VALUES, dtype=np.float64)
+    for name, value in values.items():
+        result[FRAME_DECODER.index[name]] = value
+    return result[None, :]
+
+
+def test_port_entries_override_the_default_per_parameter():
+    table = CalibrationTable({
+        "*": {'conductivity': {'coefficients': [0.0, 2.0]}, 'orp': {'coefficients': [5.0]}},
+        "COM2": {'conductivity': {'coefficients': [0.1, 3.0]}},
+    })
+    com1 = table.transform(row(), "COM1")[0]
+    com2 = table.transform(row(), "COM2")[0]
+    assert com1[CONDUCTIVITY] == pytest.approx(0.246)
+    assert com2[CONDUCTIVITY] == pytest.approx(0.469)
+    assert com1[FRAME_DECODER.index['orp']] == com2[FRAME_DECODER.index['orp']] == 5.0
+    assert com1[TEMPERATURE] == VALUES[TEMPERATURE]
+    assert np.isnan(table.transform(row(conductivity=np.nan), "COM1")[0, CONDUCTIVITY])
+
+
+def test_compensation_uses_the_calibrated_temperature():
+    table = CalibrationTable({"*": {
+        'temperature': {'coefficients': [-10.0, 1.0]},
+        'conductivity': {'compensation': 'linear', 'alpha': 0.02},
+        'ph': {'source': 'ph_mv', 'coefficients': [7.0, -0.0169], 'compensation': 'nernst'},
+    }})
+    calibrated = table.transform(row(temperature=45.0, conductivity=1.2, ph_mv=-59.0))[0]
+    assert calibrated[TEMPERATURE] == 35.0
+    assert calibrated[CONDUCTIVITY] == pytest.approx(1.0)
+    assert calibrated[PH] == pytest.approx(7.0 + 0.0169 * 59.0 * (25.0 + KELVIN) / (35.0 + KELVIN))
+    assert calibrated[PH_MV] == -59.0
+
+
+def test_apply_keeps_the_decoded_values(make_reading):
+    table = CalibrationTable({"COM1": {'conductivity': {'coefficients': [0.0, 10.0]}}})
+    reading = table.apply(make_reading())
+    assert reading.raw_values == VALUES
+    assert reading.values[CONDUCTIVITY] == pytest.approx(1.23)
+    assert isinstance(reading.values, tuple)
+
+
+def test_batch_calibrates_each_row_by_its_probe():
+    table = CalibrationTable({"COM2": {'conductivity': {'coefficients': [0.0, 10.0]}}})
+    values = np.vstack([row(), row(), row()])
+    result = table.transform_batch(values, [0, 1, 0], ["COM1", "COM2"])
+    assert result[:, CONDUCTIVITY] == pytest.approx([0.123, 1.23, 0.123])
+
+
+def test_bad_entries_are_rejected():
+    with pytest.raises(ValueError, match="unknown parameter"):
+        CalibrationTable({"*": {'chlorophyll': {}}})
+    with pytest.raises(ValueError, match="Unknown compensation"):
+        CalibrationTable({"*": {'ph': {'compensation': 'cubic'}}}).plan("COM1")
+    with pytest.raises(ValueError, match="cannot be temperature compensated"):
+        CalibrationTable({"*": {'temperature': {'compensation': 'linear'}}}).plan("COM1")
+
+
+def test_store_is_recalibrated_into_a_new_store(make_reading, tmp_path):
+    store = ReadingStore(str(tmp_path / "raw"), segment_rows=100)
+    for sequence in range(1, 4):
+        store.append(make_reading(sequence))
+    store.append(make_reading(4, port="COM2"))
+    store.close()
+
+    path = tmp_path / "calibration.json"
+    path.write_text(json.dumps({'version': "2026-10", 'probes': {
+        "COM2": {'conductivity': {'coefficients': [0.0, 10.0]}}}}))
+    table = load_calibration(str(path))
+    assert recalibrate_store(str(tmp_path / "raw"), table, str(tmp_path / "calibrated")) == 4
+
+    reader = StoreReader(str(tmp_path / "calibrated"))
+    [chunk] = list(reader.select())
+    assert reader.probes == ["COM1", "COM2"]
+    assert chunk['values'][:, CONDUCTIVITY] == pytest.approx([0.123] * 3 + [1.23])
+    with open(tmp_path / "calibrated" / "calibration.json") as f:
+        assert json.load(f)['version'] == "2026-10"
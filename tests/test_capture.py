@@ -0,0 +1,87 @@
+import sys
+from datetime import datetime
+
+import pytest
+
+from conftest import VALUES, build_frame
+from u50_capture import FrameCapture, Replayer, read_capture, main
+
+# 2026-10-18 12:00:00 local time in microseconds
+WALL_US = int(datetime(2026, 10, 18, 12, 0, 0).timestamp() * 1e6)
+
+
+def record_session(path, ports=("COM1", "COM2"), frames=3, start_ns=0):
+    capture = FrameCapture(str(path))
+    for i in range(frames):
+        for port in ports:
+            capture.record(port, build_frame(), start_ns + i * 10**9, WALL_US + i * 10**6)
+    capture.close()
+    return capture
+
+
+def test_replay_hands_recorded_frames_to_subscribers(tmp_path):
+    path = tmp_path / "run.u50cap"
+    record_session(path)
+
+    readings = []
+    replayer = Replayer(str(path), speed=None)
+    replayer.subscribe(readings.append)
+    assert replayer.run() == 6
+    assert [r.port for r in readings] == ["COM1", "COM2"] * 3
+    assert [r.sequence for r in readings] == list(range(1, 7))
+    assert readings[2].received == datetime(2026, 10, 18, 12, 0, 1)
+    assert readings[0].latency is None
+    assert readings[0].values[0] == VALUES[0]
+
+
+def test_reopened_capture_keeps_its_port_ids(tmp_path):
+    path = tmp_path / "run.u50cap"
+    record_session(path, ports=("COM1",))
+    capture = record_session(path, ports=("COM2", "COM1"))
+    assert capture.port_ids == {"COM1": 0, "COM2": 1}
+    assert [record[:2] for record in read_capture(str(path))][-2:] == [("COM2", 1), ("COM1", 0)]
+
+
+def test_truncated_record_and_bad_frames_are_skipped(tmp_path):
+    path = tmp_path / "run.u50cap"
+    capture = FrameCapture(str(path))
+    capture.record("COM1", build_frame(), 0, WALL_US)
+    capture.record("COM1", b"#RD garbage", 1, WALL_US)
+    capture.record("COM1", build_frame(), 2, WALL_US)
+    capture.close()
+    with open(path, 'r+b') as f:
+        f.truncate(path.stat().st_size - 10)
+
+    replayer = Replayer(str(path), speed=None)
+    assert replayer.run() == 1
+    assert (replayer.frames, replayer.invalid) == (2, 1)
+
+
+def test_subscriber_errors_do_not_stop_the_replay(tmp_path):
+    path = tmp_path / "run.u50cap"
+    record_session(path, ports=("COM1",))
+    readings = []
+
+    def broken(reading):
+        raise RuntimeError("disk full")
+    replayer = Replayer(str(path), speed=None)
+    replayer.subscribe(broken)
+    replayer.subscribe(readings.append)
+    replayer.run()
+    assert len(readings) == 3
+    assert replayer.last_error == "Subscriber error: disk full"
+
+
+def test_not_a_capture(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"something else")
+    with pytest.raises(ValueError, match="not a U-50 capture"):
+        list(read_capture(str(path)))
+
+
+@pytest.mark.parametrize('argv', [["run.u50cap", "fast"], ["run.u50cap", "--store"],
+                                  ["run.u50cap", "--verbose"]])
+def test_command_line_rejects_bad_arguments(argv, capsys, monkeypatch):
+    monkeypatch.setattr(sys, 'argv', ["u50_capture.py"] + argv)
+    main()
+    assert "Usage: u50_capture.py CAPTURE" in capsys.readouterr().out
@@ -0,0 +1,103 @@
+from conftest import VALUES
+from u50_webhook import DeadbandFilter
+
+
+def moved(values, **changes):
+    # VALUES with some parameters replaced, by schema index
+    values = list(values)
+    for index, value in changes.items():
+        values[int(index[1:])] = value
+    return tuple(values)
+
+
+def test_without_thresholds_every_new_reading_passes(make_reading):
+    upload_filter = DeadbandFilter()
+    assert upload_filter.update(make_reading(1)) == (True,) * 13
+    assert upload_filter.update(make_reading(2)) == (True,) * 13
+
+
+def test_absolute_and_relative_deadbands(make_reading):
+    upload_filter = DeadbandFilter(absolute={'temperature': 0.5}, relative={'conductivity': 0.1})
+    assert upload_filter.update(make_reading(1))
+    # Inside both deadbands
+    assert upload_filter.update(make_reading(2, moved(VALUES, p0=25.7, p4=0.13))) is None
+    # conductivity 0.123 -> 0.14 is more than 10%
+    assert upload_filter.update(make_reading(3, moved(VALUES, p4=0.14)))
+    assert upload_filter.passed == 2 and upload_filter.suppressed == 1
+
+
+def test_changes_are_measured_from_the_last_value_sent(make_reading):
+    upload_filter = DeadbandFilter(absolute={'temperature': 0.5})
+    upload_filter.update(make_reading(1))
+    # Creeping 0.3 at a time passes once the total exceeds the deadband
+    assert upload_filter.update(make_reading(2, moved(VALUES, p0=25.6))) is None
+    assert upload_filter.update(make_reading(3, moved(VALUES, p0=25.9))) is not None
+    assert upload_filter.update(make_reading(4, moved(VALUES, p0=26.2))) is None
+
+
+def test_per_field_reports_only_changed_parameters(make_reading):
+    upload_filter = DeadbandFilter(absolute={'temperature': 0.5, 'ph': 0.1}, per_field=True)
+    upload_filter.update(make_reading(1))
+    changed = upload_filter.update(make_reading(2, moved(VALUES, p0=27.0, p1=7.05)))
+    assert changed[0] and not any(changed[1:])
+    # pH's reference did not move, so its second small step adds up
+    changed = upload_filter.update(make_reading(3, moved(VALUES, p0=27.0, p1=7.15)))
+    assert changed[1] and not changed[0]
+
+
+def test_unwatched_parameters_do_not_trigger(make_reading):
+    upload_filter = DeadbandFilter(absolute={'temperature': 0.5})
+    upload_filter.update(make_reading(1))
+    assert upload_filter.update(make_reading(2, moved(VALUES, p0=30.0)), watched=(1, 2)) is None
+
+
+def test_force_and_heartbeat_send_regardless(make_reading):
+    upload_filter = DeadbandFilter(absolute={'temperature': 0.5}, heartbeat=0.0)
+    upload_filter.update(make_reading(1))
+    assert upload_filter.update(make_reading(2)) is not None
+
+    upload_filter = DeadbandFilter(absolute={'temperature': 0.5})
+    upload_filter.update(make_reading(1))
+    assert upload_filter.update(make_reading(2), force=True) == (True,) * 13
+
+
+def test_a_reading_is_passed_once(make_reading):
+    upload_filter = DeadbandFilter()
+    reading = make_reading(1)
+    assert upload_filter.update(reading)
+    assert upload_filter.update(reading) is None
+    assert upload_filter.update(reading, force=True) is None
+    assert upload_filter.duplicates == 2
+
+
+def test_a_restarted_worker_is_not_a_duplicate(make_reading):
+    # A new worker numbers its readings from 1 again
+    upload_filter = DeadbandFilter()
+    first = make_reading(1)
+    assert upload_filter.update(first)
+    restarted = make_reading(1, seconds=600)
+    assert restarted.sequence == first.sequence
+    assert upload_filter.update(restarted)
+    # Ports are tracked separately
+    assert upload_filter.update(make_reading(1, port="COM2"))
+
+
+def test_rollback_lets_a_failed_reading_through_again(make_reading):
+    upload_filter = DeadbandFilter(absolute={'temperature': 0.5})
+    upload_filter.update(make_reading(1))
+    reading = make_reading(2, moved(VALUES, p0=27.0))
+    assert upload_filter.update(reading)
+    assert upload_filter.rollback(reading)
+    assert upload_filter.passed == 1
+    # Retried, it is neither a duplicate nor measured against itself
+    assert upload_filter.update(reading) is not None
+    assert upload_filter.duplicates == 0
+
+
+def test_rollback_of_a_superseded_reading_is_ignored(make_reading):
+    upload_filter = DeadbandFilter()
+    first = make_reading(1)
+    upload_filter.update(first)
+    upload_filter.update(make_reading(2))
+    assert not upload_filter.rollback(first)
+    assert upload_filter.update(make_reading(2)) is None
@@ -0,0 +1,71 @@
+import csv
+import math
+
+import pytest
+
+from u50_export import ExportSink, COLUMNS
+
+
+def read_rows(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.reader(f))
+
+
+def test_files_rotate_per_hour_with_one_header_each(make_reading, tmp_path):
+    sink = ExportSink(str(tmp_path), rotate='hour', flush_interval=60)
+    sink.append(make_reading(1))
+    sink.append(make_reading(2))
+    sink.append(make_reading(3, seconds=3600))
+    sink.close()
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["u50-20261018-12.csv", "u50-20261018-13.csv"]
+    rows = read_rows(tmp_path / "u50-20261018-12.csv")
+    assert rows[0][:len(COLUMNS)] == COLUMNS
+    assert len(rows) == 3
+    assert rows[1][:5] == ["2026-10-18 12:00:01", "COM1", "SITE01", "0", "0"]
+    assert rows[1][5] == "2026-10-18 12:05:30"
+    assert float(rows[1][len(COLUMNS)]) == 25.3
+    assert sink.written == 3
+
+
+def test_restart_appends_to_the_current_file_without_a_second_header(make_reading, tmp_path):
+    sink = ExportSink(str(tmp_path), rotate='day', flush_interval=60)
+    sink.append(make_reading(1))
+    sink.close()
+    sink = ExportSink(str(tmp_path), rotate='day', flush_interval=60)
+    sink.append(make_reading(2))
+    sink.close()
+
+    rows = read_rows(tmp_path / "u50-20261018.csv")
+    assert [row[0] for row in rows] == ["received", "2026-10-18 12:00:01", "2026-10-18 12:00:02"]
+
+
+def test_missing_values_are_written_as_empty_cells(make_reading, tmp_path):
+    reading = make_reading(1)
+    reading.values = [math.nan] + list(reading.values[1:])
+    sink = ExportSink(str(tmp_path), flush_interval=60)
+    sink.append(reading)
+    sink.close()
+    row = read_rows(tmp_path / "u50-20261018-12.csv")[1]
+    assert row[len(COLUMNS)] == ""
+
+
+def test_flush_makes_rows_visible_before_close(make_reading, tmp_path):
+    sink = ExportSink(str(tmp_path), flush_interval=60)
+    sink.append(make_reading(1))
+    sink.flush()
+    assert len(read_rows(tmp_path / "u50-20261018-12.csv")) == 2
+    sink.close()
+
+
+def test_readings_after_close_are_dropped(make_reading, tmp_path):
+    sink = ExportSink(str(tmp_path), flush_interval=60)
+    sink.close()
+    sink.append(make_reading(1))
+    assert sink.written == 0
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_unknown_rotation_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="rotate must be one of"):
+        ExportSink(str(tmp_path), rotate='week')
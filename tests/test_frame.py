@@ -0,0 +1,26 @@
+import math
+
+from conftest import VALUES, build_frame
+from u50_frame import FRAME_DECODER, parse_frame
+
+
+def test_parse_frame_decodes_every_parameter():
+    reading = parse_frame(build_frame(site="RIVER"), "COM1")
+    assert len(reading.values) == len(FRAME_DECODER) == 13
+    assert reading.values == VALUES
+    assert reading.site_name == "RIVER"
+    assert reading.value('ph') == 7.01
+    assert reading.latency_text == "-"
+
+
+def test_parse_frame_rejects_short_or_foreign_frames():
+    frame = build_frame()
+    assert parse_frame(frame[:100]) is None
+    assert parse_frame(b"#XX" + frame[3:]) is None
+
+
+def test_unparsable_field_is_nan():
+    values = ("  ---",) + VALUES[1:]
+    reading = parse_frame(build_frame(values))
+    assert math.isnan(reading.values[0])
+    assert reading.values[1:] == VALUES[1:]
@@ -0,0 +1,70 @@
+import numpy as np
+
+from conftest import VALUES, build_frame
+from u50_batch import frames_to_matrix
+from u50_frame import PARAMETERS
+from u50_offsets import analyse, load_frames, load_references, suggest_scale
+from u50_capture import FrameCapture
+
+
+def varied_frames(count=50):
+    # Frames whose temperature and pH move, with a unit letter after every
+    # value the way the probe sends them; returns (frames, references)
+    rng = np.random.default_rng(1)
+    frames, references = [], []
+    for _ in range(count):
+        temperature = round(float(rng.uniform(10, 30)), 1)
+        ph = round(float(rng.uniform(6, 8)), 2)
+        frame = bytearray(build_frame((temperature, ph) + VALUES[2:]))
+        for parameter in PARAMETERS:
+            frame[parameter['offset'] + parameter['width']] = ord('U')
+        frames.append(bytes(frame))
+        references.append((temperature, ph * 10))
+    return frames, np.array(references)
+
+
+def test_fields_are_found_at_the_documented_offsets():
+    frames, _ = varied_frames()
+    stats, fields = analyse(frames_to_matrix(frames, 202))
+    assert [(f['offset'], f['width']) for f in fields] == [(p['offset'], p['width']) for p in PARAMETERS]
+    assert [f['constant'] for f in fields[:3]] == [False, False, True]
+    assert np.allclose(fields[0]['values'][:1], float(frames[0][33:38]))
+    assert stats['change_rate'][0] == 0
+
+
+def test_references_name_fields_and_suggest_a_scale():
+    frames, references = varied_frames()
+    _, fields = analyse(frames_to_matrix(frames, 202), ['temp', 'ph10'], references)
+    assert (fields[0]['reference'], fields[0]['scale']) == ('temp', 1.0)
+    assert (fields[1]['reference'], fields[1]['scale']) == ('ph10', 10.0)
+    assert fields[0]['r'] > 0.999
+    assert 'reference' not in fields[2]
+
+
+def test_scale_snaps_only_near_a_power_of_ten():
+    assert suggest_scale(0.0995) == 0.1
+    assert suggest_scale(-1000.0) == -1000.0
+    assert suggest_scale(2.5) == 2.5
+    assert suggest_scale(0.0) is None
+    assert suggest_scale(np.nan) is None
+
+
+def test_frames_load_from_a_capture_or_an_archive(tmp_path):
+    frames, _ = varied_frames(3)
+    capture = FrameCapture(str(tmp_path / "run.u50cap"))
+    for frame in frames:
+        capture.record("COM1", frame)
+    capture.close()
+    (tmp_path / "archive.txt").write_bytes(b"\n".join(frames) + b"\n")
+
+    assert load_frames(str(tmp_path / "run.u50cap")) == frames
+    assert load_frames(str(tmp_path / "archive.txt")) == frames
+
+
+def test_blank_reference_cells_are_unknown(tmp_path):
+    path = tmp_path / "reference.csv"
+    path.write_text("temp,ph\n21.5,7.0\n,7.1\n")
+    names, values = load_references(str(path))
+    assert names == ['temp', 'ph']
+    assert values.shape == (2, 2)
+    assert np.isnan(values[1, 0]) and values[1, 1] == 7.1
@@ -0,0 +1,34 @@
+import json
+import math
+
+from u50_webhook import PayloadBuilder, WEBHOOK_FIELDS
+
+
+def test_build_json_matches_values(make_reading):
+    builder = PayloadBuilder()
+    payload = json.loads(builder.build_json(make_reading().values))
+    assert payload[0]['name'] == "critical"
+    assert payload[0]['value']['d1'] == 25.3
+    assert set(payload[0]['value']) | set(payload[1]['value']) == set(WEBHOOK_FIELDS)
+
+
+def test_non_finite_values_stay_valid_json():
+    builder = PayloadBuilder()
+    values = (math.inf, -math.inf, math.nan) + (1.5,) * 10
+    payload = json.loads(builder.build_json(values))
+    assert payload[0]['value']['d1'] == payload[0]['value']['d2'] == payload[0]['value']['d3'] == 0.0
+    entries = json.loads("[" + builder.build_entries(values, "2026-10-18T12:00:00") + "]")
+    assert entries[0]['value']['d1'] == 0.0
+
+
+def test_changed_fields_only():
+    builder = PayloadBuilder()
+    changed = [False] * 13
+    changed[0] = changed[6] = True
+    values = (25.3, 7.01, -12.0, 210.0, 0.123, 5.6, 8.4, 0.08, 0.0, 1.25, 1.0, 88.0, 1.0)
+    assert json.loads(builder.build_json(values, changed)) == [
+        {"name": "critical", "value": {"d1": 25.3}},
+        {"name": "non-critical", "value": {"d7": 8.4}}]
+    entries = json.loads("[" + builder.build_entries(values, "2026-10-18T12:00:00", changed) + "]")
+    assert [entry['value'] for entry in entries] == [{"d1": 25.3}, {"d7": 8.4}]
+    assert entries[0]['timestamp'] == "2026-10-18T12:00:00"
@@ -0,0 +1,135 @@
+import sys
+
+import numpy as np
+import pytest
+
+from conftest import VALUES
+from u50_query import StoreReader, block_index, parse_interval, main
+from u50_store import ReadingStore
+
+START = np.datetime64("2026-10-18T00:00:00", 'us')
+
+
+def fill(path, count, segment_rows, step=60, probes=("COM1",)):
+    # 'count' readings 'step' seconds apart, probes taking turns; the
+    # temperature column counts the readings
+    store = ReadingStore(str(path), segment_rows=segment_rows, segment_seconds=86400 * 365)
+    timestamps = START + np.arange(count) * np.timedelta64(step, 's')
+    values = np.tile(np.array(VALUES, dtype=np.float32), (count, 1))
+    values[:, 0] = np.arange(count)
+    for i, port in enumerate(probes):
+        store.extend(timestamps[i::len(probes)], port, values[i::len(probes)])
+    store.close()
+    return timestamps, values
+
+
+def collect(results):
+    # downsample() streams finished buckets chunk by chunk; join them
+    results = list(results)
+    return {key: np.concatenate([result[key] for result in results]) for key in results[0]}
+
+
+def naive(timestamps, column, width):
+    buckets = {}
+    for timestamp, value in zip(timestamps.astype(np.int64), column):
+        buckets.setdefault(timestamp // width, []).append(value)
+    return buckets
+
+
+def test_parse_interval():
+    assert parse_interval("90s") == 90_000_000
+    assert parse_interval("15m") == 900_000_000
+    assert parse_interval("1h") == parse_interval(3600)
+
+
+def test_block_index_brackets_every_block():
+    timestamps = np.array([5, 1, 9, 7, 3, 8, 2])
+    assert block_index(timestamps, block=3).tolist() == [[1, 9], [3, 8], [2, 2]]
+
+
+def test_select_narrows_a_range_through_the_block_index(tmp_path):
+    # Enough rows for several index blocks in each of two segments
+    timestamps, values = fill(tmp_path, 10000, 6000)
+    reader = StoreReader(str(tmp_path))
+    assert len(reader.segments) == 2
+    chunks = list(reader.select(timestamps[5000], timestamps[7000], parameters=['temperature']))
+    selected = np.concatenate([chunk['values'][:, 0] for chunk in chunks])
+    assert selected.tolist() == list(range(5000, 7000))
+    # The sealed segment's index was saved beside it
+    assert len(list(tmp_path.glob("*.idx.npy"))) == 1
+
+
+def test_downsample_matches_a_naive_aggregate(tmp_path):
+    timestamps, values = fill(tmp_path, 500, 1000, step=7)
+    width = parse_interval("5m")
+    result = collect(StoreReader(str(tmp_path)).downsample("5m", parameters=['temperature']))
+    expected = naive(timestamps, values[:, 0], width)
+    assert len(result['bucket']) == len(expected)
+    for i, (bucket, column) in enumerate(sorted(expected.items())):
+        assert result['bucket'][i] == np.datetime64(int(bucket * width), 'us')
+        assert result['count'][i, 0] == len(column)
+        assert result['mean'][i, 0] == pytest.approx(np.mean(column))
+        assert result['min'][i, 0] == min(column) and result['max'][i, 0] == max(column)
+        assert result['last'][i, 0] == column[-1]
+
+
+def test_a_bucket_split_between_segments_is_carried_over(tmp_path):
+    # 7 rows a segment, 10 rows a bucket: every bucket spans two segments
+    fill(tmp_path, 40, 7)
+    reader = StoreReader(str(tmp_path))
+    assert len(reader.segments) == 6
+    result = collect(reader.downsample("10m", parameters=['temperature']))
+    assert result['count'][:, 0].tolist() == [10, 10, 10, 10]
+    assert result['last'][:, 0].tolist() == [9, 19, 29, 39]
+    assert result['bucket'].tolist() == sorted(set(result['bucket'].tolist()))
+
+
+def test_nan_is_left_out_of_every_aggregate_but_last(tmp_path):
+    store = ReadingStore(str(tmp_path), segment_rows=10)
+    values = np.tile(np.array(VALUES, dtype=np.float32), (3, 1))
+    values[:, 0] = [1.0, 3.0, np.nan]
+    store.extend(START + np.arange(3) * np.timedelta64(1, 's'), "COM1", values)
+    store.close()
+    result = collect(StoreReader(str(tmp_path)).downsample("1h", parameters=['temperature']))
+    assert result['count'][0, 0] == 2 and result['mean'][0, 0] == 2.0
+    assert result['max'][0, 0] == 3.0 and np.isnan(result['last'][0, 0])
+
+
+def test_probe_and_site_filters(make_reading, tmp_path):
+    store = ReadingStore(str(tmp_path), segment_rows=10)
+    store.append(make_reading(1, site="RIVER"))
+    store.append(make_reading(2, site="LAKE"))
+    store.append(make_reading(3, port="COM2", site="RIVER"))
+    store.close()
+    reader = StoreReader(str(tmp_path))
+    # Each site a port reported is a probe entry of its own
+    assert list(zip(reader.probes, reader.sites)) == [("COM1", "RIVER"), ("COM1", "LAKE"), ("COM2", "RIVER")]
+
+    def rows(**where):
+        return sum(len(chunk['timestamp']) for chunk in reader.select(**where))
+    assert rows(probe="COM1") == 2
+    assert rows(site="RIVER") == 2
+    assert rows(probe="COM1", site="RIVER") == 1
+
+
+def test_unknown_names_fail_before_any_chunk(tmp_path):
+    fill(tmp_path, 10, 10)
+    reader = StoreReader(str(tmp_path))
+    for where in ({'probe': "COM9"}, {'site': "SEA"}, {'parameters': ['bogus']}):
+        with pytest.raises(ValueError):
+            reader.select(**where)
+        with pytest.raises(ValueError):
+            reader.downsample("1h", **where)
+
+
+def test_command_line_prints_usage_for_bad_options(tmp_path, monkeypatch, capsys):
+    fill(tmp_path, 10, 10)
+    for args in (["1h", "--probe"], ["1h", "--bogus", "x"], ["1h", "--probe", "COM9"]):
+        monkeypatch.setattr(sys, 'argv', ["u50_query.py", str(tmp_path)] + args)
+        main()
+        assert "Usage:" in capsys.readouterr().out
+
+    monkeypatch.setattr(sys, 'argv', ["u50_query.py", str(tmp_path), "1h", "--param", "temperature"])
+    main()
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith("bucket,temperature_count") and lines[1].split(",")[1] == "10"
@@ -0,0 +1,17 @@
+from conftest import FakeSerial, build_frame
+from u50_serial import FrameReader, RD_COMMAND
+
+
+def test_frame_reader_joins_chunks_and_skips_noise():
+    frame = build_frame()
+    port = FakeSerial([b"\x00junk" + frame + b"\r\n"], chunk=7)
+    reader = FrameReader(port, deadline=1.0)
+    assert reader.poll(RD_COMMAND) == frame
+    assert port.written == [RD_COMMAND]
+    assert reader.last_latency is not None
+
+
+def test_frame_reader_times_out_without_an_answer():
+    reader = FrameReader(FakeSerial(), deadline=0.05)
+    assert reader.poll(RD_COMMAND) is None
+    assert reader.timeouts == 1 and reader.last_latency is None
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from conftest import VALUES
+from u50_stats import RollingWindow, RollingStats
+
+
+def add(window, timestamp, *values):
+    values = np.array(values, dtype=np.float64)
+    window.add(timestamp, values, ~np.isnan(values))
+
+
+def test_window_matches_numpy_over_the_readings_it_holds():
+    rng = np.random.default_rng(3)
+    series = 1500.0 + rng.normal(0, 0.01, 200)
+    window = RollingWindow(60, 1, buckets=60)
+    for second, value in enumerate(series):
+        add(window, second, value)
+    stats = window.statistics()
+    # At second 199 the window holds slots 140..199
+    held = series[140:]
+    assert stats['count'][0] == 60
+    assert stats['mean'][0] == pytest.approx(held.mean())
+    assert stats['var'][0] == pytest.approx(held.var(ddof=1), rel=1e-6)
+    assert (stats['min'][0], stats['max'][0]) == (held.min(), held.max())
+
+
+def test_buckets_expire_after_a_gap():
+    window = RollingWindow(60, 1, buckets=6)
+    add(window, 0, 1.0)
+    add(window, 5, 3.0)
+    add(window, 10, 5.0)
+    assert window.statistics()['count'][0] == 3
+    # 10 s buckets: slot 0 falls out at 60 s, slot 1 at 70 s
+    add(window, 60, 7.0)
+    stats = window.statistics()
+    assert stats['count'][0] == 2
+    assert stats['mean'][0] == 6.0
+    add(window, 500, 9.0)
+    stats = window.statistics()
+    assert (stats['count'][0], stats['mean'][0], stats['min'][0]) == (1, 9.0, 9.0)
+    assert np.isnan(stats['var'][0])
+
+
+def test_missing_values_are_left_out_per_parameter():
+    window = RollingWindow(60, 2)
+    add(window, 0, 1.0, np.nan)
+    add(window, 1, 3.0, np.nan)
+    stats = window.statistics()
+    assert stats['count'].tolist() == [2, 0]
+    assert stats['mean'][0] == 2.0
+    assert np.isnan(stats['mean'][1]) and np.isnan(stats['min'][1]) and np.isnan(stats['ewma'][1])
+    add(window, 2, 5.0, 10.0)
+    assert window.statistics()['ewma'][1] == 10.0
+
+
+def test_ewma_decays_with_the_window_time_constant():
+    window = RollingWindow(60, 1)
+    add(window, 0, 0.0)
+    add(window, 60, 1.0)
+    assert window.statistics()['ewma'][0] == pytest.approx(1 - np.exp(-1))
+
+
+def test_rolling_stats_keep_each_probe_apart(make_reading):
+    stats = RollingStats(windows={'1m': 60, '1h': 3600})
+    for sequence in range(1, 4):
+        stats.update(make_reading(sequence))
+    stats.update(make_reading(1, port="COM2", values=(30.0,) + VALUES[1:]))
+
+    assert stats.ports() == ["COM1", "COM2"]
+    assert stats.statistics("COM3") is None
+    com1 = stats.statistics("COM1")
+    assert set(com1) == {'1m', '1h'}
+    assert com1['1m']['count'][0] == 3
+    assert com1['1m']['mean'][0] == VALUES[0]
+    assert stats.statistics("COM2")['1h']['mean'][0] == 30.0
@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+
+from conftest import VALUES
+from u50_store import ReadingStore, load_segment, default_store_path
+
+
+def test_readings_round_trip_through_a_reopened_store(make_reading, tmp_path):
+    store = ReadingStore(str(tmp_path), segment_rows=100)
+    for sequence in range(1, 4):
+        store.append(make_reading(sequence))
+    store.close()
+
+    store = ReadingStore(str(tmp_path), segment_rows=100)
+    store.append(make_reading(4, port="COM2"))
+    store.close()
+
+    paths = store.segment_paths()
+    assert len(paths) == 1
+    columns = load_segment(paths[0])
+    assert len(columns['timestamp']) == 4
+    assert columns['timestamp'][0] == np.datetime64("2026-10-18T12:00:01")
+    assert columns['probe'].tolist() == [0, 0, 0, 1]
+    assert store.probes == ["COM1", "COM2"]
+    assert np.allclose(columns['values'][0], VALUES)
+
+
+def test_segments_roll_over_when_full_or_past_their_slot(make_reading, tmp_path):
+    store = ReadingStore(str(tmp_path), segment_rows=3, segment_seconds=3600)
+    for sequence in range(1, 6):
+        store.append(make_reading(sequence))
+    # Into the next hour's slot
+    store.append(make_reading(6, seconds=3600))
+    store.close()
+    counts = [len(load_segment(path)['timestamp']) for path in store.segment_paths()]
+    assert counts == [3, 2, 1]
+
+
+def test_segment_rows_follow_the_poll_rate(tmp_path):
+    assert ReadingStore(str(tmp_path / "a"), segment_seconds=3600, rate=0.2).segment_rows == 720
+    assert ReadingStore(str(tmp_path / "b"), segment_rows=10).segment_rows == 10
+
+
+def test_calibrated_readings_are_stored_raw(make_reading, tmp_path):
+    reading = make_reading()
+    reading.raw_values = reading.values
+    reading.values = tuple(value * 2 for value in reading.values)
+    store = ReadingStore(str(tmp_path), segment_rows=10)
+    store.append(reading)
+    store.close()
+    assert np.allclose(load_segment(store.segment_paths()[0])['values'][0], VALUES)
+
+
+def test_bulk_extend_splits_rows_across_segments(tmp_path):
+    store = ReadingStore(str(tmp_path), segment_rows=4, segment_seconds=3600)
+    timestamps = np.datetime64("2026-10-18T12:00:00") + np.arange(10) * np.timedelta64(10, 'm')
+    values = np.tile(np.array(VALUES, dtype=np.float32), (10, 1))
+    store.extend(timestamps, "COM1", values)
+    store.close()
+    segments = [load_segment(path) for path in store.segment_paths()]
+    assert sum(len(segment['timestamp']) for segment in segments) == 10
+    for segment in segments:
+        hours = segment['timestamp'].astype('datetime64[h]')
+        assert (hours == hours[0]).all()
+
+
+def test_default_store_path_is_per_user(monkeypatch, tmp_path):
+    monkeypatch.setattr(os, 'name', 'posix')
+    monkeypatch.setenv('XDG_DATA_HOME', str(tmp_path))
+    assert default_store_path() == os.path.join(str(tmp_path), "u50", "readings")
@@ -0,0 +1,111 @@
+import json
+import time
+
+import requests
+
+from u50_webhook import PayloadBuilder, UploadQueue
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeUploader:
+    # Answers each post with the next of 'replies': a status code, or an
+    # exception to raise; 200 once they run out. Keeps the bodies it accepted.
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.accepted = []
+
+    def post(self, body, compressed=False):
+        reply = self.replies.pop(0) if self.replies else 200
+        if isinstance(reply, Exception):
+            raise reply
+        if reply < 300:
+            self.accepted.append(json.loads(body))
+        return Response(reply)
+
+
+def sent_temperatures(uploader):
+    return [entry['value']['d1'] for body in uploader.accepted for entry in body if entry['name'] == "critical"]
+
+
+def make_queue(uploader, tmp_path, **options):
+    return UploadQueue(uploader, PayloadBuilder(), str(tmp_path / "journal.jsonl"), **options)
+
+
+def test_failed_batch_is_requeued_and_sent_in_order(make_reading, tmp_path):
+    uploader = FakeUploader(requests.ConnectionError("down"), 503)
+    queue = make_queue(uploader, tmp_path, max_readings=2)
+    for sequence, temperature in enumerate((20.0, 21.0, 22.0), 1):
+        queue.add(make_reading(sequence, (temperature,) + make_reading().values[1:]))
+
+    try:
+        queue.flush()
+    except requests.ConnectionError:
+        pass
+    assert queue.flush().status_code == 503
+    assert len(queue) == 3 and queue.readings_sent == 0
+    assert queue.flush().status_code == 200
+    assert queue.flush().status_code == 200
+    assert sent_temperatures(uploader) == [20.0, 21.0, 22.0]
+    assert len(queue) == 0
+
+
+def test_rejected_batch_is_not_retried(make_reading, tmp_path):
+    uploader = FakeUploader(400)
+    queue = make_queue(uploader, tmp_path)
+    queue.add(make_reading(1))
+    assert queue.flush().status_code == 400
+    assert len(queue) == 0
+    # Gone, but not delivered
+    assert queue.readings_sent == 0 and queue.readings_rejected == 1
+
+
+def test_overflow_goes_to_the_journal_and_survives_a_restart(make_reading, tmp_path):
+    queue = make_queue(FakeUploader(), tmp_path, max_readings=2, max_buffer=2)
+    for sequence in range(1, 6):
+        queue.add(make_reading(sequence, (float(sequence),) + make_reading().values[1:]))
+    assert queue.journaled == 3
+    # What was still in memory follows the journal
+    queue.stop()
+    assert queue.journaled == 5
+
+    uploader = FakeUploader(503)
+    queue = make_queue(uploader, tmp_path, max_readings=2)
+    assert len(queue) == 5 and queue.due()
+    queue.flush()
+    # A failed journal batch leaves the read position where it was
+    assert queue.journaled == 5
+    queue.flush()
+    queue.stop()
+    assert sent_temperatures(uploader) == [3.0, 4.0]
+
+    uploader = FakeUploader()
+    queue = make_queue(uploader, tmp_path, max_readings=2)
+    assert queue.journaled == 3
+    while len(queue):
+        queue.flush()
+    assert sent_temperatures(uploader) == [5.0, 1.0, 2.0]
+    assert not (tmp_path / "journal.jsonl").exists()
+
+
+def test_sender_backs_off_and_recovers(make_reading, tmp_path):
+    sends = []
+    uploader = FakeUploader(requests.ConnectionError("down"), 503)
+    queue = make_queue(uploader, tmp_path, max_readings=1, base_delay=0.01, drain_rate=1000,
+                       on_send=lambda response, error: sends.append(error))
+    queue.start()
+    try:
+        queue.add(make_reading(1))
+        deadline = time.monotonic() + 5
+        while len(sends) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert sends[:2] == ["down", "HTTP 503"]
+        assert sends[2] is None
+        status = queue.status()
+        assert status['failures'] == 0 and status['last_error'] is None
+        assert status['readings_sent'] == 1
+    finally:
+        queue.stop()
@@ -0,0 +1,709 @@
+import sys
+import json
+import math
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import serial
+import serial.tools.list_ports
+
+from u50_serial import FrameReader, RD_COMMAND
+from u50_frame import FRAME_DECODER, parse_frame
+
+
+def discover_ports():
+    return [port.device for port in serial.tools.list_ports.comports()]
+
+
+def open_port(port, timeout=2):
+    return serial.Serial(
+        port=port,
+        baudrate=19200,
+        bytesize=serial.EIGHTBITS,
+        parity=serial.PARITY_NONE,
+        stopbits=serial.STOPBITS_ONE,
+        timeout=timeout,
+        xonxoff=False,
+        rtscts=False,
+        dsrdtr=False
+    )
+
+
+def make_reading(port, frame, latency, site_name=None, sequence=None):
+    return parse_frame(frame, port, datetime.now(), latency, site_name, sequence=sequence)
+
+
+class PendingCommand:
+    def __init__(self, command, deadline=None, callback=None):
+        self.command = command
+        self.deadline = deadline
+        self.callback = callback
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    def resolve(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.done.set()
+        if self.callback:
+            self.callback(self)
+
+    def wait(self, timeout=None):
+        self.done.wait(timeout)
+        return self.result
+
+
+# Upper edges, in milliseconds, of the poll jitter histogram buckets; the
+# last bucket takes everything later
+JITTER_BINS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class PollSchedule:
+    # Fixed grid of poll times on time.monotonic(). Slot k is due at
+    # k * interval, so the grid never drifts with poll or callback time, and
+    # every schedule with the same interval shares the same slots, which keeps
+    # many probes sampled together. A slot missed while a poll overran is
+    # skipped and counted, never made up with a burst of polls. How late each
+    # poll started is kept in a histogram.
+    def __init__(self, interval=None, bins=JITTER_BINS_MS):
+        self.interval = None
+        self.bins = bins
+        self.due = None
+        self.polls = 0
+        self.skipped = 0
+        self.histogram = [0] * (len(bins) + 1)
+        self.total_jitter = 0.0
+        self.max_jitter = 0.0
+        self.set_interval(interval)
+
+    def set_interval(self, interval):
+        # A new rate starts on its own grid: the first poll goes out at once,
+        # the next on the first slot at least half an interval later
+        if interval != self.interval:
+            self.interval = interval
+            self.due = None
+
+    def wait_time(self, now=None):
+        # Seconds until the next slot, 0 when due, None without an interval
+        if self.interval is None:
+            return None
+        if self.due is None:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        return max(0.0, self.due - now)
+
+    def tick(self, now=None):
+        # Call when starting the poll for the slot wait_time() reached
+        now = time.monotonic() if now is None else now
+        if self.due is None:
+            self.due = (now // self.interval + 1) * self.interval
+            if self.due - now < self.interval / 2:
+                self.due += self.interval
+            return 0.0
+
+        late = now - self.due
+        if late >= self.interval:
+            missed = int(late // self.interval)
+            self.skipped += missed
+            self.due += missed * self.interval
+            late -= missed * self.interval
+        late = max(0.0, late)
+        self.due += self.interval
+
+        self.polls += 1
+        self.total_jitter += late
+        self.max_jitter = max(self.max_jitter, late)
+        late_ms = late * 1000
+        for i, edge in enumerate(self.bins):
+            if late_ms < edge:
+                self.histogram[i] += 1
+                break
+        else:
+            self.histogram[-1] += 1
+        return late
+
+    def status(self):
+        labels = [f"<{edge}ms" for edge in self.bins] + [f">={self.bins[-1]}ms"]
+        return {
+            'interval': self.interval,
+            'polls': self.polls,
+            'skipped': self.skipped,
+            'mean_jitter': self.total_jitter / self.polls if self.polls else None,
+            'max_jitter': self.max_jitter,
+            'histogram': dict(zip(labels, self.histogram))
+        }
+
+
+# Change per minute that counts as fast for each watched parameter
+DEFAULT_CHANGE_RATES = {'do': 0.2, 'turbidity': 5.0, 'orp': 10.0}
+
+
+class AdaptiveRate:
+    # Subscriber that sets a probe's poll interval from how fast the watched
+    # parameters are changing. The change rate of each is its slope over the
+    # last 'window' seconds, as a multiple of its change_rates entry; at 1 or
+    # below the probe is polled every base_interval, above it proportionally
+    # faster, down to fast_interval. A faster rate applies at once and is held
+    # until the change has stayed below its threshold for 'hold' seconds;
+    # after that the interval grows back by at most 'relax' times per reading.
+    # The interval is registered with the worker as 'consumer', like any other
+    # demand.
+    def __init__(self, worker, consumer='default', base_interval=60.0, fast_interval=2.0, change_rates=None,
+                 window=60.0, hold=300.0, relax=1.5, decoder=FRAME_DECODER, on_change=None):
+        self.worker = worker
+        self.consumer = consumer
+        self.base_interval = base_interval
+        self.fast_interval = fast_interval
+        self.window = window
+        self.hold = hold
+        self.relax = relax
+        self.on_change = on_change
+        self.watched = [(decoder.index[name], rate / 60.0)
+                        for name, rate in (change_rates or DEFAULT_CHANGE_RATES).items()]
+        self.history = deque()
+        self.interval = base_interval
+        self.hold_until = 0.0
+        self.score = 0.0
+        self.changes = 0
+        worker.require(consumer, base_interval)
+
+    def update(self, reading):
+        now = time.monotonic()
+        history = self.history
+        history.append((now, reading.values))
+        # Keep the newest reading at least a window old as the reference
+        while len(history) > 2 and history[1][0] <= now - self.window:
+            history.popleft()
+        then, reference = history[0]
+        span = now - then
+        if span <= 0:
+            return self.interval
+
+        score = 0.0
+        for i, rate in self.watched:
+            value, last = reading.values[i], reference[i]
+            if not (math.isnan(value) or math.isnan(last)):
+                score = max(score, abs(value - last) / span / rate)
+        self.score = score
+
+        target = self.base_interval
+        if score > 1:
+            target = max(self.fast_interval, self.base_interval / score)
+        interval = self.interval
+        if score > 1:
+            self.hold_until = now + self.hold
+        # Small steps down are ignored so the rate does not flutter
+        if target < interval / 1.1:
+            interval = target
+        elif target > interval and now >= self.hold_until:
+            interval = min(target, interval * self.relax)
+
+        if interval != self.interval:
+            self.interval = interval
+            self.changes += 1
+            self.worker.require(self.consumer, interval)
+            if self.on_change is not None:
+                self.on_change(interval, score)
+        return interval
+
+
+_WAKE = object()
+_STOP = object()
+
+
+class ProbeWorker(threading.Thread):
+    # Sole owner of one serial port. Every command for the probe goes through
+    # this thread, so writes and responses can never interleave, and a slow or
+    # dead probe only ever delays itself. Consumers register the poll interval
+    # they need with require(); the port is polled at the fastest of those
+    # rates and each reading is handed to every subscriber.
+    def __init__(self, port, readings=None, site_name=None, interval=5.0, deadline=2.0,
+                 retry_delay=5.0, serial_conn=None, capture=None, calibration=None):
+        super().__init__(name=f"probe-{port}", daemon=True)
+        self.port = port
+        self.site_name = site_name
+        self.deadline = deadline
+        self.retry_delay = retry_delay
+        # Optional FrameCapture that journals every raw frame, valid or not
+        self.capture = capture
+        # Optional CalibrationTable applied before any subscriber sees a reading
+        self.calibration = calibration
+
+        self.serial_conn = serial_conn
+        self.frame_reader = FrameReader(serial_conn, deadline=deadline) if serial_conn else None
+        self.commands = queue.Queue()
+        self.subscribers = []
+        self.demands = {}
+        if interval is not None:
+            self.demands['default'] = interval
+        self.schedule = PollSchedule(interval)
+        self.stop_event = threading.Event()
+        self.polls = 0
+        self.misses = 0
+        self.last_error = None
+
+        if readings is not None:
+            self.subscribe(readings.publish)
+
+    @property
+    def interval(self):
+        return min(self.demands.values()) if self.demands else None
+
+    def subscribe(self, callback):
+        self.subscribers = self.subscribers + [callback]
+
+    def unsubscribe(self, callback):
+        # The list is replaced, never changed in place, so the worker can go
+        # on iterating the one it has
+        self.subscribers = [c for c in self.subscribers if c != callback]
+
+    def require(self, consumer, interval):
+        self.demands[consumer] = interval
+        self.commands.put(_WAKE)
+
+    def release(self, consumer):
+        self.demands.pop(consumer, None)
+        self.commands.put(_WAKE)
+
+    def submit(self, command=RD_COMMAND, deadline=None, callback=None):
+        pending = PendingCommand(command, deadline, callback)
+        self.commands.put(pending)
+        return pending
+
+    def stop(self):
+        self.stop_event.set()
+        self.commands.put(_STOP)
+
+    def run(self):
+        while not self.stop_event.is_set():
+            if self.serial_conn is None and not self._open():
+                self._fail_pending()
+                self.stop_event.wait(self.retry_delay)
+                continue
+
+            # Rechecked on every wake-up so a consumer asking for a faster
+            # rate takes effect immediately
+            self.schedule.set_interval(self.interval)
+            try:
+                item = self.commands.get(timeout=self.schedule.wait_time())
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                break
+            if item is _WAKE:
+                continue
+            if item is None:
+                self.schedule.tick()
+                self.poll_once()
+            else:
+                try:
+                    result = self.poll_once(item.command, item.deadline)
+                    item.resolve(result, self.last_error if result is None else None)
+                except Exception as e:
+                    item.resolve(error=str(e))
+
+        self._fail_pending()
+        self._close()
+
+    def poll_once(self, command=RD_COMMAND, deadline=None):
+        try:
+            frame = self.frame_reader.poll(command, self.deadline if deadline is None else deadline)
+        except (serial.SerialException, OSError) as e:
+            self.last_error = str(e)
+            self._close()
+            return None
+
+        self.polls += 1
+        reading = None
+        if frame is not None:
+            capture = self.capture
+            if capture is not None:
+                capture.record(self.port, frame)
+            reading = make_reading(self.port, frame, self.frame_reader.last_latency, self.site_name, self.polls)
+        if reading is None:
+            self.misses += 1
+            return None
+
+        calibration = self.calibration
+        if calibration is not None:
+            calibration.apply(reading)
+        for callback in self.subscribers:
+            try:
+                callback(reading)
+            except Exception as e:
+                self.last_error = f"Subscriber error: {e}"
+        return reading
+
+    def status(self):
+        return {
+            'port': self.port,
+            'connected': self.serial_conn is not None,
+            'interval': self.interval,
+            'polls': self.polls,
+            'misses': self.misses,
+            'last_error': self.last_error,
+            'latency': self.frame_reader.latency_stats() if self.frame_reader else None,
+            'schedule': self.schedule.status(),
+            'calibration': self.calibration.version if self.calibration is not None else None
+        }
+
+    def _open(self):
+        try:
+            self.serial_conn = open_port(self.port)
+        except (serial.SerialException, OSError) as e:
+            self.last_error = str(e)
+            self.serial_conn = None
+            return False
+
+        self.frame_reader = FrameReader(self.serial_conn, deadline=self.deadline)
+        self.last_error = None
+        return True
+
+    def _close(self):
+        if self.serial_conn is not None:
+            try:
+                self.serial_conn.close()
+            except (serial.SerialException, OSError):
+                pass
+        self.serial_conn = None
+
+    def _fail_pending(self):
+        while True:
+            try:
+                item = self.commands.get_nowait()
+            except queue.Empty:
+                return
+            if isinstance(item, PendingCommand):
+                item.resolve(error=self.last_error or "Probe worker stopped")
+
+
+class ReadingCache:
+    # Latest reading per port, stamped with the monotonic time it arrived.
+    # Consumers read from here instead of polling the device themselves.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latest_by_port = {}
+        self.last_port = None
+
+    def update(self, reading):
+        with self.lock:
+            self.latest_by_port[reading.port] = (reading, time.monotonic())
+            self.last_port = reading.port
+
+    def latest(self, port=None):
+        with self.lock:
+            entry = self.latest_by_port.get(port or self.last_port)
+        return entry[0] if entry else None
+
+    def age(self, port=None):
+        with self.lock:
+            entry = self.latest_by_port.get(port or self.last_port)
+        return time.monotonic() - entry[1] if entry else None
+
+
+class ReadingStream:
+    # Bounded stream shared by all workers. When consumers fall behind the
+    # oldest readings are dropped instead of blocking the pollers.
+    def __init__(self, maxsize=10000):
+        self.queue = queue.Queue(maxsize)
+        self.dropped = 0
+
+    def publish(self, reading):
+        while True:
+            try:
+                self.queue.put_nowait(reading)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def drain(self, limit=None):
+        readings = []
+        while limit is None or len(readings) < limit:
+            try:
+                readings.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return readings
+
+
+class AcquisitionEngine:
+    # Probe workers plus everything a collector does with their readings:
+    # cache, store, export, capture and webhook uploads, with no GUI. With an
+    # upload_queue, upload_mode 'latest' queues each probe's latest reading
+    # every upload_interval seconds, 'batch' queues every reading and
+    # 'aggregate' queues one WindowAggregator record per probe and
+    # upload_interval window. 'adaptive' holds AdaptiveRate settings; each
+    # probe's interval is then its base rate.
+    # rolling_stats, a RollingStats, is fed before the upload queue, so
+    # uploads can carry statistics that include the reading itself. So is
+    # anomaly, an AnomalyDetector whose flags are then sent with the reading;
+    # with urgent_alerts a reading that raises an alert is queued at once and
+    # sent without waiting for the upload interval or a full batch.
+    # calibration, a CalibrationTable, converts every reading before it is
+    # handed on; the store still keeps the values as decoded.
+    def __init__(self, ports=None, interval=5.0, deadline=2.0, retry_delay=5.0, maxsize=10000, store=None,
+                 export=None, capture=None, upload_queue=None, upload_interval=30.0, upload_mode='latest',
+                 adaptive=None, rolling_stats=None, anomaly=None, urgent_alerts=True, calibration=None):
+        # Ports are either device names or dicts with 'port' and optional
+        # 'site_name'; without any, every port found on the system is used
+        if ports is None:
+            ports = discover_ports()
+
+        self.readings = ReadingStream(maxsize)
+        self.cache = ReadingCache()
+        self.store = store
+        self.export = export
+        self.capture = capture
+        self.calibration = calibration
+        self.rolling_stats = rolling_stats
+        self.anomaly = anomaly
+        self.upload_queue = upload_queue
+        self.upload_interval = upload_interval
+        self.upload_mode = upload_mode
+        self.aggregator = None
+        if upload_queue is not None and upload_mode == 'aggregate':
+            from u50_webhook import WindowAggregator
+            self.aggregator = WindowAggregator(upload_queue.builder, upload_queue.add_entry, upload_interval)
+        if upload_queue is not None and anomaly is not None:
+            upload_queue.detector = anomaly
+            if urgent_alerts:
+                anomaly.subscribe(self._alert)
+        self.stop_event = threading.Event()
+        self.upload_thread = None
+        self.adaptive_rates = []
+        self.workers = []
+        for entry in ports:
+            if isinstance(entry, str):
+                entry = {'port': entry}
+            self.workers.append(ProbeWorker(
+                entry['port'],
+                self.readings,
+                site_name=entry.get('site_name'),
+                interval=entry.get('interval', interval),
+                deadline=entry.get('deadline', deadline),
+                retry_delay=retry_delay,
+                capture=capture,
+                calibration=calibration
+            ))
+            self.workers[-1].subscribe(self.cache.update)
+            if store is not None:
+                self.workers[-1].subscribe(store.append)
+            if export is not None:
+                self.workers[-1].subscribe(export.append)
+            if rolling_stats is not None:
+                self.workers[-1].subscribe(rolling_stats.update)
+            if anomaly is not None:
+                self.workers[-1].subscribe(anomaly.update)
+            if upload_queue is not None and upload_mode == 'batch':
+                self.workers[-1].subscribe(upload_queue.add)
+            if self.aggregator is not None:
+                self.workers[-1].subscribe(self.aggregator.add)
+            if adaptive is not None:
+                settings = dict(adaptive)
+                settings.setdefault('base_interval', entry.get('interval', interval))
+                self.adaptive_rates.append(AdaptiveRate(self.workers[-1], **settings))
+                self.workers[-1].subscribe(self.adaptive_rates[-1].update)
+
+    @classmethod
+    def from_config(cls, path):
+        with open(path) as f:
+            config = json.load(f)
+
+        # "store": {"path": ..., "segment_seconds": 86400, "rate": readings a second,
+        #           "segment_rows": rows, instead of rate}
+        # "export": {"directory": ..., "rotate": "hour" | "day", "parquet": false}
+        # "capture": path of a raw frame journal
+        # "calibration": path of a calibration table (see load_calibration)
+        # "adaptive": {"fast_interval": 2, "change_rates": {"do": 0.2, ...},
+        #              "window": 60, "hold": 300}; "interval" is then the base rate
+        # "webhook": {"url": ..., "auth": ..., "interval": 30, "batch_size": null,
+        #             "aggregate": false,
+        #             "gzip": false, "journal": "webhook_journal.jsonl",
+        #             "param_map": {"d1": 0, "d7": 6, ...} (index into WEBHOOK_PARAMETERS
+        #             per d field; fields left out keep their default),
+        #             "deadband": {"absolute": {...}, "relative": {...},
+        #                          "heartbeat": seconds, "per_field": false},
+        #             "statistics": true | [["15m", "mean"], ...]}
+        # "statistics": {"windows": {"1m": 60, "15m": 900, "1h": 3600}, "buckets": 60}
+        #               or true for the defaults
+        # "anomaly": {"limits": {"ph": [0, 14], ...}, "z_threshold": 6,
+        #             "stuck_readings": 60, "urgent": true} or true for the
+        #            defaults
+        # Each part's module (and numpy or requests with it) is only imported
+        # when the part is configured, which keeps a bare collector small.
+        store, export, capture, upload_queue, rolling_stats, anomaly = None, None, None, None, None, None
+        calibration = None
+        if config.get('store'):
+            from u50_store import ReadingStore
+            store = ReadingStore(**config['store'])
+        if config.get('export'):
+            from u50_export import ExportSink
+            export = ExportSink(**config['export'])
+        if config.get('capture'):
+            from u50_capture import FrameCapture
+            capture = FrameCapture(config['capture'])
+        if config.get('calibration'):
+            from u50_calibration import load_calibration
+            calibration = load_calibration(config['calibration'])
+        statistics = config.get('statistics')
+        if statistics:
+            from u50_stats import RollingStats
+            rolling_stats = RollingStats(**statistics) if isinstance(statistics, dict) else RollingStats()
+        settings = config.get('anomaly')
+        urgent_alerts = True
+        if settings:
+            from u50_anomaly import AnomalyDetector
+            settings = dict(settings) if isinstance(settings, dict) else {}
+            urgent_alerts = settings.pop('urgent', True)
+            anomaly = AnomalyDetector(**settings)
+
+        webhook = config.get('webhook')
+        if webhook:
+            from u50_webhook import (PayloadBuilder, WebhookUploader, UploadQueue, DeadbandFilter,
+                                     DEFAULT_STATISTIC_FIELDS)
+            deadband = webhook.get('deadband') or {}
+            statistic_fields = webhook.get('statistics')
+            if statistic_fields is True:
+                statistic_fields = DEFAULT_STATISTIC_FIELDS
+            batch_size = webhook.get('batch_size')
+            interval = webhook.get('interval', 30.0)
+            upload_mode = 'aggregate' if webhook.get('aggregate') else 'batch' if batch_size else 'latest'
+            upload_queue = UploadQueue(
+                WebhookUploader(webhook['url'], webhook.get('auth')),
+                PayloadBuilder(webhook.get('param_map')),
+                webhook.get('journal', "webhook_journal.jsonl"),
+                max_readings=batch_size or 1,
+                max_age=interval if batch_size else 0,
+                compress=webhook.get('gzip', False),
+                upload_filter=DeadbandFilter(deadband.get('absolute'), deadband.get('relative'),
+                                             deadband.get('heartbeat'), deadband.get('per_field', False)),
+                rolling_stats=rolling_stats if statistic_fields else None,
+                statistic_fields=tuple(map(tuple, statistic_fields or ()))
+            )
+
+        return cls(
+            ports=config.get('ports'),
+            interval=config.get('interval', 5.0),
+            deadline=config.get('deadline', 2.0),
+            retry_delay=config.get('retry_delay', 5.0),
+            maxsize=config.get('queue_size', 10000),
+            store=store,
+            export=export,
+            capture=capture,
+            upload_queue=upload_queue,
+            upload_interval=webhook.get('interval', 30.0) if webhook else 30.0,
+            upload_mode=upload_mode if webhook else 'latest',
+            adaptive=config.get('adaptive'),
+            rolling_stats=rolling_stats,
+            anomaly=anomaly,
+            urgent_alerts=urgent_alerts,
+            calibration=calibration
+        )
+
+    def start(self):
+        self.stop_event.clear()
+        for worker in self.workers:
+            worker.start()
+        if self.upload_queue is not None:
+            self.upload_queue.start()
+            if self.upload_mode != 'batch':
+                self.upload_thread = threading.Thread(target=self._upload_loop, name="upload",
+                                                      daemon=True)
+                self.upload_thread.start()
+
+    def _alert(self, reading, flags):
+        # Called on the worker thread, after the detector and before the
+        # reading reaches the upload queue itself. In aggregate mode the
+        # reading is also in its window's record, so it goes out as an alert
+        # record rather than as a second sample.
+        if self.aggregator is not None:
+            self.upload_queue.add_alert(reading, flags)
+        else:
+            self.upload_queue.add(reading, urgent=True)
+
+    def _upload_loop(self):
+        # Once per upload interval: closes the aggregator's finished windows,
+        # or queues each probe's newest reading, never the same one twice
+        queued = {}
+        schedule = PollSchedule(self.upload_interval)
+        schedule.tick()
+        while not self.stop_event.wait(schedule.wait_time()):
+            schedule.tick()
+            if self.aggregator is not None:
+                self.aggregator.flush()
+                continue
+            for worker in self.workers:
+                reading = self.cache.latest(worker.port)
+                if reading is not None and reading is not queued.get(worker.port):
+                    self.upload_queue.add(reading)
+                    queued[worker.port] = reading
+
+    def stop(self, timeout=5.0):
+        self.stop_event.set()
+        for worker in self.workers:
+            worker.stop()
+        for worker in self.workers:
+            worker.join(timeout)
+        if self.upload_thread is not None:
+            self.upload_thread.join(timeout)
+            self.upload_thread = None
+        if self.aggregator is not None:
+            # Windows still open go out as partial records
+            self.aggregator.flush(everything=True)
+        if self.upload_queue is not None:
+            # Anything not delivered yet is kept in the journal
+            self.upload_queue.stop(timeout)
+            self.upload_queue.uploader.close()
+        if self.store is not None:
+            self.store.close()
+        if self.export is not None:
+            self.export.close()
+        if self.capture is not None:
+            self.capture.close()
+
+    def status(self):
+        return [worker.status() for worker in self.workers]
+
+
+def main():
+    # Usage: u50_acquisition.py [config.json | PORT ...]
+    args = sys.argv[1:]
+    if len(args) == 1 and args[0].endswith('.json'):
+        engine = AcquisitionEngine.from_config(args[0])
+    else:
+        engine = AcquisitionEngine(args or None)
+
+    if not engine.workers:
+        print("No serial ports found")
+        return
+
+    engine.start()
+    try:
+        while True:
+            reading = engine.readings.get(timeout=1.0)
+            if reading:
+                print(f"{reading.received.strftime('%H:%M:%S')} {reading.port} "
+                      f"{reading.site_name}: {len(reading.frame)} bytes "
+                      f"in {reading.latency_text}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import sys
+import math
+import threading
+
+from u50_frame import FRAME_DECODER, ABSOLUTE_NOISE, RELATIVE_NOISE
+
+# Measuring ranges of the U-50 series in each parameter's own unit; a value
+# outside them is a sensor fault, not water
+DEFAULT_LIMITS = {
+    'temperature': (-10.0, 55.0),
+    'ph': (0.0, 14.0),
+    'ph_mv': (-2000.0, 2000.0),
+    'orp': (-2000.0, 2000.0),
+    'conductivity': (0.0, 100.0),
+    'turbidity': (0.0, 1000.0),
+    'do': (0.0, 50.0),
+    'tds': (0.0, 100.0),
+    'salinity': (0.0, 70.0),
+    'sigma_t': (0.0, 50.0),
+    'depth': (0.0, 100.0),
+    'do_saturation': (0.0, 500.0),
+}
+
+# The smallest deviation a spike is measured against, so a parameter that
+# sat still on one digit does not flag its next last-digit step; relative
+# noise is a fraction of the parameter's average
+DEFAULT_ABSOLUTE_NOISE = ABSOLUTE_NOISE
+DEFAULT_RELATIVE_NOISE = RELATIVE_NOISE
+
+# Sensors that never read exactly the same for long in real water; the
+# others (depth on a fixed mooring, turbidity in clear water) legitimately do
+DEFAULT_STUCK_PARAMETERS = ('temperature', 'ph', 'ph_mv', 'orp', 'conductivity', 'do', 'do_saturation')
+
+# Error characters that mean "no error"
+HEALTHY_CODES = ('0', ' ', '')
+
+SPIKE, STUCK, OUT_OF_RANGE, MISSING, PROBE_ERROR = 'spike', 'stuck', 'out_of_range', 'missing', 'probe_error'
+
+
+class ParameterState:
+    # Running state of one parameter of one probe
+    __slots__ = ('mean', 'deviation', 'count', 'last', 'repeats', 'varied')
+
+    def __init__(self):
+        self.mean = 0.0
+        self.deviation = 0.0
+        self.count = 0
+        self.last = None
+        self.repeats = 0
+        self.varied = False
+
+
+class AnomalyDetector:
+    # Checks every reading as it arrives, with a fixed amount of state per
+    # probe and parameter and a fixed amount of work per reading:
+    #  - spike: the value lies more than z_threshold robust deviations from
+    #    the parameter's EWMA. The deviation is an EWMA of absolute
+    #    residuals (times 1.25, which matches the standard deviation for
+    #    normal noise) and never less than the noise floor. Checked from
+    #    'warmup' readings on; residuals are clipped at the threshold before
+    #    they update the averages, so one spike neither drags the mean nor
+    #    masks the next one, while a genuine step is followed within a few
+    #    readings.
+    #  - stuck: the value has not moved by a single digit for stuck_readings
+    #    readings, after having moved before (stuck_parameters only).
+    #  - out_of_range: outside 'limits'.
+    #  - missing: the field could not be parsed (NaN, sent as 0.0 upstream).
+    #  - probe_error: the probe's error character, or a parameter's, is not
+    #    one of HEALTHY_CODES.
+    # update(reading) returns the reading's flags as (kind, parameter name or
+    # None, detail) tuples and remembers them for flags_for(), and those of
+    # them that have just started for started_for(). A condition starts when
+    # its (kind, parameter) was not flagged on the probe's previous reading,
+    # so a new kind on the same parameter starts too. Alert subscribers are
+    # called with (reading, flags) when a condition starts, so a sensor that
+    # stays out of range alerts once.
+    def __init__(self, limits=None, absolute_noise=None, relative_noise=None,
+                 stuck_parameters=DEFAULT_STUCK_PARAMETERS, z_threshold=6.0, alpha=0.05, warmup=20,
+                 stuck_readings=60, decoder=FRAME_DECODER):
+        limits = DEFAULT_LIMITS if limits is None else limits
+        absolute_noise = DEFAULT_ABSOLUTE_NOISE if absolute_noise is None else absolute_noise
+        relative_noise = DEFAULT_RELATIVE_NOISE if relative_noise is None else relative_noise
+        self.decoder = decoder
+        self.limits = tuple(limits.get(name) for name in decoder.names)
+        self.absolute_noise = tuple(float(absolute_noise.get(name, 0.0)) for name in decoder.names)
+        self.relative_noise = tuple(float(relative_noise.get(name, 0.0)) for name in decoder.names)
+        self.stuck = tuple(name in stuck_parameters for name in decoder.names)
+        self.z_threshold = z_threshold
+        self.alpha = alpha
+        self.warmup = warmup
+        self.stuck_readings = stuck_readings
+
+        self.lock = threading.Lock()
+        self.states = {}
+        self.active = {}
+        self.latest = {}
+        self.subscribers = []
+        self.readings = 0
+        self.flagged = 0
+        self.alerts = 0
+        self.counts = {}
+
+    def subscribe(self, callback):
+        self.subscribers = self.subscribers + [callback]
+
+    def unsubscribe(self, callback):
+        self.subscribers = [subscriber for subscriber in self.subscribers if subscriber != callback]
+
+    def _check(self, state, value, i):
+        # Flags of one parameter; updates its state
+        if math.isnan(value):
+            return MISSING
+
+        kind = None
+        limits = self.limits[i]
+        if limits is not None and not limits[0] <= value <= limits[1]:
+            # Kept out of the averages; the spike check would only repeat it
+            return OUT_OF_RANGE
+
+        if state.last is not None:
+            if value == state.last:
+                state.repeats += 1
+                if self.stuck[i] and state.varied and state.repeats >= self.stuck_readings - 1:
+                    kind = STUCK
+            else:
+                state.repeats = 0
+                state.varied = True
+        state.last = value
+
+        if state.count == 0:
+            state.mean = value
+        else:
+            scale = max(1.25 * state.deviation, self.absolute_noise[i],
+                        self.relative_noise[i] * abs(state.mean))
+            residual = value - state.mean
+            limit = self.z_threshold * scale
+            if state.count >= self.warmup and abs(residual) > limit:
+                kind = SPIKE
+            if scale > 0:
+                residual = max(-limit, min(limit, residual))
+            state.mean += self.alpha * residual
+            state.deviation += self.alpha * (abs(residual) - state.deviation)
+        state.count += 1
+        return kind
+
+    def update(self, reading):
+        # Suitable as a ProbeWorker subscriber
+        flags = []
+        code = reading.probe_error
+        if code not in HEALTHY_CODES:
+            flags.append((PROBE_ERROR, None, code))
+        port = reading.port
+        names = self.decoder.names
+
+        with self.lock:
+            states = self.states.get(port)
+            if states is None:
+                states = self.states[port] = [ParameterState() for _ in names]
+            for i, value in enumerate(reading.values):
+                kind = self._check(states[i], value, i)
+                if kind is not None:
+                    flags.append((kind, names[i], value))
+                code = reading.error(i)
+                if code not in HEALTHY_CODES:
+                    flags.append((PROBE_ERROR, names[i], code))
+
+            self.readings += 1
+            if flags:
+                self.flagged += 1
+                for kind, _, _ in flags:
+                    self.counts[kind] = self.counts.get(kind, 0) + 1
+            previous = self.active.get(port, ())
+            self.active[port] = {(kind, name) for kind, name, _ in flags}
+            started = [flag for flag in flags if flag[:2] not in previous]
+            self.latest[port] = (reading, flags, started)
+            if started:
+                self.alerts += 1
+
+        if started:
+            for callback in self.subscribers:
+                callback(reading, flags)
+        return flags
+
+    def flags_for(self, reading):
+        # The flags update() found for this reading, or None if it was not
+        # the last reading checked for its probe
+        latest = self.latest.get(reading.port)
+        if latest is None or latest[0] is not reading:
+            return None
+        return latest[1]
+
+    def started_for(self, reading):
+        # The flags of this reading that were not raised on the probe's
+        # previous one; None as for flags_for()
+        latest = self.latest.get(reading.port)
+        if latest is None or latest[0] is not reading:
+            return None
+        return latest[2]
+
+    def status(self):
+        with self.lock:
+            return {'readings': self.readings, 'flagged': self.flagged, 'alerts': self.alerts,
+                    'counts': dict(self.counts)}
+
+
+def describe(flags):
+    # "temperature spike (31.2), probe_error 3" for logs
+    return ", ".join(f"{name} {kind} ({detail})" if name else f"{kind} {detail}"
+                     for kind, name, detail in flags)
+
+
+def main():
+    # Usage: u50_anomaly.py CAPTURE  - replays a capture journal through the
+    # detector and prints every alert
+    if len(sys.argv) < 2:
+        print("Usage: u50_anomaly.py CAPTURE")
+        return
+
+    from u50_capture import Replayer
+    detector = AnomalyDetector()
+    replayer = Replayer(sys.argv[1], speed=None)
+    replayer.subscribe(detector.update)
+    detector.subscribe(lambda reading, flags: print(
+        f"{reading.received.strftime('%Y-%m-%d %H:%M:%S')} {reading.port}: {describe(flags)}"))
+    replayer.run()
+
+    status = detector.status()
+    print(f"{status['readings']} readings, {status['flagged']} flagged, {status['alerts']} alerts; "
+          + ", ".join(f"{kind} {count}" for kind, count in sorted(status['counts'].items())))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,501 @@
+import sys
+import json
+import asyncio
+import ssl
+import time
+from urllib.parse import urlsplit
+
+import serial
+
+from u50_serial import FrameReader, RD_COMMAND
+from u50_acquisition import discover_ports, open_port, make_reading, ReadingCache, PollSchedule
+from u50_webhook import PayloadBuilder, DeadbandFilter
+from u50_store import ReadingStore
+from u50_export import ExportSink
+from u50_capture import FrameCapture
+from u50_calibration import load_calibration
+
+
+class AsyncFrameReader(FrameReader):
+    # Same framing as FrameReader, but bytes are pushed into the buffer by the
+    # event loop when the port becomes readable instead of by blocking reads.
+    # Ports without a file descriptor (Windows) fall back to the blocking
+    # reader on the default executor.
+    def __init__(self, serial_conn, start=b"#RD", deadline=2.0, history=100):
+        super().__init__(serial_conn, start, deadline, history)
+        fileno = getattr(serial_conn, 'fileno', None)
+        self.fd = fileno() if fileno else None
+        self.loop = None
+        self.data_ready = asyncio.Event()
+
+    def attach(self):
+        if self.fd is None:
+            return
+        self.serial_conn.timeout = 0
+        self.loop = asyncio.get_running_loop()
+        self.loop.add_reader(self.fd, self._on_readable)
+
+    def detach(self):
+        if self.loop is not None:
+            self.loop.remove_reader(self.fd)
+            self.loop = None
+
+    def _on_readable(self):
+        try:
+            chunk = self.serial_conn.read(self.serial_conn.in_waiting or 1)
+        except (serial.SerialException, OSError):
+            # Wake the waiting poll; the next write will surface the error
+            chunk = b""
+            self.detach()
+        if chunk:
+            self.buffer += chunk
+        self.data_ready.set()
+
+    async def poll(self, command, deadline=None):
+        if deadline is None:
+            deadline = self.deadline
+        self.buffer.clear()
+        self.serial_conn.reset_input_buffer()
+
+        started = time.perf_counter()
+        self.serial_conn.write(command)
+        if self.loop is None:
+            # The blocking reader by name: self.read_frame is the coroutine
+            loop = asyncio.get_running_loop()
+            frame = await loop.run_in_executor(None, FrameReader.read_frame, self, deadline)
+        else:
+            frame = await self.read_frame(deadline)
+        latency = time.perf_counter() - started
+
+        if frame is None:
+            self.timeouts += 1
+            self.last_latency = None
+        else:
+            self.last_latency = latency
+            self.latencies.append(latency)
+        return frame
+
+    async def read_frame(self, deadline=None):
+        if deadline is None:
+            deadline = self.deadline
+        end_time = self.loop.time() + deadline
+
+        while True:
+            frame = self._extract_frame()
+            if frame is not None:
+                return frame
+
+            remaining = end_time - self.loop.time()
+            if remaining <= 0:
+                return None
+
+            self.data_ready.clear()
+            try:
+                await asyncio.wait_for(self.data_ready.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+
+class AsyncProbe:
+    # Coroutine counterpart of ProbeWorker: owns one port, and the lock makes
+    # sure only one command is ever in flight on it.
+    def __init__(self, port, site_name=None, interval=5.0, deadline=2.0, retry_delay=5.0, capture=None,
+                 calibration=None):
+        self.port = port
+        self.site_name = site_name
+        self.interval = interval
+        self.deadline = deadline
+        self.retry_delay = retry_delay
+        self.capture = capture
+        self.calibration = calibration
+        self.schedule = PollSchedule(interval)
+
+        self.serial_conn = None
+        self.frame_reader = None
+        self.lock = asyncio.Lock()
+        self.subscribers = []
+        self.polls = 0
+        self.misses = 0
+        self.last_error = None
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    async def run(self):
+        # Polls on the same fixed grid as ProbeWorker
+        try:
+            while True:
+                if self.serial_conn is None and not self._open():
+                    await asyncio.sleep(self.retry_delay)
+                    continue
+
+                self.schedule.set_interval(self.interval)
+                await asyncio.sleep(self.schedule.wait_time())
+                self.schedule.tick()
+                await self.poll_once()
+        finally:
+            self._close()
+
+    async def poll_once(self, command=RD_COMMAND, deadline=None):
+        async with self.lock:
+            if self.serial_conn is None:
+                return None
+            try:
+                frame = await self.frame_reader.poll(command, deadline)
+            except (serial.SerialException, OSError) as e:
+                self.last_error = str(e)
+                self._close()
+                return None
+
+        self.polls += 1
+        reading = None
+        if frame is not None:
+            capture = self.capture
+            if capture is not None:
+                capture.record(self.port, frame)
+            reading = make_reading(self.port, frame, self.frame_reader.last_latency, self.site_name, self.polls)
+        if reading is None:
+            self.misses += 1
+            return None
+
+        calibration = self.calibration
+        if calibration is not None:
+            calibration.apply(reading)
+        for callback in self.subscribers:
+            try:
+                callback(reading)
+            except Exception as e:
+                self.last_error = f"Subscriber error: {e}"
+        return reading
+
+    def status(self):
+        return {
+            'port': self.port,
+            'connected': self.serial_conn is not None,
+            'interval': self.interval,
+            'polls': self.polls,
+            'misses': self.misses,
+            'last_error': self.last_error,
+            'latency': self.frame_reader.latency_stats() if self.frame_reader else None,
+            'schedule': self.schedule.status()
+        }
+
+    def _open(self):
+        try:
+            self.serial_conn = open_port(self.port)
+        except (serial.SerialException, OSError) as e:
+            self.last_error = str(e)
+            self.serial_conn = None
+            return False
+
+        self.frame_reader = AsyncFrameReader(self.serial_conn, deadline=self.deadline)
+        self.frame_reader.attach()
+        self.last_error = None
+        return True
+
+    def _close(self):
+        if self.frame_reader is not None:
+            self.frame_reader.detach()
+        if self.serial_conn is not None:
+            try:
+                self.serial_conn.close()
+            except (serial.SerialException, OSError):
+                pass
+        self.serial_conn = None
+
+
+class AsyncUploader:
+    # Minimal HTTP/1.1 JSON poster on asyncio streams. The connection is kept
+    # alive between posts and re-opened once if the server dropped it.
+    def __init__(self, url, auth=None, timeout=10.0):
+        parts = urlsplit(url)
+        self.url = url
+        self.host = parts.hostname
+        self.use_ssl = parts.scheme == 'https'
+        self.port = parts.port or (443 if self.use_ssl else 80)
+        self.host_header = parts.netloc.rsplit('@', 1)[-1]
+        self.path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+        self.auth = auth
+        self.timeout = timeout
+
+        self.reader = None
+        self.writer = None
+        self.lock = asyncio.Lock()
+
+    async def post(self, payload):
+        # Payloads may come pre-serialised from PayloadBuilder.build_json()
+        body = payload.encode() if isinstance(payload, str) else json.dumps(payload).encode()
+        async with self.lock:
+            for attempt in (1, 2):
+                reused = self.writer is not None
+                try:
+                    if self.writer is None:
+                        await asyncio.wait_for(self._connect(), self.timeout)
+                    return await asyncio.wait_for(self._send(body), self.timeout)
+                except (OSError, ConnectionError, asyncio.IncompleteReadError):
+                    await self.close()
+                    # A kept-alive connection may have been closed by the
+                    # server in the meantime; retry once on a fresh one
+                    if attempt == 2 or not reused:
+                        raise
+                except asyncio.TimeoutError:
+                    await self.close()
+                    raise
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (OSError, ConnectionError):
+                pass
+        self.reader = None
+        self.writer = None
+
+    async def _connect(self):
+        context = ssl.create_default_context() if self.use_ssl else None
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port, ssl=context)
+
+    async def _send(self, body):
+        head = (
+            f"POST {self.path} HTTP/1.1\r\n"
+            f"Host: {self.host_header}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: keep-alive\r\n"
+        )
+        if self.auth:
+            head += f"Authorization: {self.auth}\r\n"
+        self.writer.write(head.encode('latin-1') + b"\r\n" + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed by server")
+        try:
+            status = int(status_line.split()[1])
+        except (ValueError, IndexError):
+            raise ConnectionError(f"Malformed status line {status_line[:80]!r}")
+
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            response = b""
+            while True:
+                size_line = await self.reader.readline()
+                try:
+                    size = int(size_line.split(b';')[0], 16)
+                except ValueError:
+                    raise ConnectionError(f"Malformed chunk size {size_line[:80]!r}")
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                response += await self.reader.readexactly(size)
+                await self.reader.readline()
+        elif 'content-length' in headers:
+            response = await self.reader.readexactly(int(headers['content-length']))
+        else:
+            response = await self.reader.read()
+            await self.close()
+
+        if headers.get('connection', '').lower() == 'close' and self.writer is not None:
+            await self.close()
+        return status, response
+
+
+async def tk_pump(root, interval=0.02):
+    # Drives a Tk front end from the event loop, so Tk callbacks and the
+    # collector run on the same thread. Returns when the window is closed.
+    import tkinter as tk
+
+    while True:
+        try:
+            root.update()
+        except tk.TclError:
+            return
+        await asyncio.sleep(interval)
+
+
+class AsyncCollector:
+    # Polls every probe and uploads the latest reading per probe on a single
+    # event loop thread.
+    def __init__(self, ports=None, interval=5.0, deadline=2.0, retry_delay=5.0,
+                 uploader=None, upload_interval=30.0, payload_builder=None, upload_filter=None, store=None,
+                 export=None, capture=None, calibration=None):
+        if ports is None:
+            ports = discover_ports()
+
+        self.cache = ReadingCache()
+        self.store = store
+        self.export = export
+        self.capture = capture
+        self.probes = []
+        for entry in ports:
+            if isinstance(entry, str):
+                entry = {'port': entry}
+            probe = AsyncProbe(
+                entry['port'],
+                site_name=entry.get('site_name'),
+                interval=entry.get('interval', interval),
+                deadline=entry.get('deadline', deadline),
+                retry_delay=retry_delay,
+                capture=capture,
+                calibration=calibration
+            )
+            probe.subscribe(self.cache.update)
+            if store is not None:
+                probe.subscribe(store.append)
+            if export is not None:
+                probe.subscribe(export.append)
+            self.probes.append(probe)
+
+        self.uploader = uploader
+        self.upload_interval = upload_interval
+        self.payload_builder = payload_builder or PayloadBuilder()
+        self.upload_filter = upload_filter
+        self.last_sent = {}
+        self.upload_errors = 0
+        self.last_upload_error = None
+
+    @classmethod
+    def from_config(cls, path):
+        with open(path) as f:
+            config = json.load(f)
+
+        webhook = config.get('webhook')
+        uploader = AsyncUploader(webhook['url'], webhook.get('auth')) if webhook else None
+        # "deadband": {"absolute": {...}, "relative": {...}, "heartbeat": seconds,
+        #              "per_field": false}
+        deadband = webhook.get('deadband') if webhook else None
+        upload_filter = None
+        if deadband:
+            upload_filter = DeadbandFilter(deadband.get('absolute'), deadband.get('relative'),
+                                           deadband.get('heartbeat'), deadband.get('per_field', False))
+        return cls(
+            ports=config.get('ports'),
+            interval=config.get('interval', 5.0),
+            deadline=config.get('deadline', 2.0),
+            retry_delay=config.get('retry_delay', 5.0),
+            uploader=uploader,
+            upload_interval=webhook.get('interval', 30.0) if webhook else 30.0,
+            payload_builder=PayloadBuilder(webhook.get('param_map')) if webhook else None,
+            upload_filter=upload_filter,
+            store=ReadingStore(**config['store']) if config.get('store') else None,
+            export=ExportSink(**config['export']) if config.get('export') else None,
+            capture=FrameCapture(config['capture']) if config.get('capture') else None,
+            calibration=load_calibration(config['calibration']) if config.get('calibration') else None
+        )
+
+    def subscribe(self, callback):
+        for probe in self.probes:
+            probe.subscribe(callback)
+
+    async def upload_loop(self):
+        schedule = PollSchedule(self.upload_interval)
+        schedule.tick()
+        while True:
+            await asyncio.sleep(schedule.wait_time())
+            schedule.tick()
+            for probe in self.probes:
+                reading = self.cache.latest(probe.port)
+                if reading is None or reading is self.last_sent.get(probe.port):
+                    continue
+                upload_filter = self.upload_filter
+                changed = None
+                if upload_filter is not None:
+                    changed = upload_filter.update(reading, self.payload_builder.plan)
+                    if changed is None:
+                        continue
+                    if not upload_filter.per_field:
+                        changed = None
+                try:
+                    status, _ = await self.uploader.post(self.payload_builder.build_json(reading.values, changed))
+                    error = None if 200 <= status < 300 else f"HTTP {status}"
+                except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                    error = str(e)
+                if error is None:
+                    self.last_sent[probe.port] = reading
+                    continue
+                self.upload_errors += 1
+                self.last_upload_error = error
+                # Not delivered, so the next tick tries the same reading again
+                if upload_filter is not None:
+                    upload_filter.rollback(reading)
+
+    async def run(self, root=None):
+        tasks = [asyncio.create_task(probe.run()) for probe in self.probes]
+        if self.uploader is not None:
+            tasks.append(asyncio.create_task(self.upload_loop()))
+
+        try:
+            if root is not None:
+                await tk_pump(root)
+            else:
+                await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if self.uploader is not None:
+                await self.uploader.close()
+            if self.store is not None:
+                self.store.close()
+            if self.export is not None:
+                self.export.close()
+            if self.capture is not None:
+                self.capture.close()
+
+
+def build_monitor(collector):
+    # Small read-only Tk front end: one line per reading, appended from the
+    # event loop thread that also runs the collector. The full collector GUI
+    # (final.py) is not attached here: it owns its port through a threaded
+    # ProbeWorker and runs its own upload queue and log pipe, so on this loop
+    # it would contend with AsyncProbe for the same port. It stays the
+    # threaded front end; this window is the --gui view of the async path.
+    import tkinter as tk
+
+    root = tk.Tk()
+    root.title("U-50 Monitor")
+    text = tk.Text(root, height=30, width=100, wrap=tk.NONE)
+    text.pack(fill=tk.BOTH, expand=True)
+
+    def show(reading):
+        text.insert(tk.END, f"{reading.received.strftime('%H:%M:%S')} {reading.port} "
+                            f"{reading.site_name}: {len(reading.frame)} bytes "
+                            f"in {reading.latency_text}\n")
+        text.see(tk.END)
+
+    collector.subscribe(show)
+    return root
+
+
+def main():
+    # Usage: u50_async.py [--gui] [config.json | PORT ...]
+    args = sys.argv[1:]
+    gui = '--gui' in args
+    args = [arg for arg in args if arg != '--gui']
+
+    if len(args) == 1 and args[0].endswith('.json'):
+        collector = AsyncCollector.from_config(args[0])
+    else:
+        collector = AsyncCollector(args or None)
+
+    if not collector.probes:
+        print("No serial ports found")
+        return
+
+    root = build_monitor(collector) if gui else None
+    try:
+        asyncio.run(collector.run(root))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
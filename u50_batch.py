@@ -0,0 +1,174 @@
+import sys
+
+import numpy as np
+
+from u50_frame import FRAME_START, FRAME_DECODER, HEADER_FIELDS
+
+# Everything up to and including the E/W indicator of the GPS block
+FRAME_WIDTH = sum(HEADER_FIELDS['gps'])
+
+_SPACE, _MINUS, _DOT, _ZERO = (ord(c) for c in " -.0")
+_POWERS = 10.0 ** np.arange(16)
+
+
+def read_frames(path):
+    # Archives are raw U-50 responses, one frame per line
+    with open(path, 'rb') as f:
+        lines = f.read().splitlines()
+    return [line for line in lines if line.startswith(FRAME_START)]
+
+
+def frames_to_matrix(frames, width=FRAME_WIDTH):
+    # Pads or truncates every frame to the fixed width and stacks them as one
+    # uint8 matrix, one row per frame
+    if all(len(frame) == width for frame in frames):
+        data = b"".join(frames)
+    else:
+        data = b"".join(bytes(frame[:width]).ljust(width) for frame in frames)
+    return np.frombuffer(data, dtype=np.uint8).reshape(len(frames), width)
+
+
+def decode_numbers(fields):
+    # Vectorised float() over the last axis of a uint8 array of right-aligned
+    # ASCII fields such as " 7.01", "-12.0" or "  210". Values are built as an
+    # integer mantissa divided by a power of ten, which matches float()
+    # exactly. Fields that are blank or contain anything else come back as NaN.
+    fields = np.asarray(fields, dtype=np.uint8)
+    shape = fields.shape[:-1]
+    # One contiguous array per character position keeps every step below a
+    # cheap elementwise pass
+    columns = np.ascontiguousarray(fields.reshape(-1, fields.shape[-1]).T)
+    count = columns.shape[1]
+
+    mantissa = np.zeros(count, dtype=np.int32)
+    decimals = np.zeros(count, dtype=np.int8)
+    dots = np.zeros(count, dtype=np.int8)
+    minus = np.zeros(count, dtype=np.int8)
+    has_digit = np.zeros(count, dtype=bool)
+    valid = np.ones(count, dtype=bool)
+    for column in columns:
+        digit = column - np.uint8(_ZERO)
+        is_digit = digit <= 9
+        is_dot = column == _DOT
+        is_minus = column == _MINUS
+
+        mantissa = np.where(is_digit, mantissa * 10 + digit, mantissa)
+        decimals += is_digit & (dots > 0)
+        dots += is_dot
+        minus += is_minus
+        has_digit |= is_digit
+        valid &= is_digit | is_dot | is_minus | (column == _SPACE)
+
+    valid &= has_digit & (dots <= 1) & (minus <= 1)
+    values = mantissa / _POWERS[decimals]
+    values = np.where(minus > 0, -values, values)
+    return np.where(valid, values, np.nan).reshape(shape)
+
+
+def _decode_integers(fields):
+    fields = np.asarray(fields, dtype=np.uint8)
+    digits = fields - np.uint8(_ZERO)
+    values = np.zeros(fields.shape[0], dtype=np.int64)
+    for column in range(fields.shape[1]):
+        values = values * 10 + digits[:, column]
+    return values, (digits <= 9).all(axis=1)
+
+
+def decode_values(matrix, decoder=FRAME_DECODER):
+    # Gathers the data fields of every frame from the schema offsets into one
+    # (n, parameters, width) array and decodes it in a single pass; fields of
+    # differing widths are decoded one column at a time
+    if len(set(decoder.widths)) == 1:
+        index = np.add.outer(decoder.offsets, np.arange(decoder.widths[0]))
+        values = decode_numbers(matrix[:, index])
+    else:
+        values = np.column_stack([decode_numbers(matrix[:, offset:offset + width])
+                                  for offset, width in zip(decoder.offsets, decoder.widths)])
+
+    scales = np.array(decoder.scales)
+    if (scales != 1.0).any():
+        values *= scales
+    return values
+
+
+def decode_timestamps(matrix):
+    parts = []
+    valid = np.ones(matrix.shape[0], dtype=bool)
+    offset = HEADER_FIELDS['timestamp'][0]
+    for i in range(6):
+        start = offset + i * 2
+        part, ok = _decode_integers(matrix[:, start:start + 2])
+        parts.append(part)
+        valid &= ok
+    year, month, day, hour, minute, second = parts
+    valid &= (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31)
+    valid &= (hour < 24) & (minute < 60) & (second < 60)
+
+    # Month lengths are not checked digit by digit; a day past the end of its
+    # month rolls over the same way numpy date arithmetic does
+    months = ((year + 30) * 12 + month - 1).astype('datetime64[M]')
+    timestamps = (
+        months.astype('datetime64[D]') + (day - 1).astype('timedelta64[D]')
+    ).astype('datetime64[s]') + (hour * 3600 + minute * 60 + second).astype('timedelta64[s]')
+    return np.where(valid, timestamps, np.datetime64('NaT'))
+
+
+def _decode_angle(matrix, start, degree_width, direction_offset, negative):
+    degrees, ok_degrees = _decode_integers(matrix[:, start:start + degree_width])
+    minutes, ok_minutes = _decode_integers(matrix[:, start + degree_width:start + degree_width + 2])
+    seconds, ok_seconds = _decode_integers(matrix[:, start + degree_width + 2:start + degree_width + 4])
+
+    angle = degrees + minutes / 60.0 + seconds / 3600.0
+    angle = np.where(matrix[:, start + direction_offset] == ord(negative), -angle, angle)
+    return np.where(ok_degrees & ok_minutes & ok_seconds, angle, np.nan)
+
+
+def decode_gps(matrix):
+    # Same field assignment as Reading.gps_coordinates, as signed decimal
+    # degrees; missing fixes ("--"/"---") come back as NaN
+    gps = HEADER_FIELDS['gps'][0]
+    latitude = _decode_angle(matrix, gps + 8, 3, -1, 'S')
+    longitude = _decode_angle(matrix, gps, 2, 16, 'W')
+    return latitude, longitude
+
+
+def _decode_text(matrix, name):
+    offset, width = HEADER_FIELDS[name]
+    return np.ascontiguousarray(matrix[:, offset:offset + width]).view(f'S{width}').ravel()
+
+
+def decode_matrix(matrix, decoder=FRAME_DECODER):
+    latitude, longitude = decode_gps(matrix)
+    return {
+        'site_name': np.char.strip(_decode_text(matrix, 'site_name')),
+        'probe_status': _decode_text(matrix, 'probe_status'),
+        'probe_error': _decode_text(matrix, 'probe_error'),
+        'values': decode_values(matrix, decoder),
+        'timestamp': decode_timestamps(matrix),
+        'latitude': latitude,
+        'longitude': longitude
+    }
+
+
+def decode_frames(frames, decoder=FRAME_DECODER):
+    return decode_matrix(frames_to_matrix(frames), decoder)
+
+
+def decode_file(path, decoder=FRAME_DECODER):
+    return decode_frames(read_frames(path), decoder)
+
+
+def main():
+    # Usage: u50_batch.py FRAMES_FILE [OUTPUT.npz]
+    if len(sys.argv) < 2:
+        print("Usage: u50_batch.py FRAMES_FILE [OUTPUT.npz]")
+        return
+
+    columns = decode_file(sys.argv[1])
+    print(f"Decoded {len(columns['values'])} frames")
+    if len(sys.argv) > 2:
+        np.savez(sys.argv[2], **columns)
+        print(f"Saved to {sys.argv[2]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+
+import numpy as np
+
+from u50_frame import FRAME_DECODER
+
+KELVIN = 273.15
+COMPENSATIONS = (None, 'linear', 'nernst')
+DEFAULT_PROBE = "*"
+
+
+class CalibrationTable:
+    # Per-probe, per-parameter conversion of decoded values, as one versioned
+    # table. Every calibrated parameter takes its input from a 'source'
+    # parameter (itself by default, or e.g. 'ph_mv' for pH computed from the
+    # electrode millivolts), optionally compensates it for temperature and
+    # maps it through a polynomial with 'coefficients' in ascending powers,
+    # [offset, gain, ...]. Compensation is 'linear', input / (1 + alpha *
+    # (T - reference)) as for conductivity, or 'nernst', input scaled by
+    # (reference + 273.15) / (T + 273.15) as for electrode potentials; T is
+    # the calibrated temperature. Entries under a port override those under
+    # "*" parameter by parameter; parameters in neither pass through
+    # unchanged. Each probe's entries are compiled once into coefficient and
+    # index arrays, so calibrating one reading or a million rows is the same
+    # handful of array operations.
+    def __init__(self, probes, version=None, temperature='temperature', decoder=FRAME_DECODER):
+        self.probes = {port: dict(entries) for port, entries in probes.items()}
+        self.version = version
+        self.decoder = decoder
+        self.temperature = decoder.index[temperature]
+        self.plans = {}
+        for port, entries in self.probes.items():
+            for name in entries:
+                if name not in decoder.index:
+                    raise ValueError(f"Calibration for {port} names unknown parameter {name}")
+
+    def to_dict(self):
+        return {'version': self.version, 'temperature': self.decoder.names[self.temperature],
+                'probes': self.probes}
+
+    def plan(self, port):
+        plan = self.plans.get(port)
+        if plan is None:
+            entries = dict(self.probes.get(DEFAULT_PROBE, {}))
+            entries.update(self.probes.get(port, {}))
+            plan = self.plans[port] = self._compile(entries)
+        return plan
+
+    def _compile(self, entries):
+        # Identity for every parameter, then each entry written over it
+        columns = len(self.decoder)
+        degree = max([len(entry.get('coefficients', ())) for entry in entries.values()] + [2])
+        coefficients = np.zeros((degree, columns))
+        coefficients[1] = 1.0
+        sources = np.arange(columns)
+        linear = np.zeros(columns, dtype=bool)
+        nernst = np.zeros(columns, dtype=bool)
+        alpha = np.zeros(columns)
+        reference = np.full(columns, 25.0)
+
+        for name, entry in entries.items():
+            i = self.decoder.index[name]
+            compensation = entry.get('compensation')
+            if compensation not in COMPENSATIONS:
+                raise ValueError(f"Unknown compensation {compensation} for {name}")
+            if compensation and i == self.temperature:
+                raise ValueError("Temperature cannot be temperature compensated")
+            if 'coefficients' in entry:
+                coefficients[:, i] = 0.0
+                coefficients[:len(entry['coefficients']), i] = entry['coefficients']
+            sources[i] = self.decoder.index[entry.get('source', name)]
+            linear[i] = compensation == 'linear'
+            nernst[i] = compensation == 'nernst'
+            alpha[i] = entry.get('alpha', 0.0)
+            reference[i] = entry.get('reference', 25.0)
+
+        compensated = linear | nernst
+        return {
+            'coefficients': coefficients,
+            'sources': sources,
+            'compensated': compensated if compensated.any() else None,
+            'linear': linear,
+            'alpha': alpha,
+            'reference': reference,
+            'nernst_scale': reference + KELVIN,
+        }
+
+    def transform(self, values, port=None):
+        # values: (rows, parameters) of one probe, NaN where missing; returns
+        # a new float64 array of calibrated values
+        plan = self.plan(port)
+        values = np.asarray(values, dtype=np.float64)
+        coefficients = plan['coefficients']
+        inputs = values[:, plan['sources']]
+
+        if plan['compensated'] is not None:
+            t = self.temperature
+            temperature = _polynomial(coefficients[:, t:t + 1], values[:, plan['sources'][t]][:, None])
+            with np.errstate(invalid='ignore', divide='ignore'):
+                factor = np.where(plan['linear'],
+                                  1.0 / (1.0 + plan['alpha'] * (temperature - plan['reference'])),
+                                  plan['nernst_scale'] / (temperature + KELVIN))
+            inputs = np.where(plan['compensated'], inputs * factor, inputs)
+        return _polynomial(coefficients, inputs)
+
+    def transform_batch(self, values, probes, ports):
+        # Rows of many probes at once: probes holds each row's index into
+        # ports, as a store's probe column does
+        values = np.asarray(values, dtype=np.float64)
+        probes = np.asarray(probes)
+        result = np.empty_like(values)
+        for probe in np.unique(probes):
+            rows = probes == probe
+            result[rows] = self.transform(values[rows], ports[probe])
+        return result
+
+    def apply(self, reading):
+        # Calibrates a reading in place, keeping the decoded values as
+        # raw_values; suitable as ProbeWorker.calibration
+        raw = reading.values
+        reading.values = tuple(self.transform((raw,), reading.port)[0].tolist())
+        reading.raw_values = raw
+        return reading
+
+
+def _polynomial(coefficients, x):
+    # Horner's rule down the degree axis, every column at once
+    result = np.broadcast_to(coefficients[-1], x.shape).copy()
+    for row in coefficients[-2::-1]:
+        result *= x
+        result += row
+    return result
+
+
+def load_calibration(path, decoder=FRAME_DECODER):
+    # {"version": ..., "temperature": "temperature",
+    #  "probes": {"*": {"ph": {"source": "ph_mv", "coefficients": [7.0, -0.016903],
+    #                          "compensation": "nernst"}},
+    #             "/dev/ttyUSB0": {"conductivity": {"coefficients": [0.0, 1.02],
+    #                                               "compensation": "linear", "alpha": 0.0191}}}}
+    with open(path) as f:
+        table = json.load(f)
+    return CalibrationTable(table.get('probes', {}), table.get('version'),
+                            table.get('temperature', 'temperature'), decoder)
+
+
+def recalibrate_store(source, table, destination, start=None, end=None):
+    # Writes the raw readings of the store at 'source' through 'table' into
+    # a new store at 'destination', segment by segment, with the table saved
+    # beside it as calibration.json so the result says which version made
+    # it. Returns the number of rows written.
+    from u50_query import StoreReader
+    from u50_store import ReadingStore
+
+    reader = StoreReader(source)
+    if reader.parameters != list(table.decoder.names):
+        raise ValueError(f"{source} holds parameters {reader.parameters}")
+    store = ReadingStore(destination, decoder=table.decoder)
+    with open(os.path.join(destination, "calibration.json"), 'w') as f:
+        json.dump(table.to_dict(), f, indent=2)
+
+    rows = 0
+    try:
+        for chunk in reader.select(start, end):
+            values = table.transform_batch(chunk['values'], chunk['probe'], reader.probes)
+            store.extend_probes(chunk['timestamp'], chunk['probe'], reader.probes, values, reader.sites)
+            rows += len(values)
+    finally:
+        store.close()
+    return rows
+
+
+def main():
+    # Usage: u50_calibration.py CALIBRATION.json STORE_DIR OUTPUT_DIR [--from TIME] [--to TIME]
+    # Re-calibrates a raw store in bulk, e.g. after a new calibration version
+    args = sys.argv[1:]
+    if len(args) < 3:
+        print("Usage: u50_calibration.py CALIBRATION.json STORE_DIR OUTPUT_DIR [--from TIME] [--to TIME]")
+        return
+
+    table = load_calibration(args[0])
+    start = args[args.index('--from') + 1] if '--from' in args else None
+    end = args[args.index('--to') + 1] if '--to' in args else None
+    rows = recalibrate_store(args[1], table, args[2], start, end)
+    print(f"{rows} readings calibrated with version {table.version} into {args[2]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import sys
+import time
+import struct
+import threading
+from datetime import datetime
+
+from u50_frame import FRAME_DECODER, parse_frame
+
+MAGIC = b"U50CAP01"
+
+# Every record: kind, port id, monotonic ns, wall-clock us, payload length.
+# A PORT record names a port id the first time it appears; a FRAME record
+# holds the raw bytes of one response exactly as the probe sent them.
+RECORD = struct.Struct("<BHqqH")
+FRAME, PORT = 0, 1
+
+
+class FrameCapture:
+    # Append-only binary journal of raw frames, shared by any number of probe
+    # workers. Writes go through the file buffer; call flush() to push them
+    # out early.
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.port_ids = {}
+        self.frames = 0
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        else:
+            # Keep the ids the file already names
+            for port, port_id, *_ in read_capture(path, kinds=(PORT,)):
+                self.port_ids[port] = port_id
+
+    def record(self, port, frame, monotonic_ns=None, wall_us=None):
+        monotonic_ns = time.monotonic_ns() if monotonic_ns is None else monotonic_ns
+        wall_us = time.time_ns() // 1000 if wall_us is None else wall_us
+        frame = bytes(frame)
+        with self.lock:
+            if self.file.closed:
+                return
+            port_id = self.port_ids.get(port)
+            if port_id is None:
+                port_id = self.port_ids[port] = len(self.port_ids)
+                name = str(port).encode('utf-8')
+                self.file.write(RECORD.pack(PORT, port_id, monotonic_ns, wall_us, len(name)) + name)
+            self.file.write(RECORD.pack(FRAME, port_id, monotonic_ns, wall_us, len(frame)) + frame)
+            self.frames += 1
+
+    def flush(self):
+        with self.lock:
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def read_capture(path, kinds=(FRAME,)):
+    # Yields (port, port id, frame, monotonic ns, wall us) per record; a
+    # record cut short at the end of the file is ignored
+    ports = {}
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a U-50 capture")
+
+    position = len(MAGIC)
+    while position + RECORD.size <= len(data):
+        kind, port_id, monotonic_ns, wall_us, length = RECORD.unpack_from(data, position)
+        position += RECORD.size
+        payload = data[position:position + length]
+        if len(payload) < length:
+            break
+        position += length
+        if kind == PORT:
+            ports[port_id] = payload.decode('utf-8')
+        if kind in kinds:
+            yield ports.get(port_id), port_id, payload, monotonic_ns, wall_us
+
+
+class Replayer:
+    # Feeds a capture back through parse_frame() and on to the subscribers,
+    # the same callbacks a ProbeWorker hands readings to (cache, store,
+    # export sink, upload queue, payload builder...). speed is a multiple of
+    # the recorded pace, 1.0 being real time; None replays as fast as the
+    # subscribers keep up. Readings keep their recorded wall-clock time. With
+    # a calibration (a CalibrationTable) the replay shows what a calibration
+    # version makes of the recorded frames.
+    def __init__(self, path, speed=1.0, decoder=FRAME_DECODER, calibration=None):
+        self.path = path
+        self.speed = speed
+        self.decoder = decoder
+        self.calibration = calibration
+        self.subscribers = []
+        self.stop_event = threading.Event()
+        self.frames = 0
+        self.readings = 0
+        self.invalid = 0
+        self.last_error = None
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        first = None
+        started = time.monotonic()
+        for port, _, frame, monotonic_ns, wall_us in read_capture(self.path):
+            if self.stop_event.is_set():
+                break
+            if self.speed is not None:
+                if first is None:
+                    first = monotonic_ns
+                # A new session in the same file restarts the recorded clock;
+                # carry on from the current position instead of waiting
+                if monotonic_ns < first:
+                    first, started = monotonic_ns, time.monotonic()
+                delay = started + (monotonic_ns - first) / 1e9 / self.speed - time.monotonic()
+                if delay > 0 and self.stop_event.wait(delay):
+                    break
+
+            self.frames += 1
+            reading = parse_frame(frame, port, datetime.fromtimestamp(wall_us / 1e6), None,
+                                  decoder=self.decoder, sequence=self.frames)
+            if reading is None:
+                self.invalid += 1
+                continue
+            self.readings += 1
+            if self.calibration is not None:
+                self.calibration.apply(reading)
+            for callback in self.subscribers:
+                try:
+                    callback(reading)
+                except Exception as e:
+                    self.last_error = f"Subscriber error: {e}"
+        return self.readings
+
+
+def main():
+    # Usage: u50_capture.py CAPTURE [SPEED|max] [--calibration FILE] [--store DIR] [--export DIR] [--payloads]
+    # Replays a capture and reports how fast the pipeline took it, e.g.
+    #   u50_capture.py capture.u50cap max --store /tmp/replay --payloads
+    usage = ("Usage: u50_capture.py CAPTURE [SPEED|max] [--calibration FILE] [--store DIR] [--export DIR] "
+             "[--payloads]")
+    args = sys.argv[1:]
+    if not args:
+        print(usage)
+        return
+
+    path, rest = args[0], args[1:]
+    speed = 1.0
+    if rest and not rest[0].startswith('--'):
+        try:
+            speed = None if rest[0] == 'max' else float(rest[0])
+        except ValueError:
+            print(f"Expected a speed or max, not {rest[0]!r}")
+            print(usage)
+            return
+        rest = rest[1:]
+
+    options = {}
+    while rest:
+        option, rest = rest[0], rest[1:]
+        if option == '--payloads':
+            options[option] = True
+        elif option in ('--calibration', '--store', '--export') and rest:
+            options[option], rest = rest[0], rest[1:]
+        else:
+            print(f"Expected an option and its value at {option!r}")
+            print(usage)
+            return
+
+    replayer = Replayer(path, speed)
+    sinks = []
+    payload_bytes = [0]
+    if '--calibration' in options:
+        from u50_calibration import load_calibration
+        replayer.calibration = load_calibration(options['--calibration'])
+    if '--store' in options:
+        from u50_store import ReadingStore
+        sinks.append(ReadingStore(options['--store']))
+        replayer.subscribe(sinks[-1].append)
+    if '--export' in options:
+        from u50_export import ExportSink
+        sinks.append(ExportSink(options['--export']))
+        replayer.subscribe(sinks[-1].append)
+    if '--payloads' in options:
+        from u50_webhook import PayloadBuilder
+        builder = PayloadBuilder()
+
+        def build(reading):
+            payload_bytes[0] += len(builder.build_json(reading.values))
+        replayer.subscribe(build)
+
+    started = time.perf_counter()
+    try:
+        replayer.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for sink in sinks:
+            sink.close()
+    elapsed = time.perf_counter() - started
+
+    print(f"{replayer.frames} frames, {replayer.readings} readings, {replayer.invalid} invalid "
+          f"in {elapsed:.2f} s ({replayer.frames / elapsed if elapsed else 0:.0f} frames/s)")
+    if payload_bytes[0]:
+        print(f"{payload_bytes[0]} payload bytes built")
+    if replayer.last_error:
+        print(replayer.last_error)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import sys
+import time
+import signal
+import threading
+from datetime import datetime
+
+from u50_acquisition import AcquisitionEngine
+
+
+def log(message):
+    # One line per event on stdout, for journald or docker logs
+    print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} {message}", flush=True)
+
+
+def status_line(engine):
+    parts = []
+    for status in engine.status():
+        state = "up" if status['connected'] else "down"
+        schedule = status['schedule']
+        jitter = (f", jitter mean {schedule['mean_jitter'] * 1000:.1f} ms max {schedule['max_jitter'] * 1000:.1f} ms"
+                  if schedule['polls'] else "")
+        parts.append(f"{status['port']} {state} every {status['interval']:g} s {status['polls']} polls "
+                     f"{status['misses']} misses "
+                     f"{schedule['skipped']} skipped{jitter}")
+    if engine.upload_queue is not None:
+        status = engine.upload_queue.status()
+        parts.append(f"webhook {status['readings_sent']} sent {status['readings_rejected']} rejected "
+                     f"{status['queued']} queued {status['journaled']} on disk {status['failures']} failures")
+    if engine.aggregator is not None:
+        status = engine.aggregator.status()
+        parts.append(f"{status['readings']} readings in {status['records']} records, {status['late']} late")
+    if engine.anomaly is not None:
+        status = engine.anomaly.status()
+        parts.append(f"{status['flagged']} readings flagged, {status['alerts']} alerts")
+    return "; ".join(parts)
+
+
+def run(config_path, status_interval=60.0, verbose=False):
+    # Runs the collector described by config_path (see
+    # AcquisitionEngine.from_config) until SIGTERM or SIGINT, logging a status
+    # line every status_interval seconds, the last error of each probe
+    # whenever it changes and every anomaly alert as it is raised
+    engine = AcquisitionEngine.from_config(config_path)
+    if not engine.workers:
+        log("No serial ports found")
+        return 1
+
+    stop_event = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop_event.set())
+
+    if engine.anomaly is not None:
+        from u50_anomaly import describe
+        engine.anomaly.subscribe(lambda reading, flags: log(f"{reading.port} alert: {describe(flags)}"))
+    engine.start()
+    log(f"Collecting from {', '.join(worker.port for worker in engine.workers)}")
+    errors = {}
+    next_status = time.monotonic() + status_interval
+    try:
+        while not stop_event.wait(1.0):
+            # Nobody else reads the stream; emptying it keeps memory flat
+            for reading in engine.readings.drain():
+                if verbose:
+                    log(f"{reading.port} {reading.site_name}: {len(reading.frame)} bytes "
+                        f"in {reading.latency_text}")
+
+            for worker in engine.workers:
+                if worker.last_error != errors.get(worker.port):
+                    errors[worker.port] = worker.last_error
+                    if worker.last_error:
+                        log(f"{worker.port}: {worker.last_error}")
+            if time.monotonic() >= next_status:
+                next_status += status_interval
+                log(status_line(engine))
+    finally:
+        log("Stopping")
+        engine.stop()
+        log(status_line(engine))
+    return 0
+
+
+def _seconds(text):
+    # A positive number of seconds, or None
+    try:
+        seconds = float(text)
+    except ValueError:
+        return None
+    return seconds if seconds > 0 else None
+
+
+def main():
+    # Usage: u50_daemon.py CONFIG [--status SECONDS] [--verbose]
+    #        u50_daemon.py --gui
+    # Headless collector for gateways and containers; tkinter is only
+    # imported for --gui, which opens the desktop collector instead
+    usage = "Usage: u50_daemon.py CONFIG [--status SECONDS] [--verbose] | --gui"
+    args = sys.argv[1:]
+    if '--gui' in args:
+        from final import main as gui_main
+        gui_main()
+        return
+    if not args or args[0].startswith('--'):
+        print(usage)
+        return
+
+    status_interval = 60.0
+    verbose = False
+    rest = args[1:]
+    while rest:
+        option, rest = rest[0], rest[1:]
+        if option == '--verbose':
+            verbose = True
+        elif option == '--status' and rest and _seconds(rest[0]):
+            status_interval, rest = _seconds(rest[0]), rest[1:]
+        else:
+            print(f"Expected an option and its value at {option!r}")
+            print(usage)
+            return
+    sys.exit(run(args[0], status_interval, verbose))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import os
+import csv
+import math
+import threading
+
+from u50_frame import FRAME_DECODER
+
+# strftime patterns naming the file a reading belongs to
+ROTATIONS = {'hour': "%Y%m%d-%H", 'day': "%Y%m%d"}
+
+COLUMNS = ['received', 'port', 'site_name', 'probe_status', 'probe_error', 'probe_time',
+           'latitude', 'longitude']
+
+
+def gps_degrees(reading):
+    # Signed decimal degrees from Reading.gps_coordinates, or (None, None)
+    gps = reading.gps_coordinates
+    if not gps:
+        return None, None
+    degrees = []
+    for axis, negative in (('latitude', 'S'), ('longitude', 'W')):
+        part = gps[axis]
+        value = part['degrees'] + part['minutes'] / 60.0 + part['seconds'] / 3600.0
+        degrees.append(-value if part['direction'] == negative else value)
+    return tuple(degrees)
+
+
+class ExportSink:
+    # Appends every reading it is given to CSV files, and optionally Parquet
+    # files, that rotate per hour or per day. Files stay open between readings
+    # and CSV rows go through a large write buffer that a timer flushes every
+    # flush_interval seconds, not per row. A CSV file gets its header once,
+    # when it is created; a restart appends to the current period's file.
+    # Parquet rows are written as a row group every parquet_rows readings and
+    # when the file rotates or the sink is closed.
+    def __init__(self, directory, rotate='hour', flush_interval=5.0, parquet=False, prefix="u50",
+                 decoder=FRAME_DECODER, buffer_size=1 << 16, parquet_rows=10000):
+        if rotate not in ROTATIONS:
+            raise ValueError(f"rotate must be one of {', '.join(ROTATIONS)}")
+        if parquet:
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise ImportError("Parquet export needs pyarrow")
+            self.pa = pyarrow
+            self.pq = pyarrow.parquet
+            self.schema = pyarrow.schema(
+                [('received', pyarrow.timestamp('us')), ('port', pyarrow.string()),
+                 ('site_name', pyarrow.string()), ('probe_status', pyarrow.string()),
+                 ('probe_error', pyarrow.string()), ('probe_time', pyarrow.timestamp('s')),
+                 ('latitude', pyarrow.float64()), ('longitude', pyarrow.float64())]
+                + [(name, pyarrow.float64()) for name in decoder.names]
+            )
+
+        self.directory = directory
+        self.pattern = ROTATIONS[rotate]
+        self.flush_interval = flush_interval
+        self.parquet = parquet
+        self.prefix = prefix
+        self.buffer_size = buffer_size
+        self.parquet_rows = parquet_rows
+        self.header = COLUMNS + list(decoder.names)
+        os.makedirs(directory, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.period = None
+        self.csv_file = None
+        self.writer = None
+        self.parquet_path = None
+        self.parquet_writer = None
+        self.rows = []
+        self.written = 0
+        self.closed = False
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self.thread.start()
+
+    def _row(self, reading):
+        latitude, longitude = gps_degrees(reading)
+        return [reading.received, reading.port, reading.site_name, reading.probe_status,
+                reading.probe_error, reading.timestamp, latitude, longitude] + list(reading.values)
+
+    def append(self, reading):
+        # Suitable as a ProbeWorker subscriber
+        row = self._row(reading)
+        period = reading.received.strftime(self.pattern)
+        with self.lock:
+            if self.closed:
+                return
+            if period != self.period:
+                self._rotate(period)
+            self.writer.writerow(
+                "" if value is None or (isinstance(value, float) and math.isnan(value))
+                else value.isoformat(sep=' ') if hasattr(value, 'isoformat')
+                else value
+                for value in row
+            )
+            if self.parquet:
+                self.rows.append(row)
+                if len(self.rows) >= self.parquet_rows:
+                    self._write_row_group()
+            self.written += 1
+
+    def _rotate(self, period):
+        self._close_files()
+        self.period = period
+        name = f"{self.prefix}-{period}"
+
+        path = os.path.join(self.directory, name + ".csv")
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.csv_file = open(path, 'a', newline='', encoding='utf-8', buffering=self.buffer_size)
+        self.writer = csv.writer(self.csv_file)
+        if new:
+            self.writer.writerow(self.header)
+
+        if self.parquet:
+            # A Parquet file cannot be appended to once closed; a restart
+            # within the same period starts a numbered sibling
+            path = os.path.join(self.directory, name + ".parquet")
+            n = 1
+            while os.path.exists(path):
+                path = os.path.join(self.directory, f"{name}-{n}.parquet")
+                n += 1
+            self.parquet_path = path
+
+    def _write_row_group(self):
+        if not self.rows:
+            return
+        if self.parquet_writer is None:
+            self.parquet_writer = self.pq.ParquetWriter(self.parquet_path, self.schema)
+        columns = list(zip(*self.rows))
+        self.parquet_writer.write_table(self.pa.Table.from_arrays(
+            [self.pa.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema
+        ))
+        self.rows = []
+
+    def _close_files(self):
+        if self.csv_file is not None:
+            self.csv_file.close()
+            self.csv_file = None
+            self.writer = None
+        if self.parquet:
+            self._write_row_group()
+            if self.parquet_writer is not None:
+                self.parquet_writer.close()
+                self.parquet_writer = None
+
+    def _flush_loop(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if self.csv_file is not None:
+                self.csv_file.flush()
+
+    def close(self):
+        self.stop_event.set()
+        with self.lock:
+            self.closed = True
+            self._close_files()
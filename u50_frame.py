@@ -0,0 +1,258 @@
+import struct
+from datetime import datetime
+
+FRAME_START = b"#RD"
+NAN = float('nan')
+
+# Layout of the 13 parameter blocks of a #RD frame. Every block is
+# code(2) status(1) error(1) data(width) unit(1); 'offset' and 'width' locate
+# the data field, 'scale' multiplies the decoded value and 'label' is the key
+# the GUIs and the webhook mapping use. Fixing an offset or adding a parameter
+# only means editing this table.
+PARAMETERS = [
+    {'name': 'temperature', 'label': "Temperature", 'offset': 33, 'width': 5, 'unit': "°C", 'scale': 1.0, 'type': float},
+    {'name': 'ph', 'label': "pH", 'offset': 44, 'width': 5, 'unit': "pH", 'scale': 1.0, 'type': float},
+    {'name': 'ph_mv', 'label': "pHmv", 'offset': 55, 'width': 5, 'unit': "mV", 'scale': 1.0, 'type': float},
+    {'name': 'orp', 'label': "ORP", 'offset': 66, 'width': 5, 'unit': "mV", 'scale': 1.0, 'type': float},
+    {'name': 'conductivity', 'label': "mS/cm", 'offset': 77, 'width': 5, 'unit': "mS/cm", 'scale': 1.0, 'type': float},
+    {'name': 'turbidity', 'label': "NTU", 'offset': 88, 'width': 5, 'unit': "NTU", 'scale': 1.0, 'type': float},
+    {'name': 'do', 'label': "mg/L DO", 'offset': 99, 'width': 5, 'unit': "mg/L", 'scale': 1.0, 'type': float},
+    {'name': 'tds', 'label': "g/L TDS", 'offset': 110, 'width': 5, 'unit': "g/L", 'scale': 1.0, 'type': float},
+    {'name': 'salinity', 'label': "ppt", 'offset': 121, 'width': 5, 'unit': "ppt", 'scale': 1.0, 'type': float},
+    {'name': 'sigma_t', 'label': "O' T", 'offset': 132, 'width': 5, 'unit': "σt", 'scale': 1.0, 'type': float},
+    {'name': 'depth', 'label': "m", 'offset': 143, 'width': 5, 'unit': "m", 'scale': 1.0, 'type': float},
+    {'name': 'do_saturation', 'label': "%DO", 'offset': 154, 'width': 5, 'unit': "%", 'scale': 1.0, 'type': float},
+    {'name': 'param_13', 'label': "Param 13", 'offset': 165, 'width': 5, 'unit': "", 'scale': 1.0, 'type': float},
+]
+
+# The smallest change of each parameter that is more than sensor noise:
+# absolute in the parameter's own unit, relative as a fraction of its value.
+# The upload deadbands and the anomaly detector's noise floor both use it.
+ABSOLUTE_NOISE = {
+    'temperature': 0.05,
+    'ph': 0.02,
+    'ph_mv': 2.0,
+    'orp': 2.0,
+    'do': 0.05,
+    'sigma_t': 0.05,
+    'depth': 0.01,
+    'do_saturation': 0.5,
+}
+RELATIVE_NOISE = {
+    'conductivity': 0.01,
+    'turbidity': 0.02,
+    'tds': 0.01,
+    'salinity': 0.01,
+}
+
+# Fields outside the parameter blocks: offset and width in the frame
+HEADER_FIELDS = {
+    'site_name': (3, 20),
+    'probe_status': (23, 1),
+    'probe_error': (24, 1),
+    'timestamp': (173, 12),
+    'gps': (185, 17),
+}
+
+
+def _to_float(field):
+    try:
+        return float(field)
+    except ValueError:
+        return NAN
+
+
+class FrameDecoder:
+    # A parameter table compiled into one precompiled struct that pulls every
+    # data field out of a frame in a single call. Whether values need
+    # reordering, type conversion or scaling is decided here, once, by picking
+    # the decode method; the per-frame path never branches on the schema.
+    def __init__(self, parameters):
+        self.parameters = list(parameters)
+        self.names = tuple(p['name'] for p in self.parameters)
+        self.labels = tuple(p.get('label', p['name']) for p in self.parameters)
+        self.units = tuple(p.get('unit', "") for p in self.parameters)
+        self.offsets = tuple(p['offset'] for p in self.parameters)
+        self.widths = tuple(p['width'] for p in self.parameters)
+        self.scales = tuple(float(p.get('scale', 1.0)) for p in self.parameters)
+        self.types = tuple(p.get('type', float) for p in self.parameters)
+        self.index = {name: i for i, name in enumerate(self.names)}
+
+        order = sorted(range(len(self.parameters)), key=lambda i: self.offsets[i])
+        fmt = ""
+        position = 0
+        for i in order:
+            if self.offsets[i] < position:
+                raise ValueError(f"Parameter {self.names[i]} overlaps the previous field")
+            fmt += f"{self.offsets[i] - position}x{self.widths[i]}s"
+            position = self.offsets[i] + self.widths[i]
+        self.struct = struct.Struct(fmt)
+        self.min_length = position
+
+        # struct yields fields in offset order; remember where each schema
+        # entry sits in that output
+        self.positions = tuple(order.index(i) for i in range(len(order)))
+        plain = (
+            self.positions == tuple(range(len(order)))
+            and all(t is float for t in self.types)
+            and all(s == 1.0 for s in self.scales)
+        )
+        self.decode = self._decode_plain if plain else self._decode_general
+
+    def __len__(self):
+        return len(self.parameters)
+
+    def _decode_plain(self, frame):
+        fields = self.struct.unpack_from(frame)
+        try:
+            return tuple(map(float, fields))
+        except ValueError:
+            return tuple(map(_to_float, fields))
+
+    def _decode_general(self, frame):
+        fields = self.struct.unpack_from(frame)
+        values = []
+        for position, kind, scale in zip(self.positions, self.types, self.scales):
+            try:
+                values.append(kind(fields[position]) * scale)
+            except ValueError:
+                values.append(NAN)
+        return tuple(values)
+
+
+def compile_schema(parameters=None):
+    return FrameDecoder(PARAMETERS if parameters is None else parameters)
+
+
+FRAME_DECODER = compile_schema()
+
+
+class Reading:
+    # One probe reading. Only the parameter values are decoded up front;
+    # everything else is sliced from the raw frame when first asked for.
+    # 'sequence' numbers the readings of one probe worker, so a reading seen
+    # twice can be told apart from a new one with the same values. Once a
+    # calibration has been applied, 'raw_values' holds the values as decoded.
+    __slots__ = ('frame', 'values', 'port', 'received', 'latency', '_site_name', 'decoder', 'sequence',
+                 'raw_values')
+
+    def __init__(self, frame, values, port=None, received=None, latency=None, site_name=None,
+                 decoder=FRAME_DECODER, sequence=None):
+        self.frame = frame
+        self.values = values
+        self.port = port
+        self.received = received
+        self.latency = latency
+        self._site_name = site_name
+        self.decoder = decoder
+        self.sequence = sequence
+        self.raw_values = None
+
+    def _text(self, start, end):
+        return bytes(self.frame[start:end]).decode('ascii', 'replace')
+
+    def _header(self, name):
+        offset, width = HEADER_FIELDS[name]
+        return self._text(offset, offset + width)
+
+    @property
+    def site_name(self):
+        return self._site_name or self._header('site_name').strip()
+
+    @property
+    def latency_text(self):
+        # "12 ms" for log lines; replayed and synthetic readings have no
+        # poll latency
+        return "-" if self.latency is None else f"{self.latency * 1000:.0f} ms"
+
+    @property
+    def probe_status(self):
+        return self._header('probe_status')
+
+    @property
+    def probe_error(self):
+        return self._header('probe_error')
+
+    def block(self, index):
+        offset = self.decoder.offsets[index]
+        return self._text(offset - 4, offset + self.decoder.widths[index] + 1)
+
+    def code(self, index):
+        offset = self.decoder.offsets[index]
+        return self._text(offset - 4, offset - 2)
+
+    def error(self, index):
+        # The parameter's one-character error flag
+        offset = self.decoder.offsets[index]
+        return self._text(offset - 1, offset)
+
+    def data(self, index):
+        offset = self.decoder.offsets[index]
+        return self._text(offset, offset + self.decoder.widths[index]).strip()
+
+    def unit(self, index):
+        end = self.decoder.offsets[index] + self.decoder.widths[index]
+        return self._text(end, end + 1)
+
+    @property
+    def parameters(self):
+        parameters = []
+        for offset, width in zip(self.decoder.offsets, self.decoder.widths):
+            parameters.append({
+                'code': self._text(offset - 4, offset - 2),
+                'status': self._text(offset - 2, offset - 1),
+                'error': self._text(offset - 1, offset),
+                'data': self._text(offset, offset + width).strip(),
+                'unit': self._text(offset + width, offset + width + 1)
+            })
+        return parameters
+
+    def value(self, name):
+        return self.values[self.decoder.index[name]]
+
+    @property
+    def timestamp(self):
+        text = self._header('timestamp')
+        try:
+            return datetime(2000 + int(text[0:2]), int(text[2:4]), int(text[4:6]),
+                            int(text[6:8]), int(text[8:10]), int(text[10:12]))
+        except ValueError:
+            return None
+
+    @property
+    def gps_coordinates(self):
+        text = self._header('gps')
+        if len(text) < 17:
+            return None
+
+        lon_degrees = text[0:2]
+        lat_degrees = text[8:11]
+        if lon_degrees == "--" or lat_degrees == "---":
+            return None
+
+        try:
+            return {
+                'latitude': {
+                    'degrees': int(lat_degrees),
+                    'minutes': int(text[11:13]),
+                    'seconds': int(text[13:15]),
+                    'direction': text[7]
+                },
+                'longitude': {
+                    'degrees': int(lon_degrees),
+                    'minutes': int(text[2:4]),
+                    'seconds': int(text[4:6]),
+                    'direction': text[16]
+                }
+            }
+        except ValueError:
+            return None
+
+
+def parse_frame(frame, port=None, received=None, latency=None, site_name=None, decoder=FRAME_DECODER,
+                sequence=None):
+    # Accepts bytes or a memoryview over a larger buffer; returns None for
+    # anything that is not a complete #RD frame
+    if len(frame) < decoder.min_length or frame[:3] != FRAME_START:
+        return None
+    return Reading(frame, decoder.decode(frame), port, received, latency, site_name, decoder, sequence)
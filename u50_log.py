@@ -0,0 +1,87 @@
+import itertools
+import threading
+from collections import deque
+from datetime import datetime
+
+
+class LogPipe:
+    # Log lines and GUI updates from any thread, drained by the Tk thread in
+    # one batch every interval_ms through after(). Worker threads only append
+    # to a deque; the widget is touched from the Tk thread alone. Lines keep
+    # the time they were logged, not the time they were shown. At most
+    # max_lines stay in the widget, the oldest trimmed first, and no more than
+    # that wait in the queue either. Posted calls are coalesced per callback,
+    # only the newest arguments being kept, so a stalled GUI cannot grow
+    # memory either way.
+    def __init__(self, widget, max_lines=2000, interval_ms=100):
+        self.widget = widget
+        self.max_lines = max_lines
+        self.interval_ms = interval_ms
+        self.lines = deque(maxlen=max_lines)
+        self.calls = {}
+        self.calls_lock = threading.Lock()
+        self.sequence = itertools.count(1)
+        self.shown = 0
+        self.skipped = 0
+        self.job = None
+
+    def log(self, message):
+        self.lines.append((next(self.sequence), f"{datetime.now().strftime('%H:%M:%S')}: {message}\n"))
+
+    def post(self, callback, *args):
+        # Runs callback(*args) on the Tk thread with the next batch; a call
+        # to the same callback still waiting there is replaced
+        with self.calls_lock:
+            self.calls[callback] = args
+
+    def start(self):
+        if self.job is None:
+            self.job = self.widget.after(self.interval_ms, self._drain)
+
+    def stop(self):
+        if self.job is not None:
+            self.widget.after_cancel(self.job)
+            self.job = None
+
+    def _drain(self):
+        self.job = None
+        try:
+            with self.calls_lock:
+                calls, self.calls = self.calls, {}
+            for callback, args in calls.items():
+                callback(*args)
+            self.flush()
+        finally:
+            self.job = self.widget.after(self.interval_ms, self._drain)
+
+    def flush(self):
+        # Tk thread only
+        lines = []
+        while self.lines:
+            lines.append(self.lines.popleft())
+        if not lines:
+            return
+        # Lines that fell out of a full queue before the GUI got to them;
+        # make room for a note saying so
+        skipped = lines[0][0] - self.shown - 1
+        if skipped > 0:
+            keep = lines[-(self.max_lines - 1):]
+            skipped += len(lines) - len(keep)
+            self.skipped += skipped
+            lines = [(0, f"{datetime.now().strftime('%H:%M:%S')}: ... {skipped} lines skipped\n")] + keep
+        self.shown = lines[-1][0]
+
+        widget = self.widget
+        # Follow the end only if the user has not scrolled up to read
+        following = widget.yview()[1] >= 1.0
+        widget.insert('end', "".join(text for _, text in lines))
+        excess = int(widget.index('end-1c').split('.')[0]) - 1 - self.max_lines
+        if excess > 0:
+            widget.delete('1.0', f"{excess + 1}.0")
+        if following:
+            widget.see('end')
+
+    def clear(self):
+        while self.lines:
+            self.shown = self.lines.popleft()[0]
+        self.widget.delete('1.0', 'end')
@@ -0,0 +1,205 @@
+import sys
+import csv
+
+import numpy as np
+
+from u50_batch import read_frames, frames_to_matrix, decode_numbers
+from u50_capture import MAGIC as CAPTURE_MAGIC, read_capture
+
+_SPACE, _MINUS, _DOT, _ZERO, _NINE = (ord(c) for c in " -.09")
+MAX_WIDTH = 9
+
+
+def load_frames(path):
+    # A capture journal or a raw archive with one frame per line
+    with open(path, 'rb') as f:
+        capture = f.read(len(CAPTURE_MAGIC)) == CAPTURE_MAGIC
+    if capture:
+        return [frame for _, _, frame, _, _ in read_capture(path)]
+    return read_frames(path)
+
+
+def load_references(path):
+    # CSV with a header row naming each reference series and one row per
+    # frame, in capture order; blank cells are unknown
+    with open(path, newline='') as f:
+        rows = list(csv.reader(f))
+    names = rows[0]
+    values = np.array([[float(cell) if cell.strip() else np.nan for cell in row] for row in rows[1:]])
+    return names, values.reshape(-1, len(names))
+
+
+def offset_stats(matrix):
+    # Per byte offset, over all frames at once: variance of the byte value,
+    # how often it changes from one frame to the next, how many distinct
+    # bytes it takes, and the share of frames where it holds a digit or any
+    # character a number can contain
+    rows, width = matrix.shape
+    digit = (matrix >= _ZERO) & (matrix <= _NINE)
+    numeric = digit | (matrix == _SPACE) | (matrix == _DOT) | (matrix == _MINUS)
+    counts = np.bincount((matrix + np.arange(width, dtype=np.int64) * 256).ravel(),
+                         minlength=256 * width).reshape(width, 256)
+    return {
+        'variance': matrix.var(axis=0),
+        'change_rate': (matrix[1:] != matrix[:-1]).mean(axis=0) if rows > 1 else np.zeros(width),
+        'distinct': (counts > 0).sum(axis=1),
+        'digit_fraction': digit.mean(axis=0),
+        'numeric_fraction': numeric.mean(axis=0),
+    }
+
+
+def right_aligned(fields):
+    # True per row where the field reads as optional leading spaces followed
+    # by a number with no gaps and at most a leading minus, the way the probe
+    # pads its values
+    is_space = fields == _SPACE
+    started = np.maximum.accumulate(~is_space, axis=1)
+    before = np.zeros_like(started)
+    before[:, 1:] = started[:, :-1]
+    bad = (is_space & started) | ((fields == _MINUS) & before)
+    return ~bad.any(axis=1) & ~np.isnan(decode_numbers(fields))
+
+
+def propose_fields(matrix, stats, threshold=0.99):
+    # Runs of offsets that hold number characters in (nearly) every frame are
+    # split at anything else, such as unit letters. Each run is then trimmed
+    # from the left to the widest suffix that is a right-aligned number in
+    # 'threshold' of the frames, which drops code/status digits glued to the
+    # front of a value. Fields that never change are reported as constant.
+    # Candidates are at most MAX_WIDTH wide, the most decode_numbers() holds.
+    # A value that always fills its field leaves no padding to find its left
+    # edge by; such fields are cut to the width most padded fields share and
+    # marked as guessed.
+    numeric = stats['numeric_fraction'] >= threshold
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], numeric.astype(np.int8), [0]))))
+    candidates = []
+    for run_start, run_end in zip(edges[::2], edges[1::2]):
+        first = max(run_start, run_end - MAX_WIDTH)
+        for start in range(first, run_end):
+            if right_aligned(matrix[:, start:run_end]).mean() >= threshold:
+                candidates.append((start, run_end, start > first))
+                break
+
+    widths = [end - start for start, end, padded in candidates if padded]
+    common = max(set(widths), key=widths.count) if widths else None
+    fields = []
+    for start, end, padded in candidates:
+        guessed = not padded and common is not None and end - start > common
+        if guessed:
+            start = end - common
+        fields.append({
+            'offset': int(start),
+            'width': int(end - start),
+            'values': decode_numbers(matrix[:, start:end]),
+            'constant': bool((stats['change_rate'][start:end] == 0).all()),
+            'guessed': guessed,
+        })
+    return fields
+
+
+def correlate(x, y):
+    # Pearson correlation of every column of x with every column of y, with
+    # NaNs standing in for the column mean; returns (r, slope, intercept),
+    # each shaped (x columns, y columns)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    x = np.where(np.isnan(x), np.nanmean(x, axis=0), x)
+    y = np.where(np.isnan(y), np.nanmean(y, axis=0), y)
+    x_mean, y_mean = x.mean(axis=0), y.mean(axis=0)
+    x_std, y_std = x.std(axis=0), y.std(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = ((x - x_mean).T @ (y - y_mean)) / len(x) / np.outer(x_std, y_std)
+        slope = r * y_std / x_std[:, None]
+    intercept = y_mean - slope * x_mean[:, None]
+    return r, slope, intercept
+
+
+def digit_values(matrix):
+    # Numeric value of every digit byte, 0 for anything else
+    digits = matrix.astype(np.int16) - _ZERO
+    return np.where((digits >= 0) & (digits <= 9), digits, 0)
+
+
+def suggest_scale(slope):
+    # Snaps a fitted slope to the nearest power of ten when it is within 2%
+    if not np.isfinite(slope) or slope == 0:
+        return None
+    power = 10.0 ** round(np.log10(abs(slope)))
+    scale = power if slope > 0 else -power
+    return scale if abs(slope / scale - 1) <= 0.02 else float(slope)
+
+
+def analyse(matrix, reference_names=None, references=None, threshold=0.99, min_r=0.9):
+    stats = offset_stats(matrix)
+    fields = propose_fields(matrix, stats, threshold)
+    if references is not None and fields:
+        stats['correlation'] = correlate(digit_values(matrix), references)[0]
+        r, slope, intercept = correlate(np.column_stack([field['values'] for field in fields]), references)
+        for i, field in enumerate(fields):
+            if field['constant'] or np.isnan(r[i]).all():
+                continue
+            best = int(np.nanargmax(np.abs(r[i])))
+            if abs(r[i, best]) >= min_r:
+                field['reference'] = reference_names[best]
+                field['r'] = float(r[i, best])
+                field['scale'] = suggest_scale(slope[i, best])
+                field['intercept'] = float(intercept[i, best])
+    return stats, fields
+
+
+def main():
+    # Usage: u50_offsets.py FRAMES [--reference REFERENCE.csv] [--offsets]
+    # FRAMES is a capture journal or a raw archive; REFERENCE.csv holds known
+    # values (e.g. read off the probe display), one row per frame
+    args = sys.argv[1:]
+    if not args:
+        print("Usage: u50_offsets.py FRAMES [--reference REFERENCE.csv] [--offsets]")
+        return
+
+    frames = load_frames(args[0])
+    width = max(len(frame) for frame in frames)
+    matrix = frames_to_matrix(frames, width)
+    reference_names, references = None, None
+    if '--reference' in args:
+        reference_names, references = load_references(args[args.index('--reference') + 1])
+        if len(references) != len(matrix):
+            print(f"Reference has {len(references)} rows for {len(matrix)} frames")
+            return
+
+    stats, fields = analyse(matrix, reference_names, references)
+    print(f"{len(matrix)} frames, {width} bytes wide")
+
+    if '--offsets' in args:
+        print("offset  byte  variance  change  distinct  digits  numeric" + ("  best r" if references is not None else ""))
+        for offset in range(width):
+            common = np.bincount(matrix[:, offset], minlength=256).argmax()
+            line = (f"{offset:6d}  {chr(common)!r:>4}  {stats['variance'][offset]:8.2f}  "
+                    f"{stats['change_rate'][offset]:6.3f}  {stats['distinct'][offset]:8d}  "
+                    f"{stats['digit_fraction'][offset]:6.2f}  {stats['numeric_fraction'][offset]:7.2f}")
+            if references is not None:
+                r = stats['correlation'][offset]
+                best = int(np.nanargmax(np.abs(r))) if not np.isnan(r).all() else None
+                line += f"  {r[best]:+.2f} {reference_names[best]}" if best is not None else "      -"
+            print(line)
+
+    print("\nProposed fields:")
+    for field in fields:
+        values = field['values']
+        summary = (f"offset {field['offset']:3d} width {field['width']:2d}{'?' if field['guessed'] else ' '} "
+                   f"{'constant' if field['constant'] else 'varies  '}  "
+                   f"range {np.nanmin(values):g} .. {np.nanmax(values):g}")
+        if 'reference' in field:
+            summary += (f"  ~ {field['reference']} (r={field['r']:+.3f}, scale {field['scale']:g}, "
+                        f"offset {field['intercept']:+.3g})")
+        print(summary)
+
+    print("\nSchema entries:")
+    for field in fields:
+        if field['constant']:
+            continue
+        name = field.get('reference', f"field_{field['offset']}")
+        print(f"    {{'name': '{name}', 'offset': {field['offset']}, 'width': {field['width']}, "
+              f"'scale': {field.get('scale') or 1.0}}},")
+
+if __name__ == "__main__":
+    main()
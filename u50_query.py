@@ -0,0 +1,285 @@
+import os
+import sys
+import json
+
+import numpy as np
+
+from u50_store import SEGMENT_SUFFIX, read_header, load_segment
+
+# Rows per entry of the sparse time index kept beside each sealed segment
+INDEX_BLOCK = 4096
+AGGREGATES = ('count', 'mean', 'min', 'max', 'last')
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def parse_interval(every):
+    # "90s", "15m", "1h", "1d" or plain seconds, in microseconds
+    if isinstance(every, str) and every[-1:] in _UNITS:
+        return int(float(every[:-1]) * _UNITS[every[-1]] * 1_000_000)
+    return int(float(every) * 1_000_000)
+
+
+def to_microseconds(value):
+    if value is None:
+        return None
+    return int(np.datetime64(value, 'us').astype(np.int64))
+
+
+def block_index(timestamps, block=INDEX_BLOCK):
+    # Smallest and largest timestamp of every block of rows; rows are
+    # appended roughly in time order, so a range maps onto few blocks
+    starts = np.arange(0, len(timestamps), block)
+    return np.stack([np.minimum.reduceat(timestamps, starts), np.maximum.reduceat(timestamps, starts)], axis=1)
+
+
+def _aggregate(times, values, width):
+    # Per-bucket partial aggregates of raw rows. Rows are in time order as a
+    # rule, so bucket boundaries are found by binary search on the time
+    # column instead of dividing every timestamp.
+    if not (times[1:] >= times[:-1]).all():
+        order = np.argsort(times, kind='stable')
+        times, values = times[order], values[order]
+
+    first, last = times[0] // width, times[-1] // width
+    starts = np.searchsorted(times, np.arange(first, last + 1) * width)
+    starts[0] = 0
+    ends = np.append(starts[1:], len(times))
+    filled = ends > starts
+    buckets = np.arange(first, last + 1)[filled]
+    starts, ends = starts[filled], ends[filled] - 1
+
+    valid = ~np.isnan(values)
+    return {
+        'bucket': buckets,
+        'time': times[ends],
+        'count': np.add.reduceat(valid, starts, axis=0, dtype=np.int64),
+        'total': np.add.reduceat(np.where(valid, values, 0), starts, axis=0, dtype=np.float64),
+        'min': np.fmin.reduceat(values, starts, axis=0),
+        'max': np.fmax.reduceat(values, starts, axis=0),
+        'last': values[ends],
+    }
+
+
+def _reduce(bucket, time, count, total, low, high, last):
+    # Folds partial aggregates into one row per bucket. 'time' is when each
+    # row's 'last' value was taken.
+    if len(time) > 1 and (np.diff(time) < 0).any():
+        order = np.argsort(time, kind='stable')
+        order = order[np.argsort(bucket[order], kind='stable')]
+        bucket, time, count, total, low, high, last = (
+            a[order] for a in (bucket, time, count, total, low, high, last))
+
+    starts = np.flatnonzero(np.concatenate(([True], bucket[1:] != bucket[:-1])))
+    ends = np.append(starts[1:], len(bucket)) - 1
+    return {
+        'bucket': bucket[starts],
+        'time': time[ends],
+        'count': np.add.reduceat(count, starts, axis=0),
+        'total': np.add.reduceat(total, starts, axis=0),
+        'min': np.fmin.reduceat(low, starts, axis=0),
+        'max': np.fmax.reduceat(high, starts, axis=0),
+        'last': last[ends],
+    }
+
+
+def _concat(first, second):
+    return {key: np.concatenate((first[key], second[key])) for key in first}
+
+
+def _finish(partial, width):
+    count = partial['count']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = partial['total'] / count
+    return {
+        'bucket': (partial['bucket'] * width).astype('datetime64[us]'),
+        'count': count,
+        'mean': np.where(count > 0, mean, np.nan),
+        'min': partial['min'].astype(np.float64),
+        'max': partial['max'].astype(np.float64),
+        'last': partial['last'].astype(np.float64),
+    }
+
+
+class StoreReader:
+    # Read side of a ReadingStore directory. Segments are picked from their
+    # header time range, and within a segment a sparse block index narrows a
+    # query down to the blocks that can hold matching rows. The index of a
+    # sealed segment is written next to it on first use; the segment still
+    # being appended to is indexed on the fly.
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "store.json")) as f:
+            meta = json.load(f)
+        self.parameters = meta['parameters']
+        self.probes = meta['probes']
+        self.sites = meta.get('sites') or [None] * len(self.probes)
+        self.segments = [(os.path.join(path, name), read_header(os.path.join(path, name)))
+                         for name in sorted(os.listdir(path)) if name.endswith(SEGMENT_SUFFIX)]
+
+    def columns(self, parameters=None):
+        if parameters is None:
+            return list(range(len(self.parameters)))
+        unknown = [name for name in parameters if name not in self.parameters]
+        if unknown:
+            raise ValueError(f"Unknown parameters {', '.join(unknown)}; "
+                             f"the store holds {', '.join(self.parameters)}")
+        return [self.parameters.index(name) for name in parameters]
+
+    def probe_ids(self, probe=None, site=None):
+        # Probe list entries of a port and/or a site name; None for all
+        if probe is None and site is None:
+            return None
+        if probe is not None and probe not in self.probes:
+            raise ValueError(f"Unknown probe {probe}; the store holds {', '.join(self.probes) or 'none'}")
+        if site is not None and site not in self.sites:
+            known = sorted({name for name in self.sites if name})
+            raise ValueError(f"Unknown site {site}; the store holds {', '.join(known) or 'none'}")
+        return np.array([i for i, (port, name) in enumerate(zip(self.probes, self.sites))
+                         if probe in (None, port) and site in (None, name)], dtype=np.int64)
+
+    def _index(self, path, count, timestamps, sealed):
+        index_path = path[:-len(SEGMENT_SUFFIX)] + ".idx.npy"
+        blocks = -(-count // INDEX_BLOCK)
+        if sealed and os.path.exists(index_path):
+            index = np.load(index_path)
+            if len(index) == blocks:
+                return index
+        index = block_index(timestamps[:count])
+        if sealed:
+            np.save(index_path, index)
+        return index
+
+    def select(self, start=None, end=None, probe=None, parameters=None, site=None):
+        # Iterates over the matching rows one segment at a time, as
+        # {'timestamp', 'probe', 'values'} with one values column per
+        # requested parameter; only those columns are read from disk. Rows
+        # can be narrowed to a port, a site, or both. An unknown probe, site
+        # or parameter raises ValueError here, not on the first chunk.
+        columns = self.columns(parameters)
+        probe_ids = self.probe_ids(probe, site)
+        return self._select(to_microseconds(start), to_microseconds(end), probe_ids, columns)
+
+    def _select(self, start, end, probe_ids, columns):
+        newest = len(self.segments) - 1
+
+        for n, (path, header) in enumerate(self.segments):
+            if n == newest:
+                # May still be growing; take a fresh look
+                header = read_header(path)
+            count = header['count']
+            if not count or (start is not None and header['last'] < start) or (
+                    end is not None and header['first'] >= end):
+                continue
+
+            segment = load_segment(path)
+            timestamps = segment['timestamp'].view(np.int64)
+            lo, hi = 0, count
+            inside = (start is None or header['first'] >= start) and (end is None or header['last'] < end)
+            if not inside:
+                sealed = n < newest or count == header['capacity']
+                index = self._index(path, count, timestamps, sealed)
+                hit = np.ones(len(index), dtype=bool)
+                if start is not None:
+                    hit &= index[:, 1] >= start
+                if end is not None:
+                    hit &= index[:, 0] < end
+                blocks = np.flatnonzero(hit)
+                if not len(blocks):
+                    continue
+                lo, hi = blocks[0] * INDEX_BLOCK, min((blocks[-1] + 1) * INDEX_BLOCK, count)
+
+            times = timestamps[lo:hi]
+            mask = None
+            if not inside:
+                mask = np.ones(hi - lo, dtype=bool)
+                if start is not None:
+                    mask &= times >= start
+                if end is not None:
+                    mask &= times < end
+            if probe_ids is not None:
+                matches = np.isin(segment['probe'][lo:hi], probe_ids)
+                mask = matches if mask is None else mask & matches
+
+            probes = segment['probe'][lo:hi]
+            values = np.column_stack([segment['values'][lo:hi, column] for column in columns])
+            if mask is not None:
+                if not mask.any():
+                    continue
+                times, probes, values = times[mask], probes[mask], values[mask]
+            yield {'timestamp': times.view('datetime64[us]'), 'probe': probes, 'values': values}
+
+    def downsample(self, every, start=None, end=None, probe=None, parameters=None, site=None):
+        # Streams per-bucket count/mean/min/max/last of each requested
+        # parameter, one result chunk per segment read. Buckets are aligned to
+        # the epoch; one still open at the end of a segment is carried into
+        # the next chunk. NaN values are left out of every aggregate but last.
+        return self._downsample(parse_interval(every), self.select(start, end, probe, parameters, site))
+
+    def _downsample(self, width, chunks):
+        pending = None
+        for chunk in chunks:
+            partial = _aggregate(chunk['timestamp'].view(np.int64), chunk['values'], width)
+            if pending is not None:
+                partial = _reduce(*(_concat(pending, partial)[key] for key in
+                                    ('bucket', 'time', 'count', 'total', 'min', 'max', 'last')))
+
+            done = partial['bucket'] < partial['bucket'][-1]
+            pending = {key: array[~done] for key, array in partial.items()}
+            if done.any():
+                yield _finish({key: array[done] for key, array in partial.items()}, width)
+
+        if pending is not None:
+            yield _finish(pending, width)
+
+
+def main():
+    # Usage: u50_query.py STORE_DIR EVERY [--from TIME] [--to TIME] [--probe PORT] [--site NAME]
+    #        [--param NAME]...
+    # Prints one CSV row per bucket, e.g.
+    #   u50_query.py readings 1h --from 2026-09-01 --to 2026-10-01 --param do
+    usage = ("Usage: u50_query.py STORE_DIR EVERY [--from TIME] [--to TIME] [--probe PORT] [--site NAME] "
+             "[--param NAME]...")
+    args = sys.argv[1:]
+    if len(args) < 2:
+        print(usage)
+        return
+
+    path, every = args[:2]
+    options = {'--from': None, '--to': None, '--probe': None, '--site': None}
+    parameters = []
+    rest = args[2:]
+    while rest:
+        if len(rest) < 2 or not (rest[0] in options or rest[0] == '--param'):
+            print(f"Expected an option and its value at {rest[0]!r}")
+            print(usage)
+            return
+        option, value, rest = rest[0], rest[1], rest[2:]
+        if option == '--param':
+            parameters.append(value)
+        else:
+            options[option] = value
+
+    reader = StoreReader(path)
+    parameters = parameters or reader.parameters
+    try:
+        results = reader.downsample(every, options['--from'], options['--to'], options['--probe'], parameters,
+                                    options['--site'])
+    except ValueError as e:
+        print(e)
+        print(usage)
+        return
+
+    header = ["bucket"]
+    for name in parameters:
+        header += [f"{name}_{aggregate}" for aggregate in AGGREGATES]
+    print(",".join(header))
+
+    for result in results:
+        for i, bucket in enumerate(result['bucket']):
+            row = [str(bucket)]
+            for column in range(len(parameters)):
+                row += [str(result[aggregate][i, column]) for aggregate in AGGREGATES]
+            print(",".join(row))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import time
+from collections import deque
+
+
+def calculate_fcs(command):
+    result = 0
+    for char in command:
+        result ^= ord(char)
+
+    return format(result, '02X')
+
+
+def build_command(command):
+    return f"{command}{calculate_fcs(command)}\r\n".encode()
+
+
+RD_COMMAND = build_command("#RD@")
+
+
+class FrameReader:
+    # Reads U-50 response frames from a serial connection. A frame starts with
+    # the start marker and ends at the first CR or LF; bytes that arrive in
+    # several chunks are buffered until the frame is complete or the deadline
+    # passes.
+    def __init__(self, serial_conn, start=b"#RD", deadline=2.0, history=100):
+        self.serial_conn = serial_conn
+        self.start = start
+        self.deadline = deadline
+        self.buffer = bytearray()
+        self.last_latency = None
+        self.latencies = deque(maxlen=history)
+        self.timeouts = 0
+
+    def poll(self, command, deadline=None):
+        # Drop anything left over from an earlier, abandoned poll so a late
+        # answer is never mistaken for the response to this command
+        self.buffer.clear()
+        self.serial_conn.reset_input_buffer()
+
+        started = time.perf_counter()
+        self.serial_conn.write(command)
+        frame = self.read_frame(deadline)
+        latency = time.perf_counter() - started
+
+        if frame is None:
+            self.timeouts += 1
+            self.last_latency = None
+        else:
+            self.last_latency = latency
+            self.latencies.append(latency)
+        return frame
+
+    def read_frame(self, deadline=None):
+        if deadline is None:
+            deadline = self.deadline
+        end_time = time.monotonic() + deadline
+        original_timeout = self.serial_conn.timeout
+
+        try:
+            while True:
+                frame = self._extract_frame()
+                if frame is not None:
+                    return frame
+
+                remaining = end_time - time.monotonic()
+                if remaining <= 0:
+                    return None
+
+                self.serial_conn.timeout = remaining
+                chunk = self.serial_conn.read(self.serial_conn.in_waiting or 1)
+                if chunk:
+                    self.buffer += chunk
+        finally:
+            self.serial_conn.timeout = original_timeout
+
+    def _extract_frame(self):
+        start = self.buffer.find(self.start)
+        if start < 0:
+            # Keep a short tail in case the start marker is split across reads
+            keep = len(self.start) - 1
+            if len(self.buffer) > keep:
+                del self.buffer[:len(self.buffer) - keep]
+            return None
+        if start:
+            del self.buffer[:start]
+
+        search_from = len(self.start)
+        cr = self.buffer.find(b"\r", search_from)
+        lf = self.buffer.find(b"\n", search_from)
+        if cr < 0 and lf < 0:
+            return None
+        end = lf if cr < 0 else cr if lf < 0 else min(cr, lf)
+
+        frame = bytes(self.buffer[:end])
+        del self.buffer[:end + 1]
+        return frame
+
+    def latency_stats(self):
+        if not self.latencies:
+            return {'count': 0, 'timeouts': self.timeouts, 'last': None,
+                    'min': None, 'mean': None, 'max': None}
+
+        return {
+            'count': len(self.latencies),
+            'timeouts': self.timeouts,
+            'last': self.last_latency,
+            'min': min(self.latencies),
+            'mean': sum(self.latencies) / len(self.latencies),
+            'max': max(self.latencies)
+        }
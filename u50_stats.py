@@ -0,0 +1,168 @@
+import sys
+import threading
+
+import numpy as np
+
+from u50_frame import FRAME_DECODER
+
+# Window name -> length in seconds
+DEFAULT_WINDOWS = {'1m': 60, '15m': 900, '1h': 3600}
+STATISTICS = ('count', 'mean', 'min', 'max', 'var', 'ewma')
+
+
+class RollingWindow:
+    # Rolling count/mean/min/max/variance of every parameter of one probe over
+    # the last 'seconds', plus an EWMA with that time constant. The window is
+    # a ring of 'buckets' sub-intervals, each holding per-parameter count,
+    # sum, sum of squares, min and max, and a bucket is cleared as it falls
+    # out of the window. An update touches one bucket, so it costs the same
+    # whatever the reading rate, and memory is fixed. The window therefore
+    # moves in steps of seconds / buckets. Sums are kept relative to the first
+    # value seen, which keeps the variance accurate for large, steady values
+    # such as conductivity, and the running totals are summed afresh from the
+    # buckets whenever the window moves, so rounding never accumulates.
+    def __init__(self, seconds, columns, buckets=60):
+        self.seconds = seconds
+        self.width = seconds / buckets
+        self.buckets = buckets
+        shape = (buckets, columns)
+        self.counts = np.zeros(shape)
+        self.sums = np.zeros(shape)
+        self.squares = np.zeros(shape)
+        self.lows = np.full(shape, np.inf)
+        self.highs = np.full(shape, -np.inf)
+        self.count = np.zeros(columns)
+        self.total = np.zeros(columns)
+        self.square_total = np.zeros(columns)
+        self.shift = np.zeros(columns)
+        self.slot = None
+        self.ewma = np.full(columns, np.nan)
+        self.last_time = None
+
+    def _expire(self, slot):
+        # Clears the buckets between the current slot and the new one
+        for n in range(self.slot + 1, min(slot, self.slot + self.buckets) + 1):
+            i = n % self.buckets
+            self.counts[i] = 0
+            self.sums[i] = 0
+            self.squares[i] = 0
+            self.lows[i] = np.inf
+            self.highs[i] = -np.inf
+        self.slot = slot
+        self.count = self.counts.sum(axis=0)
+        self.total = self.sums.sum(axis=0)
+        self.square_total = self.squares.sum(axis=0)
+
+    def add(self, timestamp, values, valid):
+        # timestamp in seconds; values a float array with NaN for missing
+        # parameters, valid its ~isnan mask
+        slot = int(timestamp // self.width)
+        if self.slot is None:
+            self.slot = slot
+            self.shift = np.where(valid, values, 0.0)
+        elif slot > self.slot:
+            self._expire(slot)
+        # A reading older than the current slot (clock stepped back) counts
+        # towards the current one
+
+        i = self.slot % self.buckets
+        shifted = np.where(valid, values - self.shift, 0.0)
+        squared = shifted * shifted
+        self.counts[i] += valid
+        self.sums[i] += shifted
+        self.squares[i] += squared
+        np.fmin(self.lows[i], values, out=self.lows[i])
+        np.fmax(self.highs[i], values, out=self.highs[i])
+        self.count += valid
+        self.total += shifted
+        self.square_total += squared
+
+        if self.last_time is None:
+            self.ewma = np.where(valid, values, np.nan)
+        else:
+            alpha = 1.0 - np.exp(-max(timestamp - self.last_time, 0.0) / self.seconds)
+            started = valid & np.isnan(self.ewma)
+            self.ewma = np.where(started, values, self.ewma)
+            self.ewma = np.where(valid & ~started, self.ewma + alpha * (values - self.ewma), self.ewma)
+        self.last_time = timestamp
+
+    def statistics(self):
+        # Arrays over the parameters; NaN where there is nothing to report
+        count = self.count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self.total / count
+            var = (self.square_total - self.total * mean) / (count - 1)
+        low = self.lows.min(axis=0)
+        high = self.highs.max(axis=0)
+        return {
+            'count': count,
+            'mean': np.where(count > 0, self.shift + mean, np.nan),
+            'min': np.where(np.isfinite(low), low, np.nan),
+            'max': np.where(np.isfinite(high), high, np.nan),
+            'var': np.where(count > 1, np.maximum(var, 0.0), np.nan),
+            'ewma': self.ewma.copy(),
+        }
+
+
+class RollingStats:
+    # RollingWindows for every probe and every configured window, fed one
+    # reading at a time. Suitable as a ProbeWorker subscriber; readings are
+    # placed by their received time, so replays roll at the recorded pace.
+    def __init__(self, windows=None, buckets=60, decoder=FRAME_DECODER):
+        self.windows = dict(windows or DEFAULT_WINDOWS)
+        self.buckets = buckets
+        self.decoder = decoder
+        self.lock = threading.Lock()
+        self.probes = {}
+
+    def update(self, reading):
+        values = np.array(reading.values, dtype=np.float64)
+        valid = ~np.isnan(values)
+        timestamp = reading.received.timestamp()
+        with self.lock:
+            windows = self.probes.get(reading.port)
+            if windows is None:
+                windows = self.probes[reading.port] = {
+                    name: RollingWindow(seconds, len(self.decoder), self.buckets)
+                    for name, seconds in self.windows.items()
+                }
+            for window in windows.values():
+                window.add(timestamp, values, valid)
+
+    def statistics(self, port):
+        # {window name: {statistic: array over the schema parameters}}, or
+        # None for a probe not seen yet
+        with self.lock:
+            windows = self.probes.get(port)
+            if windows is None:
+                return None
+            return {name: window.statistics() for name, window in windows.items()}
+
+    def ports(self):
+        with self.lock:
+            return list(self.probes)
+
+
+def main():
+    # Usage: u50_stats.py CAPTURE  - rolling statistics at the end of a
+    # capture journal, per probe and window
+    if len(sys.argv) < 2:
+        print("Usage: u50_stats.py CAPTURE")
+        return
+
+    from u50_capture import Replayer
+    stats = RollingStats()
+    replayer = Replayer(sys.argv[1], speed=None)
+    replayer.subscribe(stats.update)
+    replayer.run()
+
+    names = stats.decoder.names
+    for port in stats.ports():
+        for window, values in stats.statistics(port).items():
+            print(f"{port} {window}:")
+            for i, name in enumerate(names):
+                print(f"  {name:14s}" + "".join(f" {statistic}={values[statistic][i]:.4g}"
+                                                   for statistic in STATISTICS))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+import os
+import sys
+import json
+import math
+import threading
+
+import numpy as np
+
+from u50_frame import FRAME_DECODER
+
+MAGIC = b"U50SEG01"
+SEGMENT_SUFFIX = ".u50seg"
+
+# Fixed 64-byte segment header. 'count' is rewritten after every append;
+# 'first' and 'last' are the smallest and largest timestamp stored.
+HEADER = np.dtype([
+    ('magic', 'S8'),
+    ('columns', '<u4'),
+    ('reserved', '<u4'),
+    ('capacity', '<i8'),
+    ('count', '<i8'),
+    ('start', '<i8'),
+    ('first', '<i8'),
+    ('last', '<i8'),
+    ('padding', 'S8'),
+])
+
+# Column dtypes: timestamps are microseconds since the epoch (naive local
+# time, like Reading.received), probes are indices into the store's probe
+# list. Parameter values are float32, which holds the 5-character U-50
+# fields exactly enough while halving the file size.
+TIMESTAMP_DTYPE = np.dtype('<i8')
+PROBE_DTYPE = np.dtype('<u2')
+VALUE_DTYPE = np.dtype('<f4')
+
+
+def _layout(capacity, columns):
+    # Byte offsets of each column; every column is one contiguous block of
+    # 'capacity' entries, values stored parameter by parameter
+    timestamps = HEADER.itemsize
+    probes = timestamps + TIMESTAMP_DTYPE.itemsize * capacity
+    values = probes + PROBE_DTYPE.itemsize * capacity
+    values += -values % VALUE_DTYPE.itemsize
+    size = values + VALUE_DTYPE.itemsize * capacity * columns
+    return timestamps, probes, values, size
+
+
+def default_store_path(name="readings"):
+    # Per-user data directory: %LOCALAPPDATA%\U50 on Windows,
+    # $XDG_DATA_HOME/u50 (~/.local/share/u50) elsewhere
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser(os.path.join("~", "AppData", "Local"))
+        return os.path.join(base, "U50", name)
+    base = os.environ.get('XDG_DATA_HOME') or os.path.expanduser(os.path.join("~", ".local", "share"))
+    return os.path.join(base, "u50", name)
+
+
+def to_microseconds(received):
+    return np.datetime64(received, 'us').astype(np.int64)
+
+
+class Segment:
+    # One memory-mapped segment file. Appending writes straight into the
+    # mapped columns, so the only per-reading cost is a handful of stores.
+    def __init__(self, path, capacity=None, columns=None, start=None):
+        self.path = path
+        if capacity is not None:
+            # New segment: a sparse file of the full size, then mapped
+            size = _layout(capacity, columns)[3]
+            with open(path, 'wb') as f:
+                f.truncate(size)
+            self.data = np.memmap(path, dtype=np.uint8, mode='r+', shape=(size,))
+            self.header = self.data[:HEADER.itemsize].view(HEADER)[0:1]
+            self.header['magic'] = MAGIC
+            self.header['columns'] = columns
+            self.header['capacity'] = capacity
+            self.header['start'] = start
+            self.header['first'] = np.iinfo(np.int64).max
+            self.header['last'] = np.iinfo(np.int64).min
+        else:
+            self.data = np.memmap(path, dtype=np.uint8, mode='r+')
+            self.header = self.data[:HEADER.itemsize].view(HEADER)[0:1]
+            if self.header['magic'][0] != MAGIC:
+                raise ValueError(f"{path} is not a U-50 segment")
+
+        self.capacity = int(self.header['capacity'][0])
+        self.columns = int(self.header['columns'][0])
+        self.count = int(self.header['count'][0])
+        self.start = int(self.header['start'][0])
+        self.first = int(self.header['first'][0])
+        self.last = int(self.header['last'][0])
+
+        timestamps, probes, values, size = _layout(self.capacity, self.columns)
+        self.timestamps = self.data[timestamps:probes].view(TIMESTAMP_DTYPE)
+        self.probes = self.data[probes:probes + PROBE_DTYPE.itemsize * self.capacity].view(PROBE_DTYPE)
+        self.values = self.data[values:size].view(VALUE_DTYPE).reshape(self.columns, self.capacity)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def full(self):
+        return self.count >= self.capacity
+
+    def append(self, timestamp, probe, values):
+        i = self.count
+        self.timestamps[i] = timestamp
+        self.probes[i] = probe
+        self.values[:, i] = values
+        self._commit(i + 1, timestamp, timestamp)
+
+    def extend(self, timestamps, probes, values):
+        # values is (rows, columns), as decode_values() returns it
+        start = self.count
+        end = start + len(timestamps)
+        self.timestamps[start:end] = timestamps
+        self.probes[start:end] = probes
+        self.values[:, start:end] = np.asarray(values).T
+        self._commit(end, timestamps.min(), timestamps.max())
+
+    def _commit(self, count, low, high):
+        # The row count goes last, so a reader never sees a half-written row
+        self.first = min(self.first, int(low))
+        self.last = max(self.last, int(high))
+        self.header['first'] = self.first
+        self.header['last'] = self.last
+        self.count = count
+        self.header['count'] = count
+
+    def columns_view(self):
+        # Read-only views over the filled part of every column
+        count = self.count
+        return {
+            'timestamp': self.timestamps[:count].view('datetime64[us]'),
+            'probe': self.probes[:count],
+            'values': self.values[:, :count].T,
+        }
+
+    def flush(self):
+        self.data.flush()
+
+    def close(self):
+        # The mapping goes away with the last reference to it
+        self.flush()
+        self.data = self.header = self.timestamps = self.probes = self.values = None
+
+
+def read_header(path):
+    header = np.fromfile(path, dtype=HEADER, count=1)
+    if not len(header) or header['magic'][0] != MAGIC:
+        raise ValueError(f"{path} is not a U-50 segment")
+    return {name: header[name][0].item() for name in ('columns', 'capacity', 'count', 'start', 'first', 'last')}
+
+
+def load_segment(path):
+    # Column arrays of one segment, mapped read-only; nothing is parsed
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    header = data[:HEADER.itemsize].view(HEADER)[0]
+    if header['magic'] != MAGIC:
+        raise ValueError(f"{path} is not a U-50 segment")
+    capacity, columns, count = int(header['capacity']), int(header['columns']), int(header['count'])
+    timestamps, probes, values, size = _layout(capacity, columns)
+    return {
+        'timestamp': data[timestamps:timestamps + TIMESTAMP_DTYPE.itemsize * count].view('datetime64[us]'),
+        'probe': data[probes:probes + PROBE_DTYPE.itemsize * count].view(PROBE_DTYPE),
+        'values': data[values:size].view(VALUE_DTYPE).reshape(columns, capacity)[:, :count].T,
+    }
+
+
+class ReadingStore:
+    # Append-only store of readings in a directory of segment files. A new
+    # segment is started when the current one is full (segment_rows) or the
+    # reading falls past the end of its time slot (segment_seconds, aligned
+    # to the epoch, so daily segments start at midnight). store.json keeps
+    # the parameter names and the probe list that the probe column indexes:
+    # a port with the site name it reported, in the parallel 'sites' list, so
+    # a probe moved to another site starts a new entry and its history keeps
+    # the old site.
+    # Segment files are allocated at full size up front, so segment_rows
+    # defaults to one slot's worth of readings at 'rate' a second: 86400 rows,
+    # about 5 MB, for a day at 1 Hz. A faster stream just starts more
+    # segments.
+    def __init__(self, path, segment_rows=None, segment_seconds=86400, rate=1.0, decoder=FRAME_DECODER):
+        self.path = path
+        self.segment_rows = segment_rows or max(int(math.ceil(segment_seconds * rate)), 1)
+        self.segment_span = int(segment_seconds * 1_000_000)
+        self.decoder = decoder
+        self.lock = threading.Lock()
+        self.segment = None
+        os.makedirs(path, exist_ok=True)
+
+        self.meta_path = os.path.join(path, "store.json")
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            if meta['parameters'] != list(decoder.names):
+                raise ValueError(f"{path} holds parameters {meta['parameters']}")
+            self.probes = meta['probes']
+            self.sites = meta.get('sites') or [None] * len(self.probes)
+        else:
+            self.probes = []
+            self.sites = []
+            self._save_meta()
+        self.probe_ids = {probe: i for i, probe in enumerate(zip(self.probes, self.sites))}
+
+        # Carry on with the newest segment if there is room left in it
+        paths = self.segment_paths()
+        if paths:
+            segment = Segment(paths[-1])
+            if segment.full:
+                segment.close()
+            else:
+                self.segment = segment
+
+    def _save_meta(self):
+        with open(self.meta_path + ".tmp", 'w') as f:
+            json.dump({'parameters': list(self.decoder.names), 'probes': self.probes, 'sites': self.sites},
+                      f, indent=2)
+        os.replace(self.meta_path + ".tmp", self.meta_path)
+
+    def segment_paths(self):
+        return sorted(os.path.join(self.path, name) for name in os.listdir(self.path)
+                      if name.endswith(SEGMENT_SUFFIX))
+
+    def probe_id(self, port, site=None):
+        probe = self.probe_ids.get((port, site))
+        if probe is None:
+            probe = len(self.probes)
+            self.probes.append(port)
+            self.sites.append(site)
+            self.probe_ids[(port, site)] = probe
+            self._save_meta()
+        return probe
+
+    def _segment_for(self, timestamp, rows=1):
+        segment = self.segment
+        if (segment is None or segment.count + rows > segment.capacity
+                or not segment.start <= timestamp < segment.start + self.segment_span):
+            if segment is not None:
+                segment.close()
+            start = timestamp - timestamp % self.segment_span
+            path = os.path.join(self.path, f"seg-{start:017d}-{len(self.segment_paths()):06d}{SEGMENT_SUFFIX}")
+            segment = self.segment = Segment(path, self.segment_rows, len(self.decoder), start)
+        return segment
+
+    def append(self, reading):
+        # Suitable as a ProbeWorker subscriber. Values are stored as decoded,
+        # before any calibration, so the archive can be re-calibrated later.
+        timestamp = to_microseconds(reading.received)
+        values = reading.values if reading.raw_values is None else reading.raw_values
+        site = reading.site_name or None
+        with self.lock:
+            self._segment_for(timestamp).append(timestamp, self.probe_id(reading.port, site), values)
+
+    def extend(self, timestamps, port, values, site=None):
+        # Bulk append of one probe's readings, e.g. a decoded archive; rows
+        # are split across segments on the same rules as append()
+        with self.lock:
+            self._extend(timestamps, self.probe_id(port, site), values)
+
+    def extend_probes(self, timestamps, probes, ports, values, sites=None):
+        # Bulk append of rows from many probes, kept in their order: probes
+        # holds each row's index into ports (and sites), as a StoreReader
+        # chunk does
+        sites = sites or [None] * len(ports)
+        with self.lock:
+            ids = np.array([self.probe_id(port, site) for port, site in zip(ports, sites)], dtype=PROBE_DTYPE)
+            self._extend(timestamps, ids[np.asarray(probes)], values)
+
+    def _extend(self, timestamps, probes, values):
+        timestamps = np.asarray(timestamps, dtype='datetime64[us]').astype(np.int64)
+        values = np.asarray(values)
+        position = 0
+        while position < len(timestamps):
+            segment = self._segment_for(int(timestamps[position]))
+            chunk = timestamps[position:position + segment.capacity - segment.count]
+            outside = (chunk < segment.start) | (chunk >= segment.start + self.segment_span)
+            end = position + (int(outside.argmax()) if outside.any() else len(chunk))
+            segment.extend(timestamps[position:end], probes if np.isscalar(probes) else probes[position:end],
+                           values[position:end])
+            position = end
+
+    def flush(self):
+        with self.lock:
+            if self.segment is not None:
+                self.segment.flush()
+
+    def close(self):
+        with self.lock:
+            if self.segment is not None:
+                self.segment.close()
+                self.segment = None
+
+
+def main():
+    # Usage: u50_store.py STORE_DIR  - lists the segments of a store
+    if len(sys.argv) < 2:
+        print("Usage: u50_store.py STORE_DIR")
+        return
+
+    store = ReadingStore(sys.argv[1])
+    probes = [f"{port} ({site})" if site else port for port, site in zip(store.probes, store.sites)]
+    print(f"Probes: {', '.join(probes) or '-'}")
+    total = 0
+    for path in store.segment_paths():
+        columns = load_segment(path)
+        count = len(columns['timestamp'])
+        total += count
+        span = f"{columns['timestamp'].min()} .. {columns['timestamp'].max()}" if count else "empty"
+        print(f"{os.path.basename(path)}: {count} readings, {span}")
+    print(f"{total} readings in total")
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,827 @@
+import gzip
+import json
+import math
+import os
+import random
+import time
+import threading
+from collections import deque
+from datetime import datetime
+from operator import itemgetter
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from u50_frame import FRAME_DECODER, ABSOLUTE_NOISE, RELATIVE_NOISE
+
+WEBHOOK_FIELDS = tuple(f"d{i}" for i in range(1, 13))
+CRITICAL_COUNT = 5  # d1-d5 go out as "critical", d6-d12 as "non-critical"
+
+# Choices offered for every d field, in combobox order: display name and the
+# schema parameter it sends
+WEBHOOK_PARAMETERS = [
+    ("Temperature", 'temperature'),
+    ("pH", 'ph'),
+    ("pHmv", 'ph_mv'),
+    ("ORP", 'orp'),
+    ("Conductivity", 'conductivity'),
+    ("Turbidity", 'turbidity'),
+    ("DO", 'do'),
+    ("TDS", 'tds'),
+    ("Spec Gravity", 'salinity'),
+    ("Depth", 'depth'),
+    ("Param 11", 'sigma_t'),
+    ("Param 12", 'do_saturation'),
+]
+
+DEFAULT_PARAM_MAP = {field: i for i, field in enumerate(WEBHOOK_FIELDS)}
+
+# (window, statistic) pairs sent with each entry when statistics are on,
+# as e.g. "d7_mean_15m" in a "statistics" entry
+DEFAULT_STATISTIC_FIELDS = (('15m', 'mean'), ('15m', 'min'), ('15m', 'max'), ('1h', 'mean'))
+
+
+class PayloadBuilder:
+    # Compiles the d field -> parameter mapping into an index plan and a JSON
+    # template once; building a payload is then one C-level gather and one
+    # string format. Call compile() again only when the mapping changes.
+    def __init__(self, param_map=None, decoder=FRAME_DECODER):
+        self.decoder = decoder
+        self.param_map = None
+        self.compile(param_map or DEFAULT_PARAM_MAP)
+
+    def compile(self, param_map):
+        # param_map holds, per d field, an index into WEBHOOK_PARAMETERS;
+        # fields it leaves out keep their DEFAULT_PARAM_MAP parameter
+        if not isinstance(param_map, dict):
+            raise ValueError(f"param_map must be a dict of d field -> parameter index, not {param_map!r}")
+        unknown = sorted(set(param_map) - set(WEBHOOK_FIELDS))
+        if unknown:
+            raise ValueError(f"Unknown webhook fields {unknown}; expected d1..d{len(WEBHOOK_FIELDS)}")
+        param_map = dict(DEFAULT_PARAM_MAP, **param_map)
+        for field, index in param_map.items():
+            if not isinstance(index, int) or not 0 <= index < len(WEBHOOK_PARAMETERS):
+                raise ValueError(f"Webhook field {field} maps to {index!r}, not an index into "
+                                 f"the {len(WEBHOOK_PARAMETERS)} webhook parameters")
+        if param_map == self.param_map:
+            return False
+
+        self.param_map = param_map
+        self.plan = tuple(self.decoder.index[WEBHOOK_PARAMETERS[param_map[field]][1]]
+                          for field in WEBHOOK_FIELDS)
+        self.gather = itemgetter(*self.plan)
+
+        critical = ", ".join(f'"{field}": %r' for field in WEBHOOK_FIELDS[:CRITICAL_COUNT])
+        non_critical = ", ".join(f'"{field}": %r' for field in WEBHOOK_FIELDS[CRITICAL_COUNT:])
+        self.template = (
+            '[{"name": "critical", "value": {' + critical + '}}, '
+            '{"name": "non-critical", "value": {' + non_critical + '}}]'
+        )
+        # Same pair of entries with the reading's own timestamp, for batches
+        self.entry_template = (
+            '{"name": "critical", "timestamp": "%s", "value": {' + critical + '}}, '
+            '{"name": "non-critical", "timestamp": "%s", "value": {' + non_critical + '}}'
+        )
+        return True
+
+    def gather_values(self, values):
+        # Fields that could not be parsed are sent as 0.0, as before, and so
+        # are infinities (e.g. from a calibration blowing up): neither NaN nor
+        # inf is valid JSON, and one would get the whole body rejected
+        gathered = self.gather(values)
+        if not all(map(math.isfinite, gathered)):
+            gathered = tuple(value if math.isfinite(value) else 0.0 for value in gathered)
+        return gathered
+
+    def build_json(self, values, changed=None):
+        # 'changed' as for build_entries(); None sends every d field
+        if changed is None:
+            return self.template % self.gather_values(values)
+        return "[" + (self._changed_entries(self.gather_values(values), changed) or "") + "]"
+
+    def build_entries(self, values, timestamp, changed=None):
+        # 'changed' flags, per schema parameter, which values to include;
+        # None sends every d field
+        gathered = self.gather_values(values)
+        if changed is None:
+            return self.entry_template % ((timestamp,) + gathered[:CRITICAL_COUNT] +
+                                          (timestamp,) + gathered[CRITICAL_COUNT:])
+        return self._changed_entries(gathered, changed, timestamp)
+
+    def _changed_entries(self, gathered, changed, timestamp=None):
+        stamp = f'"timestamp": "{timestamp}", ' if timestamp is not None else ""
+        entries = []
+        for name, start, end in (("critical", 0, CRITICAL_COUNT),
+                                 ("non-critical", CRITICAL_COUNT, len(WEBHOOK_FIELDS))):
+            fields = ", ".join(f'"{WEBHOOK_FIELDS[i]}": {gathered[i]!r}'
+                               for i in range(start, end) if changed[self.plan[i]])
+            if fields:
+                entries.append(f'{{"name": "{name}", {stamp}"value": {{{fields}}}}}')
+        return ", ".join(entries) or None
+
+    def build_statistics(self, statistics, timestamp, fields=DEFAULT_STATISTIC_FIELDS):
+        # 'statistics' as RollingStats.statistics() returns it; one entry with
+        # a value per d field and (window, statistic) pair, leaving out what
+        # has no finite value. None if nothing is left.
+        values = []
+        for window, statistic in fields:
+            column = statistics[window][statistic]
+            for field, index in zip(WEBHOOK_FIELDS, self.plan):
+                value = float(column[index])
+                if math.isfinite(value):
+                    values.append(f'"{field}_{statistic}_{window}": {value!r}')
+        if not values:
+            return None
+        return f'{{"name": "statistics", "timestamp": "{timestamp}", "value": {{{", ".join(values)}}}}}'
+
+    def build_aggregate(self, count, low, high, timestamp, seconds):
+        # Per d field value count, min and max of an aggregated window, as
+        # schema-ordered sequences; min and max are left out where the count
+        # is 0
+        values = [f'"window": {seconds!r}']
+        for field, index in zip(WEBHOOK_FIELDS, self.plan):
+            values.append(f'"{field}_count": {count[index]}')
+            if count[index]:
+                values.append(f'"{field}_min": {low[index]!r}, "{field}_max": {high[index]!r}')
+        return f'{{"name": "aggregate", "timestamp": "{timestamp}", "value": {{{", ".join(values)}}}}}'
+
+    def build_alerts(self, flags, timestamp):
+        # AnomalyDetector flags as an "alerts" entry: the kinds flagged per d
+        # field, e.g. "d7": "spike", plus the probe's own error code. Flags
+        # of parameters no d field carries are left out; None if nothing is
+        # left.
+        fields = {}
+        probe = None
+        for kind, name, detail in flags:
+            if name is None:
+                probe = f"{kind} {detail}"
+                continue
+            index = self.decoder.index[name]
+            for field, planned in zip(WEBHOOK_FIELDS, self.plan):
+                if planned == index:
+                    fields.setdefault(field, []).append(kind)
+        values = [f'"{field}": "{",".join(kinds)}"' for field, kinds in fields.items()]
+        if probe is not None:
+            # The code is a character off the wire; escape it
+            values.append(f'"probe": {json.dumps(probe)}')
+        if not values:
+            return None
+        return f'{{"name": "alerts", "timestamp": "{timestamp}", "value": {{{", ".join(values)}}}}}'
+
+    def build_alert(self, values, flags, timestamp):
+        # An alerting reading sent on its own while readings are aggregated:
+        # its d fields go in an "alert" entry, which is not a sample of any
+        # series, so the receiver does not count the reading twice
+        gathered = self.gather_values(values)
+        fields = ", ".join(f'"{field}": {value!r}' for field, value in zip(WEBHOOK_FIELDS, gathered))
+        entry = f'{{"name": "alert", "timestamp": "{timestamp}", "value": {{{fields}}}}}'
+        alerts = self.build_alerts(flags, timestamp)
+        return entry + ", " + alerts if alerts else entry
+
+    def build(self, values):
+        gathered = self.gather_values(values)
+        return [
+            {
+                "name": "critical",
+                "value": dict(zip(WEBHOOK_FIELDS[:CRITICAL_COUNT], gathered[:CRITICAL_COUNT]))
+            },
+            {
+                "name": "non-critical",
+                "value": dict(zip(WEBHOOK_FIELDS[CRITICAL_COUNT:], gathered[CRITICAL_COUNT:]))
+            }
+        ]
+
+
+# Thresholds of DeadbandFilter when it is switched to the defaults; relative
+# ones are a fraction of the last value sent
+DEFAULT_ABSOLUTE_DEADBANDS = ABSOLUTE_NOISE
+DEFAULT_RELATIVE_DEADBANDS = RELATIVE_NOISE
+
+
+class DeadbandFilter:
+    # Decides, per probe, whether a reading is worth uploading. A reading with
+    # the sequence number and received time last seen for its port is a
+    # duplicate and is never passed again; the time tells a new worker's
+    # readings, numbered from 1 again, from the old one's.
+    # A parameter has changed once it has moved more than max(absolute,
+    # relative * |last sent value|) from the value last sent. Without any
+    # thresholds every new reading passes, and once 'heartbeat' seconds have
+    # gone by without an upload the next reading is sent in full.
+    # With per_field set only the parameters that changed are reported, and
+    # only their reference values move. 'force' sends a reading in full
+    # whatever the deadbands say, e.g. one flagged by the anomaly detector.
+    # A caller that sends straight away and fails calls rollback(), so the
+    # reading is tried again rather than taken for a duplicate. The state is
+    # shared by the upload thread and the workers queueing urgent alerts, so
+    # every call holds the lock.
+    def __init__(self, absolute=None, relative=None, heartbeat=None, per_field=False,
+                 decoder=FRAME_DECODER):
+        self.decoder = decoder
+        self.lock = threading.Lock()
+        self.last_sequence = {}
+        self.reference = {}
+        self.last_sent = {}
+        self.undo = {}
+        self.passed = 0
+        self.suppressed = 0
+        self.duplicates = 0
+        self.configure(absolute, relative, heartbeat, per_field)
+
+    def configure(self, absolute=None, relative=None, heartbeat=None, per_field=False):
+        absolute = absolute or {}
+        relative = relative or {}
+        with self.lock:
+            self.active = bool(absolute or relative)
+            self.absolute = tuple(float(absolute.get(name, 0.0)) for name in self.decoder.names)
+            self.relative = tuple(float(relative.get(name, 0.0)) for name in self.decoder.names)
+            self.heartbeat = heartbeat
+            self.per_field = per_field
+            # New thresholds apply from a full reading
+            self.reference.clear()
+
+    def update(self, reading, watched=None, force=False):
+        # Returns None when the reading should not be sent, otherwise a tuple
+        # flagging, per schema parameter, the values to send. 'watched'
+        # restricts change detection to the parameters actually uploaded.
+        with self.lock:
+            return self._update(reading, watched, force)
+
+    def _update(self, reading, watched, force):
+        port = reading.port
+        key = (reading.sequence, reading.received)
+        if self.last_sequence.get(port) == key:
+            self.duplicates += 1
+            return None
+        reference = self.reference.get(port)
+        self.undo[port] = (key, self.last_sequence.get(port), reference and list(reference),
+                           self.last_sent.get(port))
+        self.last_sequence[port] = key
+
+        now = time.monotonic()
+        everything = (True,) * len(reading.values)
+        if (not self.active or reference is None or force
+                or (self.heartbeat is not None and now - self.last_sent[port] >= self.heartbeat)):
+            self.reference[port] = list(reading.values)
+            self.last_sent[port] = now
+            self.passed += 1
+            return everything
+
+        changed = []
+        for i, value in enumerate(reading.values):
+            last = reference[i]
+            if math.isnan(value) or math.isnan(last):
+                moved = math.isnan(value) != math.isnan(last)
+            else:
+                moved = abs(value - last) > max(self.absolute[i], self.relative[i] * abs(last))
+            changed.append(moved and (watched is None or i in watched))
+
+        if not any(changed):
+            self.suppressed += 1
+            return None
+
+        if self.per_field:
+            for i, moved in enumerate(changed):
+                if moved:
+                    reference[i] = reading.values[i]
+        else:
+            self.reference[port] = list(reading.values)
+            changed = everything
+        self.last_sent[port] = now
+        self.passed += 1
+        return tuple(changed)
+
+    def rollback(self, reading):
+        # Puts the port back as it was before update() passed this reading;
+        # only possible while it is still the last reading of its port
+        with self.lock:
+            return self._rollback(reading)
+
+    def _rollback(self, reading):
+        port = reading.port
+        key = (reading.sequence, reading.received)
+        undo = self.undo.get(port)
+        if undo is None or undo[0] != key or self.last_sequence.get(port) != key:
+            return False
+        del self.undo[port]
+        _, key, reference, last_sent = undo
+        for state, value in ((self.last_sequence, key), (self.reference, reference),
+                             (self.last_sent, last_sent)):
+            if value is None:
+                state.pop(port, None)
+            else:
+                state[port] = value
+        self.passed -= 1
+        return True
+
+
+class WindowAggregator:
+    # Upload stage that folds every reading of a probe into tumbling windows
+    # of 'seconds', aligned to the epoch by received time, and hands one
+    # record per probe and window to 'emit' (e.g. UploadQueue.add_entry).
+    # A record is the usual critical/non-critical pair carrying each d
+    # field's window mean, plus an "aggregate" entry with its count, min and
+    # max, all stamped with the window start. The upload volume is therefore
+    # one record per probe per window whatever the poll rate, and every
+    # reading is in exactly one record. NaN and infinite values are left out;
+    # a field with no values is sent as 0.0 like any unparsed field, with a
+    # count of 0.
+    # A window closes when a later reading of the same probe arrives or when
+    # flush() finds its end has passed; a reading for a window already
+    # closed starts a record of its own and is counted as late.
+    def __init__(self, builder, emit, seconds=60.0, decoder=FRAME_DECODER):
+        self.builder = builder
+        self.emit = emit
+        self.seconds = seconds
+        self.columns = len(decoder)
+        self.lock = threading.Lock()
+        self.windows = {}
+        self.closed = {}
+        self.readings = 0
+        self.records = 0
+        self.late = 0
+
+    def add(self, reading):
+        # Suitable as a ProbeWorker subscriber
+        port = reading.port
+        index = int(reading.received.timestamp() // self.seconds)
+        with self.lock:
+            self.readings += 1
+            if index <= self.closed.get(port, index - 1):
+                self.late += 1
+            done = [self._close(key) for key in list(self.windows) if key[0] == port and key[1] < index]
+
+            window = self.windows.get((port, index))
+            if window is None:
+                window = self.windows[(port, index)] = (
+                    [0] * self.columns, [0.0] * self.columns,
+                    [math.inf] * self.columns, [-math.inf] * self.columns
+                )
+            count, total, low, high = window
+            for i, value in enumerate(reading.values):
+                if math.isfinite(value):
+                    count[i] += 1
+                    total[i] += value
+                    if value < low[i]:
+                        low[i] = value
+                    if value > high[i]:
+                        high[i] = value
+        for record in done:
+            self.emit(record)
+
+    def flush(self, now=None, everything=False):
+        # Emits the windows whose end has passed, or all of them (at shutdown,
+        # as partial records); returns how many
+        now = time.time() if now is None else now
+        with self.lock:
+            done = [self._close(key) for key in list(self.windows)
+                    if everything or (key[1] + 1) * self.seconds <= now]
+        for record in done:
+            self.emit(record)
+        return len(done)
+
+    def _close(self, key):
+        port, index = key
+        count, total, low, high = self.windows.pop(key)
+        self.closed[port] = max(index, self.closed.get(port, index))
+        self.records += 1
+        mean = tuple(total[i] / count[i] if count[i] else math.nan for i in range(self.columns))
+        timestamp = datetime.fromtimestamp(index * self.seconds).isoformat(timespec='seconds')
+        return (self.builder.build_entries(mean, timestamp) + ", "
+                + self.builder.build_aggregate(count, low, high, timestamp, self.seconds))
+
+    def status(self):
+        with self.lock:
+            return {'readings': self.readings, 'records': self.records, 'late': self.late,
+                    'open': len(self.windows)}
+
+
+class WebhookUploader:
+    # Posts payloads over one persistent session, so consecutive uploads reuse
+    # the same kept-alive TCP/TLS connection. Each target origin gets its own
+    # connection pool, sized from pool_sizes or pool_size. Headers are built
+    # once per URL/auth change rather than on every post.
+    def __init__(self, url, auth=None, pool_size=2, pool_sizes=None, timeout=10):
+        self.session = requests.Session()
+        self.pool_size = pool_size
+        self.pool_sizes = pool_sizes or {}
+        self.timeout = timeout
+        self.url = None
+        self.auth = None
+        self.origin = None
+        self.mounted = set()
+        self.configure(url, auth)
+
+    def configure(self, url, auth=None):
+        if url == self.url and auth == self.auth:
+            return False
+
+        parts = urlsplit(url)
+        self.origin = f"{parts.scheme}://{parts.netloc}/"
+        self.url = url
+        self.auth = auth
+        self.headers = {"Content-Type": "application/json"}
+        if auth:
+            self.headers["Authorization"] = auth
+        self.gzip_headers = dict(self.headers, **{"Content-Encoding": "gzip"})
+        return True
+
+    def post(self, body, compressed=False):
+        # Pools are mounted on first use, not while a URL is still being typed
+        if self.origin not in self.mounted:
+            size = self.pool_sizes.get(self.origin, self.pool_size)
+            self.session.mount(self.origin, HTTPAdapter(pool_connections=1, pool_maxsize=size))
+            self.mounted.add(self.origin)
+        headers = self.gzip_headers if compressed else self.headers
+        return self.session.post(self.url, data=body, headers=headers, timeout=self.timeout)
+
+    def close(self):
+        self.session.close()
+
+
+def batch_body(entries, compress=False, level=6):
+    body = ("[" + ", ".join(entries) + "]").encode()
+    return gzip.compress(body, level) if compress else body, len(body)
+
+
+def retryable(status_code):
+    # Server errors and rate limiting are worth another try; any other 4xx
+    # would be rejected again
+    return status_code >= 500 or status_code == 429
+
+
+class WebhookBatcher:
+    # Collects readings and sends them as one request once max_readings are
+    # buffered or the oldest is max_age seconds old. Every reading keeps its
+    # own timestamp, and the body can be gzip-compressed. The buffer is
+    # bounded by max_buffer; past that the oldest readings are dropped.
+    # A failed flush puts its readings back at the front of the buffer.
+    # With rolling_stats (a RollingStats) every entry also carries the probe's
+    # statistic_fields as they stand when the reading is added. With a
+    # detector (an AnomalyDetector that has already seen the reading) a
+    # flagged reading carries an "alerts" entry, and one raising a new alert
+    # on an uploaded parameter is never held back by the upload filter. An
+    # urgent entry makes everything buffered due at once.
+    def __init__(self, uploader, builder, max_readings=60, max_age=300.0, compress=False,
+                 compress_level=6, max_buffer=None, upload_filter=None, rolling_stats=None,
+                 statistic_fields=DEFAULT_STATISTIC_FIELDS, detector=None):
+        self.uploader = uploader
+        self.builder = builder
+        self.upload_filter = upload_filter
+        self.rolling_stats = rolling_stats
+        self.statistic_fields = statistic_fields
+        self.detector = detector
+        self.max_readings = max_readings
+        self.max_age = max_age
+        self.compress = compress
+        self.compress_level = compress_level
+        self.max_buffer = max_buffer or max_readings * 10
+
+        self.entries = deque()
+        self.oldest = None
+        self.urgent = False
+        self.condition = threading.Condition()
+        self.requests = 0
+        self.readings_sent = 0
+        self.readings_rejected = 0
+        self.raw_bytes = 0
+        self.wire_bytes = 0
+        self.dropped = 0
+
+    def make_entry(self, reading):
+        # None when the upload filter holds the reading back
+        timestamp = reading.received.isoformat(timespec='seconds')
+        detector = self.detector
+        flags = detector.flags_for(reading) if detector is not None else None
+        if self.upload_filter is None:
+            entry = self.builder.build_entries(reading.values, timestamp)
+        else:
+            changed = self.upload_filter.update(reading, self.builder.plan, force=self._forced(reading))
+            if changed is None:
+                return None
+            entry = self.builder.build_entries(reading.values, timestamp,
+                                               changed if self.upload_filter.per_field else None)
+
+        if entry is not None and flags:
+            extra = self.builder.build_alerts(flags, timestamp)
+            if extra:
+                entry += ", " + extra
+
+        rolling_stats = self.rolling_stats
+        if entry is not None and rolling_stats is not None and self.statistic_fields:
+            statistics = rolling_stats.statistics(reading.port)
+            extra = statistics and self.builder.build_statistics(statistics, timestamp, self.statistic_fields)
+            if extra:
+                entry += ", " + extra
+        return entry
+
+    def _forced(self, reading):
+        # Only a condition that has just started, on the probe or on a
+        # parameter some d field carries, sends a reading past the deadbands;
+        # one that persists, such as a blank parameter nothing uploads, must
+        # not switch them off
+        started = self.detector.started_for(reading) if self.detector is not None else None
+        if not started:
+            return False
+        index = self.builder.decoder.index
+        return any(name is None or index[name] in self.builder.plan for _, name, _ in started)
+
+    def add(self, reading, urgent=False):
+        entry = self.make_entry(reading)
+        if entry is None:
+            return False
+        return self.add_entry(entry, urgent)
+
+    def add_alert(self, reading, flags):
+        # Sends an alerting reading at once as an alert record, for upload
+        # modes where the reading also reaches the receiver in an aggregate;
+        # the upload filter is left alone, as the reading is not a sample
+        timestamp = reading.received.isoformat(timespec='seconds')
+        return self.add_entry(self.builder.build_alert(reading.values, flags, timestamp), urgent=True)
+
+    def add_entry(self, entry, urgent=False):
+        # A ready-made entry, e.g. a WindowAggregator record
+        with self.condition:
+            if not self.entries:
+                self.oldest = time.monotonic()
+            if len(self.entries) >= self.max_buffer:
+                self.entries.popleft()
+                self.dropped += 1
+            self.entries.append(entry)
+            self.urgent = self.urgent or urgent
+            if len(self) >= self.max_readings or self.urgent:
+                self.condition.notify_all()
+        return True
+
+    def __len__(self):
+        return len(self.entries)
+
+    def due(self):
+        with self.condition:
+            return bool(self.entries) and (
+                self.urgent
+                or len(self.entries) >= self.max_readings
+                or time.monotonic() - self.oldest >= self.max_age
+            )
+
+    def wait(self, timeout=None):
+        # Returns early as soon as a full batch or an urgent entry is waiting
+        with self.condition:
+            return self.condition.wait_for(lambda: len(self) >= self.max_readings or self.urgent, timeout)
+
+    def flush(self):
+        with self.condition:
+            count = min(len(self.entries), self.max_readings)
+            batch = [self.entries.popleft() for _ in range(count)]
+            self.oldest = time.monotonic() if self.entries else None
+            # Urgent until everything buffered with the urgent entry is out
+            self.urgent = self.urgent and bool(self.entries)
+        if not batch:
+            return None
+
+        body, raw_size = batch_body(batch, self.compress, self.compress_level)
+        try:
+            response = self.uploader.post(body, self.compress)
+        except requests.RequestException:
+            self._requeue(batch)
+            raise
+        if retryable(response.status_code):
+            self._requeue(batch)
+            return response
+
+        self._record(count, raw_size, len(body), response.status_code >= 400)
+        return response
+
+    def _record(self, count, raw_size, wire_size, rejected=False):
+        # A batch the server rejected outright is gone but not delivered
+        self.requests += 1
+        if rejected:
+            self.readings_rejected += count
+        else:
+            self.readings_sent += count
+        self.raw_bytes += raw_size
+        self.wire_bytes += wire_size
+
+    def _requeue(self, batch):
+        with self.condition:
+            room = self.max_buffer - len(self.entries)
+            if room < len(batch):
+                self.dropped += len(batch) - max(room, 0)
+                batch = batch[len(batch) - max(room, 0):]
+            self.entries.extendleft(reversed(batch))
+            self.oldest = time.monotonic()
+
+
+class UploadQueue(WebhookBatcher):
+    # Store-and-forward delivery on a thread of its own, so acquisition never
+    # waits on HTTP. Up to max_buffer readings are held in memory; beyond that
+    # they are appended to an on-disk journal (one JSON entry per line) instead
+    # of being dropped, and the journal is sent, oldest first, once memory is
+    # empty. Its read position is kept in a side file so a restart carries on
+    # where delivery stopped. Failed uploads back off exponentially with
+    # jitter, and a backlog is drained at no more than drain_rate requests a
+    # second. Entries carry their own timestamps, so a backlog may arrive out
+    # of order.
+    def __init__(self, uploader, builder, journal_path, max_readings=60, max_age=300.0,
+                 compress=False, compress_level=6, max_buffer=1000, base_delay=1.0,
+                 max_delay=300.0, drain_rate=2.0, on_send=None, upload_filter=None, rolling_stats=None,
+                 statistic_fields=DEFAULT_STATISTIC_FIELDS, detector=None):
+        super().__init__(uploader, builder, max_readings, max_age, compress, compress_level, max_buffer,
+                         upload_filter, rolling_stats, statistic_fields, detector)
+        self.journal_path = journal_path
+        self.offset_path = journal_path + ".offset"
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.drain_rate = drain_rate
+        self.on_send = on_send
+
+        self.journal = None
+        self.read_offset = 0
+        self.journaled = 0
+        self.failures = 0
+        self.rejected = 0
+        self.last_error = None
+        self.stop_event = threading.Event()
+        self.thread = None
+        self._recover()
+
+    def _recover(self):
+        if not os.path.exists(self.journal_path):
+            return
+        if os.path.exists(self.offset_path):
+            with open(self.offset_path) as f:
+                self.read_offset = int(f.read() or 0)
+
+        with open(self.journal_path, 'rb+') as f:
+            data = f.read()
+            # Drop a line left half-written by a crash
+            end = data.rfind(b"\n") + 1
+            if end < len(data):
+                f.truncate(end)
+            self.journaled = data.count(b"\n", self.read_offset, end)
+        if not self.journaled:
+            self._clear_journal()
+
+    def __len__(self):
+        return len(self.entries) + self.journaled
+
+    def add_entry(self, entry, urgent=False):
+        with self.condition:
+            # Once anything is journaled, newer readings follow it there; the
+            # journal is sent without waiting anyway
+            if self.journaled or len(self.entries) >= self.max_buffer:
+                self._spill([entry])
+            else:
+                if not self.entries:
+                    self.oldest = time.monotonic()
+                self.entries.append(entry)
+                self.urgent = self.urgent or urgent
+            # Also wakes the sender so it starts timing a new batch's age
+            self.condition.notify_all()
+        return True
+
+    def _spill(self, entries):
+        if self.journal is None:
+            self.journal = open(self.journal_path, 'a', encoding='utf-8')
+        self.journal.write("".join(entry + "\n" for entry in entries))
+        self.journal.flush()
+        self.journaled += len(entries)
+
+    def due(self):
+        with self.condition:
+            if self.journaled:
+                return True
+        return super().due()
+
+    def flush(self):
+        with self.condition:
+            from_journal = not self.entries and self.journaled
+        if not from_journal:
+            return super().flush()
+
+        # The read position only moves once the server has accepted the batch
+        with open(self.journal_path, encoding='utf-8') as f:
+            f.seek(self.read_offset)
+            batch = [f.readline().rstrip("\n") for _ in range(min(self.journaled, self.max_readings))]
+            end = f.tell()
+
+        body, raw_size = batch_body(batch, self.compress, self.compress_level)
+        response = self.uploader.post(body, self.compress)
+        if retryable(response.status_code):
+            return response
+
+        with self.condition:
+            self.journaled -= len(batch)
+            if self.journaled:
+                self.read_offset = end
+                with open(self.offset_path + ".tmp", 'w') as f:
+                    f.write(str(end))
+                os.replace(self.offset_path + ".tmp", self.offset_path)
+            else:
+                self._clear_journal()
+        self._record(len(batch), raw_size, len(body), response.status_code >= 400)
+        return response
+
+    def _requeue(self, batch):
+        # The batch was just taken from memory, so putting it back may only
+        # briefly overshoot max_buffer by one batch
+        with self.condition:
+            self.entries.extendleft(reversed(batch))
+            self.oldest = time.monotonic()
+
+    def _clear_journal(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        for path in (self.journal_path, self.offset_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.read_offset = 0
+        self.journaled = 0
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout=None):
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+        # Whatever is still in memory goes to the journal for the next run
+        with self.condition:
+            if self.entries:
+                self._spill(self.entries)
+                self.entries.clear()
+            self.urgent = False
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
+
+    def _wait_due(self):
+        # One wait per call; add() and stop() notify, and run() re-checks
+        with self.condition:
+            if self.stop_event.is_set() or self.journaled or len(self) >= self.max_readings or self.urgent:
+                return
+            if self.entries:
+                timeout = max(self.max_age - (time.monotonic() - self.oldest), 0)
+            else:
+                timeout = None
+            self.condition.wait(timeout)
+
+    def run(self):
+        last_send = 0.0
+        while not self.stop_event.is_set():
+            if not self.due():
+                self._wait_due()
+                continue
+
+            pause = last_send + 1.0 / self.drain_rate - time.monotonic()
+            if pause > 0:
+                self.stop_event.wait(pause)
+                continue
+
+            error = None
+            try:
+                response = self.flush()
+                if response is None:
+                    continue
+                if retryable(response.status_code):
+                    error = f"HTTP {response.status_code}"
+                elif response.status_code >= 400:
+                    # Rejected outright; resending the same body would not help
+                    self.rejected += 1
+                    self.last_error = f"HTTP {response.status_code}"
+                else:
+                    self.last_error = None
+            except (requests.RequestException, OSError) as e:
+                response = None
+                error = str(e)
+            last_send = time.monotonic()
+
+            if self.on_send is not None:
+                self.on_send(response, error)
+
+            if error is None:
+                self.failures = 0
+                continue
+            self.failures += 1
+            self.last_error = error
+            delay = min(self.max_delay, self.base_delay * 2 ** (self.failures - 1))
+            self.stop_event.wait(random.uniform(delay / 2, delay))
+
+    def status(self):
+        return {
+            'queued': len(self.entries),
+            'journaled': self.journaled,
+            'requests': self.requests,
+            'readings_sent': self.readings_sent,
+            'rejected': self.rejected,
+            'readings_rejected': self.readings_rejected,
+            'dropped': self.dropped,
+            'failures': self.failures,
+            'last_error': self.last_error
+        }
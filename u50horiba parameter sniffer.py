@@ -1,11 +1,19 @@
+import csv
 import serial
 import serial.tools.list_ports
-import time
-import threading
 from datetime import datetime
 import tkinter as tk
 from tkinter import ttk, scrolledtext, filedialog, messagebox
 
+from u50_serial import RD_COMMAND
+from u50_acquisition import ProbeWorker, ReadingCache
+from u50_frame import FRAME_DECODER
+from u50_log import LogPipe
+
+# Lines kept in the Response Viewport; older ones are trimmed as new ones arrive
+LOG_LINES = 2000
+
+
 class UsbDataCollectorGUI:
     def __init__(self, root):
         self.root = root
@@ -14,11 +22,15 @@ class UsbDataCollectorGUI:
         self.root.minsize(800, 600)
         
         self.serial_conn = None
+        self.device = None
+        self.reading_cache = ReadingCache()
         self.is_connected = False
         self.is_collecting = False
-        self.collection_thread = None
         
         self.create_widgets()
+        # Worker threads log through the pipe; the Tk thread drains it
+        self.log_pipe = LogPipe(self.log_text, max_lines=LOG_LINES)
+        self.log_pipe.start()
         self.refresh_ports()
         
     def create_widgets(self):
@@ -59,6 +71,11 @@ class UsbDataCollectorGUI:
         interval_entry = ttk.Entry(control_frame, textvariable=self.interval_var, width=5)
         interval_entry.pack(side=tk.LEFT, padx=5)
         
+        ttk.Label(control_frame, text="Deadline (s):").pack(side=tk.LEFT, padx=5)
+        self.deadline_var = tk.StringVar(value="2")
+        deadline_entry = ttk.Entry(control_frame, textvariable=self.deadline_var, width=5)
+        deadline_entry.pack(side=tk.LEFT, padx=5)
+        
         self.save_btn = ttk.Button(control_frame, text="Save to CSV", command=self.save_data)
         self.save_btn.pack(side=tk.LEFT, padx=10)
         self.save_btn.config(state=tk.DISABLED)
@@ -131,8 +148,8 @@ class UsbDataCollectorGUI:
             self.port_combo.current(0)
             
     def log_message(self, message):
-        self.log_text.insert(tk.END, f"{datetime.now().strftime('%H:%M:%S')}: {message}\n")
-        self.log_text.see(tk.END)
+        # Safe from any thread
+        self.log_pipe.log(message)
         
     def toggle_connection(self):
         if self.is_connected:
@@ -159,6 +176,12 @@ class UsbDataCollectorGUI:
                 dsrdtr=False
             )
             
+            # The worker owns the port from here on; every command goes through it
+            self.device = ProbeWorker(port, interval=None, deadline=self.get_deadline(),
+                                      serial_conn=self.serial_conn)
+            self.device.subscribe(self.reading_cache.update)
+            self.device.subscribe(self.handle_reading)
+            self.device.start()
             self.is_connected = True
             self.connect_btn.config(text="Disconnect")
             self.request_btn.config(state=tk.NORMAL)
@@ -173,6 +196,11 @@ class UsbDataCollectorGUI:
         if self.is_collecting:
             self.toggle_auto_collect()  
             
+        if self.device:
+            self.device.stop()
+            self.device.join(5)
+            self.device = None
+            
         if self.serial_conn and self.serial_conn.is_open:
             self.serial_conn.close()
             
@@ -183,147 +211,56 @@ class UsbDataCollectorGUI:
         self.status_var.set("Disconnected")
         self.log_message("Disconnected")
         
-    def calculate_fcs(self, command):
-        result = 0
-        for char in command:
-            result ^= ord(char)
-        
-        return format(result, '02X')
-        
+    def get_deadline(self):
+        try:
+            return float(self.deadline_var.get())
+        except ValueError:
+            return 2.0
+            
     def request_data(self):
-        if not self.is_connected or not self.serial_conn:
+        if not self.is_connected or not self.device:
             messagebox.showerror("Error", "Not connected to device")
             return
             
-        command = "#RD@"
-        fcs = self.calculate_fcs(command)
-        full_command = f"{command}{fcs}\r\n"
-        
-        try:
-            self.serial_conn.write(full_command.encode())
-            self.log_message(f"Sent command: {full_command.strip()}")
-            
-            time.sleep(0.5)
+        self.log_message(f"Sent command: {RD_COMMAND.decode().strip()}")
+        self.device.submit(deadline=self.get_deadline(), callback=self.request_done)
+        
+    def request_done(self, pending):
+        if pending.error:
+            self.log_message(f"Error: {pending.error}")
+        elif pending.result is None:
+            self.log_message(f"No valid response received within {pending.deadline} s")
             
-            if self.serial_conn.in_waiting:
-                response = self.serial_conn.read(self.serial_conn.in_waiting).decode('ascii')
-                self.log_message(f"Received {len(response)} bytes")
-                
-                data = self.parse_response(response)
-                if data:
-                    self.display_data(data)
-                    self.current_data = data
-                    self.save_btn.config(state=tk.NORMAL)
-            else:
-                self.log_message("No response received")
-                
-        except Exception as e:
-            self.log_message(f"Error: {e}")
-            messagebox.showerror("Error", str(e))
+    def handle_reading(self, reading):
+        # Called on the device worker thread for every reading, whoever asked for it.
+        # The frame has already been decoded once by the worker.
+        self.log_message(f"Received {len(reading.frame)} bytes in {reading.latency_text}")
+        
+        self.log_raw_fields(reading)
+        self.log_pipe.post(self.show_reading, reading)
 
-    def parse_response(self, response):
-        try:
-            if not response.startswith('#RD'):
-                self.log_message(f"Invalid response format: {response[:10]}...")
-                return None
-                
-            site_name = response[3:23].strip()
-            
-            probe_status = response[23]
-            probe_error = response[24]
-            
-            parameters = []
-            for i in range(13):
-                start_idx = 29 + (i * 11)
-                
-                param = {
-                    'code': response[start_idx:start_idx+2],
-                    'status': response[start_idx+2],
-                    'error': response[start_idx+3],
-                    'data': response[start_idx+4:start_idx+9].strip(),
-                    'unit': response[start_idx+9]
-                }
-                parameters.append(param)
+    def show_reading(self, reading):
+        # Tk thread
+        self.status_var.set(f"Connected to {reading.port} - last poll {reading.latency_text}")
+        self.display_data(reading)
+        self.current_data = reading
+        self.save_btn.config(state=tk.NORMAL)
 
-            # params need conversions
-            # this not accurate data shout be converted to actual values from milivolts
-            # note that in param 3 use the data in parsed data not in csv
+    def log_raw_fields(self, reading):
+        response = reading.frame.decode('ascii', 'replace')
 
-            param7_idx = 29 + (6 * 11)
-            do_extended_start = param7_idx - 5  
-            do_extended_end = param7_idx + 15   
+        # params need conversions
+        # this not accurate data shout be converted to actual values from milivolts
+        # note that in param 3 use the data in parsed data not in csv
 
-            self.log_message(f"Raw data for parameter 4 (ORP): {response[29 + (3 * 11):29 + (4 * 11)]}")
-            self.log_message(f"Raw data for parameter 5 (Conductivity): {response[29 + (4 * 11):29 + (5 * 11)]}")
-            self.log_message(f"Raw data for parameter 6 (Turbidity): {response[29 + (5 * 11):29 + (6 * 11)]}")
-            self.log_message(f"Raw data for parameter 7 (DO): {response[param7_idx:param7_idx+11]}")
-            self.log_message(f"Extended DO context: {response[do_extended_start:do_extended_end]}")
-            self.log_message(f"DO data field only: '{response[param7_idx+4:param7_idx+9]}'")
-            self.log_message(f"Raw data for parameter 8 (TDS): {response[29 + (7 * 11):29 + (8 * 11)]}")
-            self.log_message(f"Raw data for parameter 9 (Spec Gravity): {response[29 + (8 * 11):29 + (9 * 11)]}")
-            self.log_message(f"Raw data for parameter 10 (Depth): {response[29 + (9 * 11):29 + (10 * 11)]}")
+        for i in range(3, 10):
+            self.log_message(f"Raw data for parameter {i+1} ({FRAME_DECODER.labels[i]}): {reading.block(i)}")
+
+        do = FRAME_DECODER.index['do']
+        do_idx = FRAME_DECODER.offsets[do]
+        self.log_message(f"Extended DO context: {response[do_idx - 9:do_idx + 11]}")
+        self.log_message(f"DO data field only: '{response[do_idx:do_idx + FRAME_DECODER.widths[do]]}'")
 
-            date_idx = 173
-            try:
-                year = int(response[date_idx:date_idx+2])
-                month = int(response[date_idx+2:date_idx+4])
-                day = int(response[date_idx+4:date_idx+6])
-                hour = int(response[date_idx+6:date_idx+8])
-                minute = int(response[date_idx+8:date_idx+10])
-                second = int(response[date_idx+10:date_idx+12])
-                
-                timestamp = datetime(2000 + year, month, day, hour, minute, second)
-            except (ValueError, IndexError):
-                timestamp = None
-                self.log_message("Error parsing timestamp")
-            
-            try:
-                lon_degrees = response[date_idx+12:date_idx+14]
-                lon_minutes = response[date_idx+14:date_idx+16]
-                lon_seconds = response[date_idx+16:date_idx+18]
-                
-                ns_indicator = response[date_idx+19]
-                
-                lat_degrees = response[date_idx+20:date_idx+23]
-                lat_minutes = response[date_idx+23:date_idx+25]
-                lat_seconds = response[date_idx+25:date_idx+27]
-                
-                ew_indicator = response[date_idx+28]
-                
-                if lon_degrees != "--" and lat_degrees != "---":
-                    gps_coords = {
-                        'latitude': {
-                            'degrees': int(lat_degrees),
-                            'minutes': int(lat_minutes),
-                            'seconds': int(lat_seconds),
-                            'direction': ns_indicator
-                        },
-                        'longitude': {
-                            'degrees': int(lon_degrees),
-                            'minutes': int(lon_minutes),
-                            'seconds': int(lon_seconds),
-                            'direction': ew_indicator
-                        }
-                    }
-                else:
-                    gps_coords = None
-            except (ValueError, IndexError):
-                gps_coords = None
-                self.log_message("Error parsing GPS coordinates")
-            
-            result = {
-                'site_name': site_name,
-                'probe_status': probe_status,
-                'probe_error': probe_error,
-                'parameters': parameters,
-                'timestamp': timestamp,
-                'gps_coordinates': gps_coords
-            }
-            
-            return result
-        except Exception as e:
-            self.log_message(f"Error parsing response: {e}")
-            return None
     #data summarr parsed data
     def display_data(self, data):
         if not data:
@@ -332,20 +269,22 @@ class UsbDataCollectorGUI:
         self.data_text.delete(1.0, tk.END)
         
         self.data_text.insert(tk.END, f"--- Data Summary ---\n")
-        self.data_text.insert(tk.END, f"Site name: {data['site_name']}\n")
-        self.data_text.insert(tk.END, f"Probe status: {data['probe_status']}, Error: {data['probe_error']}\n\n")
+        self.data_text.insert(tk.END, f"Site name: {data.site_name}\n")
+        self.data_text.insert(tk.END, f"Probe status: {data.probe_status}, Error: {data.probe_error}\n\n")
         
         self.data_text.insert(tk.END, "Parameters:\n")
-        for i, param in enumerate(data['parameters']):
+        for i, param in enumerate(data.parameters):
             if param['code'] != '  ' and param['code'] != '':
                 self.data_text.insert(tk.END, f"{i+1}. Value: {param['data']}")
         
-        if data['timestamp']:
-            self.data_text.insert(tk.END, f"\nTimestamp: {data['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}\n")
+        timestamp = data.timestamp
+        if timestamp:
+            self.data_text.insert(tk.END, f"\nTimestamp: {timestamp.strftime('%Y-%m-%d %H:%M:%S')}\n")
         
-        if data['gps_coordinates']:
-            lat = data['gps_coordinates']['latitude']
-            lon = data['gps_coordinates']['longitude']
+        gps_coordinates = data.gps_coordinates
+        if gps_coordinates:
+            lat = gps_coordinates['latitude']
+            lon = gps_coordinates['longitude']
             
             lat_str = f"{lat['degrees']}°{lat['minutes']}'{lat['seconds']}\"{lat['direction']}"
             lon_str = f"{lon['degrees']}°{lon['minutes']}'{lon['seconds']}\"{lon['direction']}"
@@ -367,34 +306,33 @@ class UsbDataCollectorGUI:
             return
             
         try:
-            with open(filename, 'w') as f:
-                f.write("Site Name,Probe Status,Probe Error,Timestamp,")
-                
-                for i in range(len(self.current_data['parameters'])):
-                    f.write(f"Param{i+1}_Value")
-                
-                f.write("Latitude,Longitude\n")
-                
-                f.write(f"{self.current_data['site_name']},{self.current_data['probe_status']},{self.current_data['probe_error']},")
-                
-                if self.current_data['timestamp']:
-                    f.write(f"{self.current_data['timestamp'].strftime('%Y-%m-%d %H:%M:%S')},")
-                else:
-                    f.write(",")
-                
-                for param in self.current_data['parameters']:
-                    f.write(f"{param['data']},{param['unit']}")
+            header = ["Site Name", "Probe Status", "Probe Error", "Timestamp"]
+            for i in range(len(FRAME_DECODER)):
+                header += [f"Param{i+1}_Value", f"Param{i+1}_Unit"]
+            header += ["Latitude", "Longitude"]
+            
+            timestamp = self.current_data.timestamp
+            row = [self.current_data.site_name, self.current_data.probe_status, self.current_data.probe_error,
+                   timestamp.strftime('%Y-%m-%d %H:%M:%S') if timestamp else ""]
+            for param in self.current_data.parameters:
+                row += [param['data'], param['unit']]
+            
+            gps_coordinates = self.current_data.gps_coordinates
+            if gps_coordinates:
+                lat = gps_coordinates['latitude']
+                lon = gps_coordinates['longitude']
                 
-                if self.current_data['gps_coordinates']:
-                    lat = self.current_data['gps_coordinates']['latitude']
-                    lon = self.current_data['gps_coordinates']['longitude']
-                    
-                    lat_str = f"{lat['degrees']}°{lat['minutes']}'{lat['seconds']}\"{lat['direction']}"
-                    lon_str = f"{lon['degrees']}°{lon['minutes']}'{lon['seconds']}\"{lon['direction']}"
-                    
-                    f.write(f"{lat_str},{lon_str}\n")
-                else:
-                    f.write(",\n")
+                lat_str = f"{lat['degrees']}°{lat['minutes']}'{lat['seconds']}\"{lat['direction']}"
+                lon_str = f"{lon['degrees']}°{lon['minutes']}'{lon['seconds']}\"{lon['direction']}"
+                row += [lat_str, lon_str]
+            else:
+                row += ["", ""]
+            
+            # csv quotes the seconds mark in the coordinates
+            with open(filename, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(header)
+                writer.writerow(row)
                     
             self.log_message(f"Data saved to {filename}")
             messagebox.showinfo("Success", f"Data saved to {filename}")
@@ -405,6 +343,8 @@ class UsbDataCollectorGUI:
     def toggle_auto_collect(self):
         if self.is_collecting:
             self.is_collecting = False
+            if self.device:
+                self.device.release('collect')
             self.status_var.set("Auto-collection stopped")
             self.log_message("Auto-collection stopped")
         else:
@@ -427,29 +367,16 @@ class UsbDataCollectorGUI:
             self.is_collecting = True
             self.status_var.set(f"Auto-collecting data every {interval} seconds")
             self.log_message(f"Started auto-collection every {interval} seconds")
-            self.collection_thread = threading.Thread(target=self.auto_collect_data, daemon=True)
-            self.collection_thread.start()
-    
-    def auto_collect_data(self):
-        while self.is_collecting and self.is_connected:
-            self.request_data()
-            
-            try:
-                interval = float(self.interval_var.get())
-                time.sleep(interval)
-            except ValueError:
-                time.sleep(5)  
-                
-            if not self.is_connected or not self.auto_collect_var.get():
-                self.is_collecting = False
-                break
+            self.device.deadline = self.get_deadline()
+            self.device.require('collect', interval)
     
     def clear_log(self):
-        self.log_text.delete(1.0, tk.END)
+        self.log_pipe.clear()
     
     def on_closing(self):
         if self.is_connected:
             self.disconnect()
+        self.log_pipe.stop()
         self.root.destroy()
 
 